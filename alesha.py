@@ -3,41 +3,143 @@ import asyncio
 import json
 import os
 import random
+import threading
 import time
-from collections import deque
+from dataclasses import dataclass
 
-from google.oauth2.credentials import Credentials
-import googleapiclient.discovery
-import deepl
-from langdetect import detect
-from openai import OpenAI
 import websockets
 
+from broadcast import BroadcastHub
+from checkpoint import CHECKPOINT_INTERVAL_SECONDS, CHECKPOINT_PATH, CheckpointStore
+from cache import DiskCache, TTLCache, normalize_text
+from lang_detect import NON_TEXT_MESSAGE, LanguageDetector
 from persona import get_system_prompt_for_lang
-from db import get_supabase, save_message_to_supabase  # shared DB helpers
+from quota import YOUTUBE_DAILY_QUOTA_UNITS, QuotaAccountant, QuotaExhausted
+import db
+from db import get_or_create_streamer, MessageBatchWriter  # shared DB helpers
+from outbound import OutboundClass, OutboundPost, OutboundScheduler, keep_latest
+from pipeline import Pipeline, Stage
+from rate_limit import Backoff, RateLimiter
+from reply_cache import AUTHOR_PLACEHOLDER, WARMUP_PHRASES, ReplyCache
+from session import StreamSession
+from spool import SPOOL_PATH, MessageSpool
+from youtube_io import execute_youtube_request, youtube_error_reason
 
 # -------- Config loading --------
-with open("config.json") as f:
-    config = json.load(f)
+
+_config: dict | None = None
+
+
+def get_config() -> dict:
+    """config.json, read on first use (importing alesha needs no credentials)."""
+    global _config
+    if _config is None:
+        with open("config.json") as f:
+            _config = json.load(f)
+    return _config
 
 SCOPES = ["https://www.googleapis.com/auth/youtube.force-ssl"]
-MAX_TRACKED_MESSAGES = 1000
-BOT_COOLDOWN_SECONDS = 30  # global cooldown for all bot messages
+BOT_COOLDOWN_SECONDS = 30  # per-stream cooldown for all bot messages
+# Single-stream setup from run_alesha.sh; more streams come from config.json "STREAMS"
 LIVE_CHAT_ID = os.getenv("LIVE_CHAT_ID")
 LIVE_STREAM_ID = os.getenv("LIVE_STREAM_ID")
-connected_clients = set()
+# WebSocket dashboard clients (each with its own outbound queue)
+broadcast_hub = BroadcastHub()
+WS_PORT = 8765
 
 MAX_YT_MESSAGE_LEN = 200
 
+# -------- YouTube quota config --------
+
+# Processes spending the same project's quota ("YOUTUBE_DAILY_QUOTA" in config.json);
+# a worker pool sets this to its size, so each worker paces itself on its share
+YOUTUBE_QUOTA_SHARE = 1
+YOUTUBE_ERROR_BACKOFF_SECONDS = 2.0  # first retry delay, doubled on every failure
+YOUTUBE_ERROR_BACKOFF_CAP_SECONDS = 300.0
+
+# Partial responses: only the keys the bot actually reads
+CHAT_LIST_FIELDS = (
+    "nextPageToken,pollingIntervalMillis,offlineAt,"
+    "items(id,snippet(type,displayMessage,superChatDetails/amountDisplayString),"
+    "authorDetails(displayName,channelId,isChatOwner))"
+)
+STREAM_STATS_FIELDS = "items(id,statistics/likeCount,liveStreamingDetails/concurrentViewers)"
+STATS_IDS_PER_REQUEST = 50  # videos.list accepts up to 50 IDs per call
+
+# -------- Broadcast discovery --------
+
+# Find the channel's active broadcasts in-process (not with a worker pool,
+# whose streams come from public.streamers) and roll over when a chat ends
+BROADCAST_DISCOVERY = True
+BROADCAST_DISCOVERY_INTERVAL_SECONDS = 120
+BROADCAST_CACHE_SECONDS = 30  # several chats ending at once share one lookup
+BROADCAST_FIELDS = "items(id,snippet(channelId,liveChatId,title))"
+# Errors meaning the chat is gone for good (the broadcast is over)
+CHAT_ENDED_REASONS = ("liveChatEnded", "liveChatNotFound")
+
+# -------- Pipeline config --------
+
+# Worker tasks per pipeline stage (ingest is always a single polling loop)
+PIPELINE_STAGE_WORKERS = {
+    "detect": 1,
+    "persist": 1,
+    "translate": 1,  # one worker, so a whole poll page lands in one DeepL batch
+    "reply": 3,  # matches OPENAI_MAX_CONCURRENCY
+    "send": 1,  # only hands replies to the outbound scheduler
+}
+PIPELINE_QUEUE_SIZE = 200  # max items waiting in front of each stage
+TRANSLATE_BATCH_SIZE = 50  # DeepL accepts up to 50 texts per request
+TRANSLATE_BATCH_WINDOW_SECONDS = 0.2  # wait this long for the rest of a poll page
+PERSIST_BATCH_SIZE = 50  # messages spooled per SQLite transaction (whatever is queued, no waiting)
+PERIODIC_POSTS_TICK_SECONDS = 5  # how often likes / promo / donation-info are checked
+
+# -------- OpenAI config --------
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+REPLY_MAX_TOKENS = 80
+OPENAI_TIMEOUT_SECONDS = 15.0  # per request
+OPENAI_REQUESTS_PER_MINUTE = 60
+OPENAI_TOKENS_PER_MINUTE = 40_000
+OPENAI_MAX_CONCURRENCY = 3  # replies generated in parallel
+
+# Stream completions and stop as soon as the text no longer fits into one
+# chat message, instead of paying for tokens that would be cut off anyway
+STREAM_REPLIES = True
+REPLY_CHAR_BUDGET = MAX_YT_MESSAGE_LEN - 2  # room for the emoji prefix + space
+
+# Pre-fill the reply cache for WARMUP_PHRASES in LANG_NAME_MAP languages at startup
+# (costs a few OpenAI calls per phrase, all through the rate limiter)
+REPLY_CACHE_WARMUP = False
+
+# -------- Reply coalescing --------
+
+# Messages that arrive during BOT_COOLDOWN_SECONDS (mentions included) are
+# collected and answered together with ONE combined reply when the window ends
+COALESCE_REPLIES = True
+COALESCE_MAX_AUTHORS = 4  # nicknames addressed in one combined reply
+COALESCE_TICK_SECONDS = 1.0
+COALESCED_REPLY_MAX_TOKENS = 120
+
+# -------- Translation cache --------
+
+TRANSLATION_CACHE_SIZE = 5000  # phrases kept in memory
+TRANSLATION_CACHE_TTL_SECONDS = 7 * 24 * 3600  # translations barely change, keep for a week
+TRANSLATION_CACHE_ON_DISK = True  # keep a SQLite copy so restarts start warm
+TRANSLATION_CACHE_PATH = "translation_cache.sqlite3"
+
 # -------- Payment / donations config (DB-backed) --------
 
-GRATITUDE_COOLDOWN_SECONDS = 600  # 10 minutes shared cooldown for likes + donations
-LIKE_CHECK_INTERVAL = 60  # seconds to poll like count
+# public.streamer_settings is re-checked this often (by updated_at, one query for all streams)
+SETTINGS_REFRESH_SECONDS = 30
+
+GRATITUDE_COOLDOWN_SECONDS = 600  # 10 minutes between like thank-you messages
+SUPERCHAT_THANKS_INTERVAL_SECONDS = 60  # Super Chat thanks arriving faster are merged into one
+LIKE_CHECK_INTERVAL = 60  # seconds between like / viewer lookups (all streams in one call)
 
 # How often to show donation info (text-based donations for users without SuperChat)
 DONATION_INFO_INTERVAL_SECONDS = 600  # 10 minutes
 
-# These will be overridden from DB (streamer_settings), but we keep safe defaults
+# Per-stream values are loaded from DB (streamer_settings); these are the safe defaults
 DONATION_CARD_TEXT = ""  # full card number comes only from DB
 BUYMEACOFFEE_LINK = ""
 DONATIONALERTS_URL = ""
@@ -59,39 +161,123 @@ PROMO_MESSAGES_EN = [
     "🎶 Support the stream with a like & sub — and request your favorite track for 250₽. 🎶",
 ]
 
-last_promo_time = 0.0
-last_seen_lang_code = "ru"  # used to pick RU vs EN promo
+# -------- Globals (shared by all streams) --------
 
-# -------- Globals --------
-translator = deepl.Translator(
-    config["DEEPL_API_KEY"],
-    server_url="https://api-free.deepl.com",
-)
-client = OpenAI(api_key=config["OPENAI_API_KEY"])
+# API clients are built on first use: the SDK imports alone take most of a
+# second and the YouTube service needs the OAuth token file
+_clients: dict = {}
+# One lock per client: building one (e.g. the YouTube token refresh) never
+# waits for another, so warm_up_clients really runs them in parallel
+_client_locks: dict[str, threading.Lock] = {}
+_client_locks_guard = threading.Lock()
+
+
+def _client(name: str, build):
+    client = _clients.get(name)
+    if client is None:
+        with _client_locks_guard:
+            lock = _client_locks.setdefault(name, threading.Lock())
+        with lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = build()
+    return client
+
+
+def get_translator():
+    def build():
+        import deepl
+
+        return deepl.Translator(get_config()["DEEPL_API_KEY"], server_url="https://api-free.deepl.com")
+
+    return _client("deepl", build)
+
+
+def get_openai_client():
+    def build():
+        from openai import OpenAI
+
+        return OpenAI(api_key=get_config()["OPENAI_API_KEY"])
+
+    return _client("openai", build)
 
-youtube = googleapiclient.discovery.build(
-    "youtube",
-    "v3",
-    credentials=Credentials.from_authorized_user_file(config["TOKEN_FILE"], SCOPES),
+
+def get_async_openai_client():
+    def build():
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(api_key=get_config()["OPENAI_API_KEY"], max_retries=1)
+
+    return _client("async_openai", build)
+
+
+def get_youtube():
+    def build():
+        import googleapiclient.discovery
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+
+        credentials = Credentials.from_authorized_user_file(get_config()["TOKEN_FILE"], SCOPES)
+        if not credentials.valid and credentials.refresh_token:
+            # Refresh now rather than inside the first chat poll
+            credentials.refresh(Request())
+        # The discovery document bundled with googleapiclient: no network fetch
+        return googleapiclient.discovery.build(
+            "youtube", "v3", credentials=credentials, static_discovery=True, cache_discovery=False,
+        )
+
+    return _client("youtube", build)
+
+
+async def get_youtube_async():
+    """get_youtube() for coroutines: a first build runs off the event loop."""
+    youtube = _clients.get("youtube")
+    if youtube is None:
+        youtube = await asyncio.to_thread(get_youtube)
+    return youtube
+
+
+async def warm_up_clients() -> None:
+    """Build all API clients in parallel threads (credentials file, token refresh, SDK imports)."""
+    results = await asyncio.gather(
+        *(asyncio.to_thread(get) for get in (get_youtube, get_translator, get_openai_client, get_async_openai_client)),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"⚠ Client initialization failed: {result}")
+
+
+reply_cache = ReplyCache()
+# Time-to-first-token / total latency of LLM completions (sums, see record_generation_latency)
+generation_stats = {"completions": 0, "cut_early": 0, "ttft_seconds": 0.0, "total_seconds": 0.0}
+openai_limiter = RateLimiter(
+    requests_per_minute=OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=OPENAI_TOKENS_PER_MINUTE,
+    max_concurrency=OPENAI_MAX_CONCURRENCY,
 )
 
-last_request_time = 0.0
-last_bot_post_time = 0.0
-processed_message_ids = deque(maxlen=MAX_TRACKED_MESSAGES)
-processed_message_ids_set: set[str] = set()
-next_page_token = None
+language_detector = LanguageDetector()
+
+translation_cache = TTLCache(
+    maxsize=TRANSLATION_CACHE_SIZE,
+    ttl=TRANSLATION_CACHE_TTL_SECONDS,
+    disk=DiskCache(TRANSLATION_CACHE_PATH) if TRANSLATION_CACHE_ON_DISK else None,
+)
 
-# Counter for "super-fun" mode
-message_counter = 0
-next_funny_in = random.randint(3, 5)
+youtube_quota = QuotaAccountant()
 
-# Likes and gratitude state
-seen_authors = set()
-last_like_check_time = 0.0
-last_like_count: int | None = None
+pipeline: Pipeline | None = None
+message_writer: MessageBatchWriter | None = None
+# Page tokens and seen message IDs on local disk, for warm restarts
+checkpoint_store: CheckpointStore | None = None
+# Last liveBroadcasts lookup: (monotonic time, broadcasts)
+_broadcast_cache: tuple[float, list[dict]] | None = None
+# Set while broadcast discovery runs; an ended chat wakes it up early
+discovery_wake: asyncio.Event | None = None
 
-last_gratitude_time = 0.0  # for likes + donations + donation-info text
-last_donation_info_time = 0.0
+# Live streams served by this process, by session key
+sessions: dict[str, StreamSession] = {}
 
 LANG_NAME_MAP = {
     "en": "English",
@@ -138,68 +324,103 @@ def initialize_chat_ids():
 
 # -------- Payment settings loader (from DB) --------
 
-def load_payment_settings_from_db() -> None:
+def apply_streamer_settings(session: StreamSession, row: dict) -> bool:
     """
-    Load payment settings (card, BuyMeACoffee, DonationAlerts) from public.streamer_settings.
-
-    For now we simply take the first row from streamer_settings.
-    Later we can bind this to a specific streamer_id.
+    Copy a public.streamer_settings row into the session, where every chat
+    path reads it from. Returns False if the row was already applied.
     """
-    global DONATION_CARD_TEXT, BUYMEACOFFEE_LINK, DONATIONALERTS_URL
-
-    client = get_supabase()
-    if client is None:
-        print("🚫 Supabase client is not initialized, using default payment settings.")
+    if row.get("updated_at") is not None and row.get("updated_at") == session.settings_updated_at:
+        return False
+    reload = session.settings_updated_at is not None
+    if not session.streamer_id and row.get("streamer_id"):
+        # Single-stream setup: the settings row says whose stream this is, so
+        # saved messages get streamer_id / subscriber_id
+        session.streamer_id = row["streamer_id"]
+
+    session.donation_card_text = row.get("card_number_full") or DONATION_CARD_TEXT
+    session.buymeacoffee_link = row.get("buymeacoffee_link") or BUYMEACOFFEE_LINK
+    session.donationalerts_url = row.get("donation_alerts_link") or DONATIONALERTS_URL
+    session.auto_translate = row.get("auto_translate") is not False
+    session.source_language = (row.get("source_language") or "ru").lower()
+    session.target_language = (row.get("target_language") or "ru").lower()
+    session.settings = row.get("settings") or {}
+    session.settings_updated_at = row.get("updated_at")
+
+    print(f"✅ [{session.key}] {'Reloaded' if reload else 'Loaded'} streamer settings from DB.")
+    print(f"   card_number_full: {'set' if session.donation_card_text else 'empty'}")
+    print(f"   buymeacoffee_link: {session.buymeacoffee_link or 'empty'}")
+    print(f"   donation_alerts_link: {session.donationalerts_url or 'empty'}")
+    print(f"   auto_translate: {session.auto_translate}, source_language: {session.source_language}")
+    return True
+
+
+async def load_streamer_settings(session: StreamSession) -> None:
+    """
+    First load when the stream starts. Uses the session's streamer_id if it
+    is known, otherwise the first row (the single-streamer setup).
+    """
+    rows = await asyncio.to_thread(
+        db.fetch_streamer_settings, [session.streamer_id] if session.streamer_id else None
+    )
+    if not rows:
+        print(f"ℹ️ [{session.key}] No streamer_settings found, using default settings.")
         return
+    apply_streamer_settings(session, rows[0])
 
-    try:
-        resp = (
-            client.table("streamer_settings")
-            .select("card_number_full, buymeacoffee_link, donation_alerts_link")
-            .limit(1)
-            .execute()
-        )
-        rows = resp.data or []
-        if not rows:
-            print("ℹ️ No streamer_settings rows found, using default payment settings.")
-            return
-
-        row = rows[0]
-
-        card = row.get("card_number_full") or ""
-        bmc = row.get("buymeacoffee_link") or ""
-        alerts = row.get("donation_alerts_link") or ""
 
-        if card:
-            DONATION_CARD_TEXT = card
-        if bmc:
-            BUYMEACOFFEE_LINK = bmc
-        if alerts:
-            DONATIONALERTS_URL = alerts
-
-        print("✅ Loaded payment settings from DB.")
-        print(f"   card_number_full: {'set' if card else 'empty'}")
-        print(f"   buymeacoffee_link: {BUYMEACOFFEE_LINK or 'empty'}")
-        print(f"   donation_alerts_link: {DONATIONALERTS_URL or 'empty'}")
-
-    except Exception as e:
-        print(f"⚠ Failed to load payment settings from DB: {e}")
-        print("ℹ️ Using default (empty) payment settings.")
+async def refresh_streamer_settings() -> int:
+    """
+    Pick up edited settings for all streams: one query for rows whose
+    updated_at moved past what the sessions have (an empty response when
+    nothing changed). Returns the number of sessions updated.
+    """
+    by_streamer: dict[str, list[StreamSession]] = {}
+    single: list[StreamSession] = []
+    for session in list(sessions.values()):
+        if session.streamer_id:
+            by_streamer.setdefault(session.streamer_id, []).append(session)
+        else:
+            single.append(session)
+
+    updated = 0
+    if by_streamer:
+        marks = [s.settings_updated_at for group in by_streamer.values() for s in group]
+        since = None if None in marks else min(marks)
+        rows = await asyncio.to_thread(db.fetch_streamer_settings, list(by_streamer), since)
+        for row in rows or []:
+            for session in by_streamer.get(row.get("streamer_id"), []):
+                updated += apply_streamer_settings(session, row)
+    if single:
+        rows = await asyncio.to_thread(db.fetch_streamer_settings, None)
+        for session in single:
+            if rows:
+                updated += apply_streamer_settings(session, rows[0])
+    return updated
+
+
+async def run_settings_refresh():
+    """Hot-reload streamer settings every SETTINGS_REFRESH_SECONDS; edits apply without a restart."""
+    while True:
+        await asyncio.sleep(SETTINGS_REFRESH_SECONDS)
+        try:
+            await refresh_streamer_settings()
+        except Exception as e:
+            print(f"⚠ Streamer settings refresh failed: {e}")
 
 
-def build_donation_info_text() -> str:
+def build_donation_info_text(session: StreamSession) -> str:
     """
-    Build donation info text dynamically based on the current
-    DONATION_CARD_TEXT / BUYMEACOFFEE_LINK / DONATIONALERTS_URL values.
+    Build donation info text dynamically based on the session's
+    card / BuyMeACoffee / DonationAlerts values.
     """
     parts: list[str] = []
 
-    if DONATION_CARD_TEXT:
-        parts.append(f"Карта: {DONATION_CARD_TEXT}")
-    if BUYMEACOFFEE_LINK:
-        parts.append(f"BuyMeACoffee: {BUYMEACOFFEE_LINK}")
-    if DONATIONALERTS_URL:
-        parts.append(f"DonationAlerts: {DONATIONALERTS_URL}")
+    if session.donation_card_text:
+        parts.append(f"Карта: {session.donation_card_text}")
+    if session.buymeacoffee_link:
+        parts.append(f"BuyMeACoffee: {session.buymeacoffee_link}")
+    if session.donationalerts_url:
+        parts.append(f"DonationAlerts: {session.donationalerts_url}")
 
     middle = " | ".join(parts) if parts else ""
     base = "Хочешь поддержать стрим или заказать музыку? 🎵 "
@@ -211,41 +432,70 @@ def build_donation_info_text() -> str:
     return base
 
 
-# -------- WebSocket handling --------
+# -------- YouTube calls --------
 
-async def handler(websocket):
-    print("🔌 New client connected")
-    connected_clients.add(websocket)
+async def youtube_call(call: str, request):
+    """
+    Execute a YouTube request and charge its quota units (see quota.py).
+    Raises QuotaExhausted instead of calling once the budget for `call` is used up.
+    """
+    if not youtube_quota.can_spend(call):
+        raise QuotaExhausted(f"no quota left for {call}")
+    youtube_quota.charge(call)
     try:
-        while True:
-            await asyncio.sleep(10)
-    except websockets.exceptions.ConnectionClosed:
-        print("❌ Client disconnected")
-    finally:
-        connected_clients.remove(websocket)
+        return await execute_youtube_request(request)
+    except Exception as e:
+        if youtube_error_reason(e) == "quotaExceeded":
+            youtube_quota.mark_exhausted()
+            raise QuotaExhausted(f"{call}: quotaExceeded") from e
+        raise
 
 
-async def broadcast_message(message_dict):
-    """Broadcast a JSON message to all connected WebSocket clients."""
-    if connected_clients:
-        message = json.dumps(message_dict)
-        print(f"📡 Broadcasting to {len(connected_clients)} clients: {message}")
-        await asyncio.gather(
-            *(client.send(message) for client in connected_clients),
-            return_exceptions=True,
-        )
+def apply_quota_pacing(session: StreamSession) -> None:
+    """Stretch the session's outbound post intervals to what the quota can afford."""
+    if session.outbound is None:
+        return
+    gap = max(BOT_COOLDOWN_SECONDS, youtube_quota.interval("liveChatMessages.insert", len(sessions)))
+    session.outbound.min_gap = gap
+    session.outbound.classes["reply"].min_interval = gap
+
+
+# -------- WebSocket handling --------
+
+def broadcast_message(message_dict):
+    """
+    Broadcast a JSON message to all connected WebSocket clients.
+    Never waits on a client: slow sockets get their own bounded queue in the hub.
+    """
+    # Always published: the replay buffer serves dashboards that connect later
+    seq = broadcast_hub.publish(message_dict)
+    if len(broadcast_hub):
+        print(f"📡 Broadcast #{seq} to {len(broadcast_hub)} clients: {json.dumps(message_dict)}")
     else:
-        print("⚠️ No connected clients to broadcast to.")
+        print(f"⚠️ No connected clients, broadcast #{seq} kept for replay.")
+
+
+def broadcast_bot_post(session: StreamSession, post: OutboundPost) -> None:
+    """Show what the bot posted into chat on the dashboards."""
+    broadcast_message({
+        "id": f"bot-{broadcast_hub.seq + 1}",
+        "author": "Alesha",
+        "content": build_chat_text(post.prefix, post.text),
+        "language": "",
+        "event": "bot_reply" if post.kind == "reply" else "bot_post",
+        "kind": post.kind,
+        "streamer": session.key,
+    })
 
 
 # -------- Language / translation helpers --------
 
-def detect_language(text: str) -> str:
-    """Detect language code using langdetect, fallback to 'unknown'."""
-    try:
-        return detect(text)
-    except Exception:
-        return "unknown"
+def detect_language(text: str, author_id: str | None = None) -> str:
+    """
+    Detect language code, fallback to 'unknown'.
+    Script heuristics and the author's recent language are tried before langdetect.
+    """
+    return language_detector.detect(text, author_id)
 
 
 def _extract_deepl_text(result):
@@ -255,14 +505,66 @@ def _extract_deepl_text(result):
     return result.text
 
 
+def translate_text_cached(text: str, target_lang: str) -> str:
+    """
+    Translate with DeepL through the translation cache.
+    Chat is very repetitive, so most lines are served from memory (or disk)
+    without spending DeepL characters.
+    """
+    key = (normalize_text(text), target_lang)
+    cached = translation_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = get_translator().translate_text(text, target_lang=target_lang)
+    translated = _extract_deepl_text(result)
+    translation_cache.set(key, translated)
+    return translated
+
+
+def translate_batch_to_russian(messages: list[str]) -> list[str]:
+    """
+    Translate many messages to Russian with at most ONE DeepL request.
+
+    Cached phrases are served from the translation cache; everything else
+    (deduplicated by normalized text) goes to DeepL as a single list, and each
+    message gets its own result back. On errors the original text is used.
+    """
+    results: list[str | None] = [None] * len(messages)
+    pending: dict[str, list[int]] = {}
+
+    for i, text in enumerate(messages):
+        key = normalize_text(text)
+        cached = translation_cache.get((key, "RU"))
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.setdefault(key, []).append(i)
+
+    if pending:
+        # One representative original text per normalized key
+        texts = [messages[indexes[0]] for indexes in pending.values()]
+        try:
+            response = get_translator().translate_text(texts, target_lang="RU")
+            translated = response if isinstance(response, list) else [response]
+            for (key, indexes), result in zip(pending.items(), translated):
+                translation_cache.set((key, "RU"), result.text)
+                for i in indexes:
+                    results[i] = result.text
+            print(f"🌍 Translated {len(texts)} message(s) to RU in one DeepL request.")
+        except Exception as e:
+            print(f"⚠ Translation Error: {e}")
+
+    return [res if res is not None else messages[i] for i, res in enumerate(results)]
+
+
 def translate_message(message: str, source_language: str):
     """
     Translate message to Russian (for context / UI) and back to original language via Russian.
     For Alesha persona we primarily care about the Russian translation as context.
     """
     try:
-        result_ru = translator.translate_text(message, target_lang="RU")
-        translated_to_russian = _extract_deepl_text(result_ru)
+        translated_to_russian = translate_text_cached(message, "RU")
         if source_language == "ru":
             return translated_to_russian, translated_to_russian
 
@@ -276,8 +578,7 @@ def translate_message(message: str, source_language: str):
             "ru": "RU",
         }.get(source_language, "EN-US")
 
-        result_back = translator.translate_text(translated_to_russian, target_lang=target)
-        translated_back = _extract_deepl_text(result_back)
+        translated_back = translate_text_cached(translated_to_russian, target)
         return translated_to_russian, translated_back
     except Exception as e:
         print(f"⚠ Translation Error: {e}")
@@ -299,83 +600,221 @@ def build_chat_text(prefix: str, text: str) -> str:
     return base[:keep] + "…"
 
 
-def send_message_to_chat(message: str, prefix: str = "🔴"):
-    """Send a message into YouTube live chat with length enforcement and update bot cooldown."""
-    global last_bot_post_time
+def trim_to_budget(text: str, budget: int) -> str:
+    """
+    Fit text into `budget` characters, preferring to cut at the end of a
+    sentence, then at a word boundary (with an ellipsis).
+    """
+    text = text.strip()
+    if len(text) <= budget:
+        return text
+
+    cut = text[:budget]
+    sentence_end = max(cut.rfind(mark) for mark in (".", "!", "?", "…"))
+    if sentence_end >= budget // 2:
+        return cut[:sentence_end + 1]
+
+    space = cut[:budget - 1].rfind(" ")
+    if space > 0:
+        return cut[:space].rstrip(",;:-–— ") + "…"
+    return cut[:budget - 1] + "…"
 
+
+async def send_message_to_chat(session: StreamSession, message: str, prefix: str = "🔴") -> bool:
+    """
+    Send a message into the session's YouTube live chat with length enforcement.
+    Returns True on success. Rate limits live in the session's outbound scheduler.
+    """
     try:
-        if not LIVE_CHAT_ID:
-            raise ValueError("LIVE_CHAT_ID is not set.")
+        if not session.live_chat_id:
+            raise ValueError("live_chat_id is not set.")
+        if session.chat_ended:
+            raise ValueError("the live chat has ended, waiting for the next broadcast.")
+        if session.lease_valid_until is not None and time.monotonic() > session.lease_valid_until:
+            # Another worker may own this stream by now: never post twice
+            raise ValueError("the stream lease could not be renewed in time.")
 
         final_text = build_chat_text(prefix, message)
 
-        youtube.liveChatMessages().insert(
+        youtube = await get_youtube_async()
+        request = youtube.liveChatMessages().insert(
             part="snippet",
             body={
                 "snippet": {
-                    "liveChatId": LIVE_CHAT_ID,
+                    "liveChatId": session.live_chat_id,
                     "type": "textMessageEvent",
                     "textMessageDetails": {
                         "messageText": final_text
                     },
                 }
             },
-        ).execute()
-        last_bot_post_time = time.time()
-        print(f"✅ Sent to YouTube chat: {final_text!r}")
+        )
+        await youtube_call("liveChatMessages.insert", request)
+        print(f"✅ [{session.key}] Sent to YouTube chat: {final_text!r}")
+        return True
     except Exception as e:
-        print(f"⚠ Failed to send to chat: {e}")
+        print(f"⚠ [{session.key}] Failed to send to chat: {e}")
+        return False
 
 
-def get_current_like_count() -> int | None:
-    """Fetch current like count for the active live stream."""
-    try:
-        if not LIVE_STREAM_ID:
-            return None
+async def fetch_stream_stats(video_ids: list[str]) -> dict[str, dict]:
+    """
+    Likes and concurrent viewers of many live streams: one multi-id
+    videos.list call per STATS_IDS_PER_REQUEST videos, trimmed with `fields`.
+    Returns {video_id: {"likes": int | None, "viewers": int | None}}.
+    """
+    stats: dict[str, dict] = {}
+    for start in range(0, len(video_ids), STATS_IDS_PER_REQUEST):
+        youtube = await get_youtube_async()
+        request = youtube.videos().list(
+            part="statistics,liveStreamingDetails",
+            id=",".join(video_ids[start:start + STATS_IDS_PER_REQUEST]),
+            fields=STREAM_STATS_FIELDS,
+        )
+        response = await youtube_call("videos.list", request)
+        for item in response.get("items", []):
+            likes = (item.get("statistics") or {}).get("likeCount")
+            viewers = (item.get("liveStreamingDetails") or {}).get("concurrentViewers")
+            stats[item["id"]] = {
+                "likes": int(likes) if likes is not None else None,
+                "viewers": int(viewers) if viewers is not None else None,
+            }
+    return stats
+
+
+# -------- Outbound scheduling --------
+
+def build_superchat_thanks(donors: list[dict]) -> str:
+    """Thank-you text for one or several Super Chats (donor + amount display string)."""
+    if len(donors) == 1:
+        donor_name = donors[0].get("donor") or "friend"
+        amount_str = donors[0].get("amount") or ""
+        if amount_str:
+            return (
+                f"Thank you for the Super Chat {amount_str}, {donor_name}! "
+                f"You keep this stream alive 💖"
+            )
+        return f"Thank you so much for your support, {donor_name}! 💖"
 
-        response = youtube.videos().list(
-            part="statistics",
-            id=LIVE_STREAM_ID,
-        ).execute()
+    names = ", ".join(
+        f"{d.get('donor')} ({d['amount']})" if d.get("amount") else str(d.get("donor"))
+        for d in donors
+    )
+    return trim_to_budget(
+        f"Thank you for the Super Chats, {names}! You keep this stream alive 💖",
+        REPLY_CHAR_BUDGET,
+    )
 
-        items = response.get("items", [])
-        if not items:
-            return None
 
-        stats = items[0].get("statistics", {})
-        like_count = int(stats.get("likeCount", 0))
-        return like_count
-    except Exception as e:
-        print(f"⚠ Failed to fetch like count: {e}")
-        return None
+def merge_superchat_thanks(posts: list[OutboundPost]) -> OutboundPost:
+    """Several pending Super Chat thanks become one chat message."""
+    donors = [post.data for post in posts]
+    return OutboundPost(build_superchat_thanks(donors), posts[0].prefix, "superchat", {"donors": donors})
 
 
-def maybe_send_gratitude(text: str, prefix: str = "💖") -> None:
+def build_outbound_scheduler(session: StreamSession) -> OutboundScheduler:
     """
-    Send a thank-you / donation-info message using a shared cooldown.
-    Likes, SuperChat, and donation-info text share the same 10-minute cooldown,
-    and also respect the global BOT_COOLDOWN_SECONDS.
+    One scheduler per stream, posting into that stream's chat.
+    Priorities: mention/AI replies > Super Chat thanks > like thanks > promo / donation info.
+    Any two posts are at least BOT_COOLDOWN_SECONDS apart, except replies,
+    whose slots are reserved (try_reserve) when a message is admitted.
     """
-    global last_gratitude_time, last_bot_post_time
+    async def send(text: str, prefix: str) -> bool:
+        return await send_message_to_chat(session, text, prefix)
+
+    return OutboundScheduler(
+        send,
+        [
+            OutboundClass("reply", 0, BOT_COOLDOWN_SECONDS, max_age=60, merge=None, bypass_gap=True),
+            OutboundClass(
+                "superchat", 1, SUPERCHAT_THANKS_INTERVAL_SECONDS, max_age=900,
+                merge=merge_superchat_thanks,
+            ),
+            OutboundClass(
+                "likes", 2, GRATITUDE_COOLDOWN_SECONDS, max_age=GRATITUDE_COOLDOWN_SECONDS,
+                merge=keep_latest,
+            ),
+            OutboundClass("promo", 3, PROMO_INTERVAL_SECONDS, max_age=300, merge=keep_latest),
+            OutboundClass(
+                "donation_info", 3, DONATION_INFO_INTERVAL_SECONDS, max_age=300, merge=keep_latest,
+            ),
+        ],
+        min_gap=BOT_COOLDOWN_SECONDS,
+        on_sent=lambda post: broadcast_bot_post(session, post),
+    )
+
+
+def submit_post(session: StreamSession, post: OutboundPost) -> None:
+    if session.outbound is None:
+        print(f"⚠ [{session.key}] Outbound scheduler is not running, dropping '{post.kind}' post.")
+        return
+    session.outbound.submit(post)
 
-    now = time.time()
 
-    # Shared gratitude cooldown
-    if now - last_gratitude_time < GRATITUDE_COOLDOWN_SECONDS:
-        print("⏱ Skipping gratitude message due to shared 10-min cooldown.")
-        return
+# -------- AI reply generation --------
 
-    # Also respect global bot cooldown, so we do not spam messages too frequently
-    if now - last_bot_post_time < BOT_COOLDOWN_SECONDS:
-        print("⏱ Skipping gratitude message due to global bot cooldown.")
-        return
+REPLY_SHY_FALLBACK = "Alesha got a little shy, send another message 😉"
+REPLY_ERROR_FALLBACK = "Alesha glitched for a sec, next message please ✨"
+
+
+def build_reply_messages(
+    original_message: str,
+    translated_ru: str,
+    source_language: str,
+    author_name: str,
+    joke_mode: bool = False,
+) -> list[dict]:
+    """Build the chat-completion messages (persona + task) for one reply."""
+    lang_code = (source_language or "unknown").lower()
+    lang_name = LANG_NAME_MAP.get(lang_code, "Unknown language")
+
+    style_line = (
+        "Сделай ответ особенно ярким, игривым, можно чуть более шуточным, но без кринжа. "
+        "Сейчас режим супер-весёлого тамады."
+        if joke_mode
+        else "Сделай ответ дружелюбным, тёплым, без лишнего кринжа. Лёгкий юмор допустим."
+    )
+
+    user_prompt = f"""
+        Original message (language code: {lang_code}, approx: {lang_name}):
+        {original_message}
+
+        Russian translation (for your understanding):
+        {translated_ru}
+
+        Author nickname in chat: {author_name}
+
+        Your task:
+        - Reply in the SAME LANGUAGE as the original message (language code: {lang_code}, approx: {lang_name}).
+        - 1–3 short sentences max.
+        - You can briefly reflect the meaning (like a playful paraphrase) and add emotion/banter.
+        - Do NOT say you are a bot or AI.
+        - Do NOT use phrases like "how can I help", "how may I help", "how can I be useful".
+        - {style_line}
+        If language code is "unknown", reply in a fun mix of Russian and English.
+    """
 
-    send_message_to_chat(text, prefix=prefix)
-    last_gratitude_time = now
-    # last_bot_post_time is updated inside send_message_to_chat
+    system_prompt = get_system_prompt_for_lang(lang_code)
 
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def finalize_reply(content: str | None) -> str:
+    """Strip the model output and fit it into one chat message, with a fallback for empty answers."""
+    if not content or not content.strip():
+        return REPLY_SHY_FALLBACK
+
+    return trim_to_budget(content, REPLY_CHAR_BUDGET)
+
+
+def estimate_tokens(messages: list[dict], max_tokens: int) -> int:
+    """Rough token estimate (≈4 chars per token) used to pre-charge the tokens/min bucket."""
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    return prompt_chars // 4 + max_tokens
 
-# -------- AI reply generation --------
 
 def generate_alesha_reply(
     original_message: str,
@@ -387,266 +826,1111 @@ def generate_alesha_reply(
     """
     Generate a short, lively reply from Alesha in the SAME LANGUAGE as the sender.
     Uses SYSTEM_PROMPT_ALESHA persona.
-    """
-    global last_request_time
 
+    Synchronous version for scripts and tests; the bot itself uses
+    generate_alesha_reply_async, which is rate limited.
+    """
     try:
-        # Simple rate limiting to avoid hammering OpenAI
-        if time.time() - last_request_time < 2:
-            time.sleep(2)
-
-        lang_code = (source_language or "unknown").lower()
-        lang_name = LANG_NAME_MAP.get(lang_code, "Unknown language")
-
-        style_line = (
-            "Сделай ответ особенно ярким, игривым, можно чуть более шуточным, но без кринжа. "
-            "Сейчас режим супер-весёлого тамады."
-            if joke_mode
-            else "Сделай ответ дружелюбным, тёплым, без лишнего кринжа. Лёгкий юмор допустим."
+        response = get_openai_client().chat.completions.create(
+            model=OPENAI_MODEL,
+            temperature=0.9 if joke_mode else 0.6,
+            max_tokens=REPLY_MAX_TOKENS,
+            messages=build_reply_messages(
+                original_message, translated_ru, source_language, author_name, joke_mode
+            ),
         )
+        return finalize_reply(response.choices[0].message.content)
 
-        user_prompt = f"""
-            Original message (language code: {lang_code}, approx: {lang_name}):
-            {original_message}
+    except Exception as e:
+        print(f"⚠ AI Tamada Error: {e}")
+        return REPLY_ERROR_FALLBACK
 
-            Russian translation (for your understanding):
-            {translated_ru}
 
-            Author nickname in chat: {author_name}
+def record_generation_latency(ttft: float | None, total: float, chars: int, cut_early: bool) -> None:
+    """Update the running generation metrics and log this completion."""
+    generation_stats["completions"] += 1
+    generation_stats["total_seconds"] += total
+    if ttft is not None:
+        generation_stats["ttft_seconds"] += ttft
+    if cut_early:
+        generation_stats["cut_early"] += 1
 
-            Your task:
-            - Reply in the SAME LANGUAGE as the original message (language code: {lang_code}, approx: {lang_name}).
-            - 1–3 short sentences max.
-            - You can briefly reflect the meaning (like a playful paraphrase) and add emotion/banter.
-            - Do NOT say you are a bot or AI.
-            - Do NOT use phrases like "how can I help", "how may I help", "how can I be useful".
-            - {style_line}
-            If language code is "unknown", reply in a fun mix of Russian and English.
-        """
+    ttft_text = f"{ttft:.2f}s" if ttft is not None else "n/a"
+    note = ", stopped early at the length budget" if cut_early else ""
+    print(f"⏱ LLM: first token {ttft_text}, total {total:.2f}s, {chars} chars{note}")
 
-        system_prompt = get_system_prompt_for_lang(lang_code)
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            temperature=0.9 if joke_mode else 0.6,
-            max_tokens=80,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+async def stream_chat_async(
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    char_budget: int,
+) -> tuple[str, int]:
+    """
+    Stream a completion and stop reading (closing the connection) once the
+    text grows past `char_budget`; the result is cut back to the last
+    sentence boundary inside the budget. Returns (text, chunks received).
+    """
+    started = time.monotonic()
+    first_token_at: float | None = None
+    parts: list[str] = []
+    length = 0
+    chunks = 0
+    cut_early = False
+
+    stream = await get_async_openai_client().chat.completions.create(
+        model=OPENAI_MODEL,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        messages=messages,
+        stream=True,
+    )
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            if not delta:
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            chunks += 1
+            parts.append(delta)
+            length += len(delta)
+            if length > char_budget:
+                cut_early = True
+                break
+    finally:
+        await stream.response.aclose()
+
+    text = "".join(parts)
+    if cut_early:
+        text = trim_to_budget(text, char_budget)
+
+    ttft = first_token_at - started if first_token_at is not None else None
+    record_generation_latency(ttft, time.monotonic() - started, len(text), cut_early)
+    return text, chunks
+
+
+async def complete_chat_async(
+    messages: list[dict],
+    temperature: float,
+    max_tokens: int,
+    char_budget: int | None = None,
+) -> str | None:
+    """
+    One chat completion through the shared OpenAI limiter (requests/min,
+    tokens/min and a concurrency cap) with a per-request timeout.
+
+    With a `char_budget` (and STREAM_REPLIES on) the completion is streamed
+    and cut off at the budget. Returns the raw content; raises on errors
+    and asyncio.TimeoutError.
+    """
+    estimated = estimate_tokens(messages, max_tokens)
+
+    if STREAM_REPLIES and char_budget:
+        async with openai_limiter.limit(estimated):
+            text, chunks = await asyncio.wait_for(
+                stream_chat_async(messages, temperature, max_tokens, char_budget),
+                timeout=OPENAI_TIMEOUT_SECONDS,
+            )
+        # Streams do not report usage; one chunk is roughly one token
+        openai_limiter.record_usage(estimated - max_tokens + chunks, estimated)
+        return text
+
+    started = time.monotonic()
+    async with openai_limiter.limit(estimated):
+        response = await asyncio.wait_for(
+            get_async_openai_client().chat.completions.create(
+                model=OPENAI_MODEL,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                messages=messages,
+            ),
+            timeout=OPENAI_TIMEOUT_SECONDS,
         )
 
-        content = response.choices[0].message.content
-        if not content:
-            return "Alesha got a little shy, send another message 😉"
+    usage = getattr(response, "usage", None)
+    total_tokens = getattr(usage, "total_tokens", None)
+    if isinstance(total_tokens, int):
+        openai_limiter.record_usage(total_tokens, estimated)
+
+    content = response.choices[0].message.content
+    record_generation_latency(None, time.monotonic() - started, len(content or ""), False)
+    return content
+
 
-        reply = content.strip()
-        if len(reply) > 180:
-            reply = reply[:177] + "..."
+async def generate_alesha_reply_async(
+    original_message: str,
+    translated_ru: str,
+    source_language: str,
+    author_name: str,
+    joke_mode: bool = False,
+) -> str:
+    """
+    Async version of generate_alesha_reply used by the pipeline.
+    Rate limited and timed out, so several replies can be generated in
+    parallel without ever blocking the event loop.
+    """
+    messages = build_reply_messages(
+        original_message, translated_ru, source_language, author_name, joke_mode
+    )
 
-        last_request_time = time.time()
-        return reply
+    try:
+        content = await complete_chat_async(
+            messages,
+            temperature=0.9 if joke_mode else 0.6,
+            max_tokens=REPLY_MAX_TOKENS,
+            char_budget=REPLY_CHAR_BUDGET,
+        )
+        return finalize_reply(content)
 
+    except asyncio.TimeoutError:
+        print(f"⏱ AI Tamada timed out after {OPENAI_TIMEOUT_SECONDS}s")
+        return REPLY_ERROR_FALLBACK
     except Exception as e:
         print(f"⚠ AI Tamada Error: {e}")
-        return "Alesha glitched for a sec, next message please ✨"
+        return REPLY_ERROR_FALLBACK
+
+
+async def generate_reply_cached(
+    original_message: str,
+    translated_ru: str,
+    source_language: str,
+    author_name: str,
+    joke_mode: bool = False,
+    check_cache: bool = True,
+) -> str:
+    """
+    Serve greetings / one-word reactions from the reply cache; everything
+    else (and cache keys that still collect variants) goes to OpenAI.
+    `check_cache=False` when the caller already looked it up (a miss).
+    """
+    if check_cache:
+        cached = reply_cache.lookup(original_message, source_language, joke_mode, author_name)
+        if cached is not None:
+            print(f"⚡ Reply cache hit for {original_message!r}")
+            return cached
+
+    reply = await generate_alesha_reply_async(
+        original_message=original_message,
+        translated_ru=translated_ru,
+        source_language=source_language,
+        author_name=author_name,
+        joke_mode=joke_mode,
+    )
+    if reply not in (REPLY_SHY_FALLBACK, REPLY_ERROR_FALLBACK):
+        reply_cache.add(original_message, source_language, joke_mode, reply, author_name)
+    return reply
+
+
+async def warmup_reply_cache() -> None:
+    """Collect reply variants for common openers in every known language."""
+    jobs = []
+    for lang_code, phrases in WARMUP_PHRASES.items():
+        if lang_code not in LANG_NAME_MAP:
+            continue
+        for phrase in phrases:
+            for _ in range(reply_cache.variants_per_key):
+                jobs.append(generate_reply_cached(
+                    original_message=phrase,
+                    translated_ru=phrase,
+                    source_language=lang_code,
+                    author_name=AUTHOR_PLACEHOLDER,
+                ))
+
+    print(f"🔥 Warming up reply cache with {len(jobs)} request(s)...")
+    await asyncio.gather(*jobs, return_exceptions=True)
+    print(f"✅ Reply cache warm: {reply_cache.stats()}")
+
+
+def build_coalesced_reply_messages(items: list["ChatItem"]) -> list[dict]:
+    """Prompt for ONE chat message that answers several viewers at once."""
+    languages = [item.language for item in items if item.language and item.language != "unknown"]
+    lang_code = max(set(languages), key=languages.count) if languages else items[0].session.source_language
+    lang_name = LANG_NAME_MAP.get(lang_code, "Russian")
+    budget = MAX_YT_MESSAGE_LEN - 10
+
+    lines = []
+    for item in items:
+        line = f"- {item.author} (language code: {item.language}): {item.message}"
+        if item.translated_ru and item.translated_ru != item.message:
+            line += f" [RU: {item.translated_ru}]"
+        lines.append(line)
+    viewer_lines = "\n".join(lines)
+
+    user_prompt = f"""
+        Several viewers wrote in chat at the same time:
+        {viewer_lines}
+
+        Your task:
+        - Write ONE short chat message that answers all of them together.
+        - Address every viewer by nickname (e.g. "{items[0].author}, ..."), a few words each.
+        - Write mostly in {lang_name} (language code: {lang_code}); a word in a viewer's own language is welcome.
+        - The whole message MUST be shorter than {budget} characters.
+        - Do NOT say you are a bot or AI.
+        - Do NOT use phrases like "how can I help", "how may I help", "how can I be useful".
+    """
+
+    return [
+        {"role": "system", "content": get_system_prompt_for_lang(lang_code)},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+async def generate_coalesced_reply_async(items: list["ChatItem"]) -> str | None:
+    """One LLM call for several viewers; None on errors (nothing is posted then)."""
+    try:
+        content = await complete_chat_async(
+            build_coalesced_reply_messages(items),
+            temperature=0.7,
+            max_tokens=COALESCED_REPLY_MAX_TOKENS,
+            char_budget=REPLY_CHAR_BUDGET,
+        )
+    except asyncio.TimeoutError:
+        print(f"⏱ Combined reply timed out after {OPENAI_TIMEOUT_SECONDS}s")
+        return None
+    except Exception as e:
+        print(f"⚠ Combined reply error: {e}")
+        return None
+
+    if not content:
+        return None
+    # Leave room for the chat prefix added by build_chat_text
+    return trim_to_budget(content, REPLY_CHAR_BUDGET)
+
+
+# -------- Message pipeline (detect → persist → translate → reply → send) --------
+
+@dataclass
+class ChatItem:
+    """One incoming chat message travelling through the pipeline."""
+
+    session: StreamSession
+    msg_id: str
+    author: str
+    author_id: str
+    message: str
+    snippet: dict
+    author_details: dict
+    language: str = "unknown"
+    is_owner: bool = False
+    addressed_bot: bool = False
+    wants_reply: bool = False
+    reserved_slot: bool = False  # holds an outbound "reply" reservation
+    settled: bool = False  # persisted or done: no longer holds the checkpoint back
+    joke_mode: bool | None = None  # decided once, before the reply cache lookup
+    cached_reply: str | None = None  # found before translation: no DeepL / OpenAI call
+    translated_ru: str = ""
+    reply: OutboundPost | None = None
+    # Fetched again after a stream takeover: the previous owner may already have handled it
+    backfill: bool = False
+
+    def to_payload(self) -> dict:
+        return {
+            "id": self.msg_id,
+            "author": self.author,
+            "content": self.message,
+            "language": self.language,
+            "event": "superchat" if self.snippet.get("type") == "superChatEvent" else "chat",
+            "author_id": self.author_id,
+            "streamer": self.session.key,
+        }
+
+
+async def detect_stage(item: ChatItem) -> ChatItem | None:
+    """
+    Detect language, mention and Super Chat, broadcast to the frontend
+    and decide whether this message gets an AI reply.
+    """
+    session = item.session
+    item.language = detect_language(item.message, item.author_id)
+
+    # Takeover backfill is only stored (upserts are idempotent): no broadcast,
+    # thanks or reply, so nothing shows up twice in chat or on the dashboards
+    if item.backfill:
+        if item.author_details.get("isChatOwner"):
+            settle_item(item)
+            return None
+        return item
+
+    # Track last seen language to choose promo language (RU/EN)
+    if item.language and item.language != "unknown":
+        session.last_seen_lang_code = item.language.lower()
+
+    item.is_owner = bool(item.author_details.get("isChatOwner"))
+    text_lower = (item.message or "").lower()
+    item.addressed_bot = any(key in text_lower for key in MENTION_KEYWORDS)
+
+    # Detect Super Chat / donation events; thanks that pile up are merged by the scheduler
+    event_type = item.snippet.get("type")
+    super_chat_details = item.snippet.get("superChatDetails")
+
+    if event_type == "superChatEvent" and super_chat_details:
+        donor = {
+            "donor": item.author,
+            "amount": super_chat_details.get("amountDisplayString") or "",
+        }
+        submit_post(session, OutboundPost(build_superchat_thanks([donor]), "💖", "superchat", donor))
+
+    broadcast_message(item.to_payload())
+
+    # Channel-owner messages are only broadcast: no DB save and no AI reply
+    if item.is_owner:
+        settle_item(item)
+        return None
+
+    # Respect bot reply cooldown for normal chat replies.
+    # Admitting a reply reserves the slot in the outbound scheduler right away,
+    # so messages that arrive before the reply is posted do not get their own reply.
+    if session.outbound is not None and session.outbound.try_reserve("reply"):
+        item.wants_reply = True
+        item.reserved_slot = True
+    elif COALESCE_REPLIES:
+        # Answered together with the others once the cooldown window ends
+        if item.message != NON_TEXT_MESSAGE:
+            session.coalesce_buffer.append(item)
+    elif item.addressed_bot:
+        # Without coalescing, mentions always get their own reply
+        item.wants_reply = True
+
+    return item
+
+
+async def persist_stage(items: list[ChatItem]) -> list[ChatItem]:
+    """
+    Spool the user messages locally for the batched Supabase writer (one
+    SQLite transaction off the event loop here, one bulk upsert per batch
+    later, replayed after outages); only reply candidates go further.
+    """
+    if message_writer is not None:
+        await message_writer.enqueue_many([
+            {**item.to_payload(), "streamer_id": item.session.streamer_id} for item in items
+        ])
+    for item in items:
+        settle_item(item)
+    return [item for item in items if item.wants_reply]
+
+
+async def translate_stage(items: list[ChatItem]) -> list[ChatItem]:
+    """
+    Translate reply candidates to Russian (context for the AI reply).
+
+    Only messages that will actually get a reply reach this stage, Russian
+    messages (all of them if the streamer turned auto_translate off) are used as-is, and the rest of a poll page goes to DeepL in
+    one batch request. The back-translation is never needed here, and
+    neither is the translation of a message answered from the reply cache
+    (looked up here, on the original text).
+    """
+    to_translate = []
+    for item in items:
+        if ReplyCache.is_cacheable(item.message):
+            item.joke_mode = item.session.next_joke_mode()
+            item.cached_reply = reply_cache.lookup(item.message, item.language, item.joke_mode, item.author)
+            if item.cached_reply is not None:
+                print(f"⚡ Reply cache hit for {item.message!r}")
+        # auto_translate off (streamer_settings): the model gets the original text
+        if (
+            item.cached_reply is not None
+            or not item.session.auto_translate
+            or (item.language or "").lower().startswith("ru")
+        ):
+            item.translated_ru = item.message
+        else:
+            to_translate.append(item)
+
+    if to_translate:
+        translations = await asyncio.to_thread(
+            translate_batch_to_russian, [item.message for item in to_translate]
+        )
+        for item, translated in zip(to_translate, translations):
+            item.translated_ru = translated
+
+    return items
+
+
+async def reply_stage(item: ChatItem) -> ChatItem:
+    """Generate Alesha's reply, occasionally in "super-fun" mode (counted per stream)."""
+    looked_up = item.joke_mode is not None
+    is_funny = item.joke_mode if looked_up else item.session.next_joke_mode()
+
+    if item.cached_reply is not None:
+        reply_text = item.cached_reply
+    else:
+        reply_text = await generate_reply_cached(
+            original_message=item.message,
+            translated_ru=item.translated_ru,
+            source_language=item.language,
+            author_name=item.author,
+            joke_mode=is_funny,
+            check_cache=not looked_up,
+        )
+
+    prefix = "🎉" if is_funny else "💬"
+    item.reply = OutboundPost(reply_text, prefix, "reply", reserved=item.reserved_slot)
+    return item
+
+
+async def send_stage(item: ChatItem) -> None:
+    """Hand the reply to the stream's outbound scheduler, which decides when it is posted."""
+    if item.reply is not None:
+        submit_post(item.session, item.reply)
+        item.reserved_slot = False  # the submitted post uses the reservation now
+    return None
+
+
+def settle_item(item: ChatItem) -> None:
+    """The message is spooled (or needs no saving): checkpoints may move past it."""
+    if not item.settled:
+        item.settled = True
+        item.session.message_settled(item.msg_id)
+
+
+def drop_item(item) -> None:
+    """
+    An item left the pipeline early (full stage, failed stage): it is never
+    retried, so stop holding the checkpoint back and free its reply slot.
+    """
+    if isinstance(item, ChatItem):
+        settle_item(item)
+        release_reply_slot(item)
+
+
+def release_reply_slot(item) -> None:
+    """
+    A reply candidate left the pipeline without a reply (dropped by a full
+    stage, or its stage failed): give its outbound reservation back right
+    away instead of blocking lower classes until it expires.
+    """
+    if isinstance(item, ChatItem) and item.reserved_slot:
+        item.reserved_slot = False
+        if item.session.outbound is not None:
+            item.session.outbound.release("reply")
+
+
+def build_pipeline() -> Pipeline:
+    """
+    Wire the per-message stages. Stages up to persist apply backpressure
+    (every message must be saved); translate/reply drop when their queue is
+    full, so a slow OpenAI/DeepL never stalls ingest or persistence; a
+    dropped reply candidate releases its outbound reservation.
+    """
+    workers = PIPELINE_STAGE_WORKERS
+    size = PIPELINE_QUEUE_SIZE
+    return Pipeline([
+        Stage("detect", detect_stage, workers["detect"], size),
+        Stage("persist", persist_stage, workers["persist"], size, batch_size=PERSIST_BATCH_SIZE),
+        Stage(
+            "translate", translate_stage, workers["translate"], size, drop_when_full=True,
+            batch_size=TRANSLATE_BATCH_SIZE, batch_window=TRANSLATE_BATCH_WINDOW_SECONDS,
+        ),
+        Stage("reply", reply_stage, workers["reply"], size, drop_when_full=True),
+        Stage("send", send_stage, workers["send"], size, drop_when_full=True),
+    ], on_drop=drop_item)
+
+
+async def pipeline_put(stage_name: str, item) -> bool:
+    if pipeline is None:
+        print(f"⚠ Pipeline is not running, dropping item for '{stage_name}'.")
+        return False
+    return await pipeline.put(stage_name, item)
+
+
+def take_coalesce_batch(session: StreamSession) -> list[ChatItem]:
+    """
+    Empty the session's coalescing buffer and pick whom to answer: one message
+    per author (their newest, or the one that mentions the bot), mentions
+    first, then the most recent, at most COALESCE_MAX_AUTHORS.
+    """
+    items = list(session.coalesce_buffer)
+    session.coalesce_buffer.clear()
+
+    by_author: dict[str, tuple[int, ChatItem]] = {}
+    for position, item in enumerate(items):
+        current = by_author.get(item.author_id)
+        if current is None or item.addressed_bot or not current[1].addressed_bot:
+            by_author[item.author_id] = (position, item)
+
+    ranked = sorted(by_author.values(), key=lambda pair: (not pair[1].addressed_bot, -pair[0]))
+    return [item for _, item in ranked[:COALESCE_MAX_AUTHORS]]
+
+
+async def run_reply_coalescer(session: StreamSession):
+    """
+    When the stream's cooldown window ends, answer the messages collected during it:
+    a single message goes through the normal translate → reply path, several
+    messages get one combined reply (one OpenAI call, one YouTube insert).
+    """
+    while True:
+        await asyncio.sleep(COALESCE_TICK_SECONDS)
+        outbound = session.outbound
+        holding = False  # a reservation nobody else will submit or release
+        try:
+            if not session.coalesce_buffer or outbound is None:
+                continue
+            if not outbound.try_reserve("reply"):
+                continue
+            holding = True
+
+            batch = take_coalesce_batch(session)
+
+            if len(batch) == 1:
+                batch[0].wants_reply = True
+                batch[0].reserved_slot = True
+                holding = False  # the item owns it now
+                if not await pipeline_put("translate", batch[0]):
+                    release_reply_slot(batch[0])
+                continue
+
+            # auto_translate off (streamer_settings): viewers' own words only
+            to_translate = [
+                item for item in batch
+                if session.auto_translate and not item.language.lower().startswith("ru")
+            ]
+            if to_translate:
+                translations = await asyncio.to_thread(
+                    translate_batch_to_russian, [item.message for item in to_translate]
+                )
+                for item, translated in zip(to_translate, translations):
+                    item.translated_ru = translated
+
+            reply_text = await generate_coalesced_reply_async(batch)
+            if reply_text:
+                names = ", ".join(item.author for item in batch)
+                print(f"🧺 [{session.key}] Combined reply for {len(batch)} viewers: {names}")
+                submit_post(session, OutboundPost(reply_text, "💬", "reply", reserved=True))
+            else:
+                outbound.release("reply")
+            holding = False
+
+        except Exception as e:
+            print(f"⚠ [{session.key}] Reply coalescer error: {e}")
+            if holding:
+                outbound.release("reply")
 
 
 # -------- Main loop --------
 
-async def fetch_and_process_messages():
+def thank_for_likes(session: StreamSession, like_count: int) -> None:
+    """Queue a thank-you post when the stream got new likes."""
+    if session.last_like_count is None:
+        # First initialization — just store current like count
+        session.last_like_count = like_count
+        return
+    if like_count <= session.last_like_count:
+        return
+
+    diff = like_count - session.last_like_count
+    session.last_like_count = like_count
+
+    if like_count in (10, 25, 50, 100):
+        text = (
+            f"✨ Маленький юбилей — {like_count} лайков! "
+            f"Вы делаете этот стрим живым, люблю вас."
+        )
+    elif diff == 1:
+        text = f"💗 Вижу новый лайк, спасибо вам! Сейчас их уже {like_count}."
+    elif diff < 5:
+        text = f"💗 Спасибо за ваши лайки! Ещё +{diff}, теперь их {like_count}."
+    else:
+        text = (
+            f"✨ Вы засыпали стрим лайками (+{diff})! "
+            f"Уже {like_count}, я в восторге."
+        )
+
+    # A newer like thank-you replaces one that is still waiting
+    submit_post(session, OutboundPost(text, "💖", "likes"))
+
+
+async def run_stream_stats():
+    """
+    Likes and concurrent viewers for every stream of this process, fetched
+    together (fetch_stream_stats) instead of one request per stream.
+    """
+    while True:
+        by_video: dict[str, list[StreamSession]] = {}
+        for session in sessions.values():
+            if session.live_stream_id:
+                by_video.setdefault(session.live_stream_id, []).append(session)
+        try:
+            if by_video:
+                stats = await fetch_stream_stats(list(by_video))
+                for video_id, entry in stats.items():
+                    for session in by_video.get(video_id, []):
+                        session.concurrent_viewers = entry["viewers"]
+                        if entry["likes"] is not None:
+                            thank_for_likes(session, entry["likes"])
+        except Exception as e:
+            print(f"⚠ Failed to fetch stream stats: {e}")
+
+        requests_per_round = max(1, -(-len(by_video) // STATS_IDS_PER_REQUEST))
+        await asyncio.sleep(max(LIKE_CHECK_INTERVAL, youtube_quota.interval("videos.list", requests_per_round)))
+
+
+async def run_periodic_posts(session: StreamSession):
     """
-    Main loop:
-    - periodically checks likes and (if cooldown allows) sends thank-you messages;
-    - periodically sends promo/CTA messages (likes + subscribe + music orders);
-    - periodically sends donation-info text (card, BuyMeACoffee, DonationAlerts);
-    - reads new messages from YouTube;
-    - stores each user message in Supabase (except channel-owner messages);
-    - replies no more often than BOT_COOLDOWN_SECONDS (unless bot is mentioned explicitly);
-    - broadcasts user messages to WebSocket clients;
-    - uses a shared 10-min gratitude cooldown for likes, donations, and donation-info.
+    Periodic bot posts for one stream, independent of chat polling:
+    - queues promo/CTA messages (likes + subscribe + music orders);
+    - queues donation-info text (card, BuyMeACoffee, DonationAlerts).
+    Rate limits and priorities are applied by the stream's outbound scheduler.
     """
-    global next_page_token, message_counter, next_funny_in
-    global last_like_check_time, last_like_count, last_bot_post_time
-    global last_donation_info_time, last_promo_time, last_seen_lang_code
+    while True:
+        try:
+            apply_quota_pacing(session)
+
+            outbound = session.outbound
+            if outbound is None:
+                raise RuntimeError("outbound scheduler is not running")
+
+            # 1) Promo/CTA message (likes + subscribe + music orders) in RU/EN, once per PROMO_INTERVAL_SECONDS
+            if outbound.is_due("promo"):
+                # Choose language: Russian by default, English otherwise
+                lang_code = (session.last_seen_lang_code or session.source_language or "ru").lower()
+                if lang_code.startswith("ru"):
+                    promo_pool = PROMO_MESSAGES_RU
+                else:
+                    promo_pool = PROMO_MESSAGES_EN
+
+                submit_post(session, OutboundPost(random.choice(promo_pool), "📣", "promo"))
+
+            # 2) Donation info (card + BuyMeACoffee + DonationAlerts), once per DONATION_INFO_INTERVAL_SECONDS
+            if outbound.is_due("donation_info"):
+                submit_post(session, OutboundPost(build_donation_info_text(session), "💸", "donation_info"))
+
+        except Exception as e:
+            print(f"⚠ [{session.key}] Periodic posts error: {e}")
+
+        await asyncio.sleep(PERIODIC_POSTS_TICK_SECONDS)
+
 
+async def fetch_and_process_messages(session: StreamSession):
+    """
+    Ingest loop for one stream:
+    - reads new messages from YouTube every `pollingIntervalMillis`, or less
+      often when the daily quota cannot afford that pace;
+    - skips already processed message IDs (sliding window);
+    - hands every new message to the pipeline and goes straight back to polling.
+
+    Everything else happens in the pipeline stages: language detection and
+    broadcasting (detect), batched Supabase write (persist), DeepL (translate),
+    OpenAI (reply) and the stream's outbound scheduler (send).
+    Errors are retried with exponential backoff; without quota the loop
+    waits for the daily reset.
+    """
+    backoff = Backoff(YOUTUBE_ERROR_BACKOFF_SECONDS, YOUTUBE_ERROR_BACKOFF_CAP_SECONDS)
     while True:
         try:
-            now = time.time()
-
-            # 1) Periodically check likes and thank viewers for new ones
-            if now - last_like_check_time > LIKE_CHECK_INTERVAL:
-                like_count = get_current_like_count()
-                last_like_check_time = now
-
-                if like_count is not None:
-                    if last_like_count is None:
-                        # First initialization — just store current like count
-                        last_like_count = like_count
-                    elif like_count > last_like_count:
-                        diff = like_count - last_like_count
-                        last_like_count = like_count
-
-                        if like_count in (10, 25, 50, 100):
-                            text = (
-                                f"✨ Маленький юбилей — {like_count} лайков! "
-                                f"Вы делаете этот стрим живым, люблю вас."
-                            )
-                        elif diff == 1:
-                            text = f"💗 Вижу новый лайк, спасибо вам! Сейчас их уже {like_count}."
-                        elif diff < 5:
-                            text = f"💗 Спасибо за ваши лайки! Ещё +{diff}, теперь их {like_count}."
-                        else:
-                            text = (
-                                f"✨ Вы засыпали стрим лайками (+{diff})! "
-                                f"Уже {like_count}, я в восторге."
-                            )
-
-                        # Likes use shared gratitude cooldown (likes + donations + donation-info)
-                        maybe_send_gratitude(text, prefix="💖")
-
-            # 2) Periodically send promo/CTA message (likes + subscribe + music orders) in RU/EN
-            if now - last_promo_time > PROMO_INTERVAL_SECONDS:
-                # Respect global reply cooldown so the bot does not spam
-                if time.time() - last_bot_post_time >= BOT_COOLDOWN_SECONDS:
-                    # Choose language: Russian by default, English otherwise
-                    lang_code = (last_seen_lang_code or "ru").lower()
-                    if lang_code.startswith("ru"):
-                        promo_pool = PROMO_MESSAGES_RU
-                    else:
-                        promo_pool = PROMO_MESSAGES_EN
-
-                    promo_text = random.choice(promo_pool)
-                    send_message_to_chat(promo_text, prefix="📣")
-                    last_promo_time = time.time()
-
-            # 3) Periodically show donation info (card + BuyMeACoffee + DonationAlerts) using shared cooldown
-            if now - last_donation_info_time > DONATION_INFO_INTERVAL_SECONDS:
-                donation_text = build_donation_info_text()
-                maybe_send_gratitude(donation_text, prefix="💸")
-                last_donation_info_time = now
-
-            # 4) Read new messages from YouTube Live Chat
+            # Read new messages from YouTube Live Chat (off the event loop, with timeout)
+            youtube = await get_youtube_async()
             request = youtube.liveChatMessages().list(
-                liveChatId=LIVE_CHAT_ID,
+                liveChatId=session.live_chat_id,
                 part="snippet,authorDetails",
-                pageToken=next_page_token,
+                pageToken=session.next_page_token,
+                fields=CHAT_LIST_FIELDS,
+            )
+            response = await youtube_call("liveChatMessages.list", request)
+            backoff.reset()
+            polling_interval = max(
+                response.get("pollingIntervalMillis", 2000) / 1000.0,
+                youtube_quota.interval("liveChatMessages.list", len(sessions)),
             )
-            response = request.execute()
-            next_page_token = response.get("nextPageToken")
-            polling_interval = response.get("pollingIntervalMillis", 2000) / 1000.0
+            backfill, session.backfill_first_page = session.backfill_first_page, False
 
             for item in response.get("items", []):
                 msg_id = item["id"]
-                if msg_id in processed_message_ids_set:
+                # Sliding window of processed message IDs
+                if not session.remember_message(msg_id):
                     continue
 
-                # Maintain a sliding window of processed message IDs
-                if len(processed_message_ids) >= MAX_TRACKED_MESSAGES:
-                    old_id = processed_message_ids.popleft()
-                    processed_message_ids_set.discard(old_id)
-
-                processed_message_ids.append(msg_id)
-                processed_message_ids_set.add(msg_id)
-
                 snippet = item.get("snippet", {}) or {}
-                message = snippet.get("displayMessage", "[Non-text message]")
                 author_details = item.get("authorDetails", {}) or {}
 
                 author = author_details.get("displayName", "Unknown")
-                detected_lang = detect_language(message)
-
-                # Track last seen language to choose promo language (RU/EN)
-                if detected_lang and detected_lang != "unknown":
-                    last_seen_lang_code = detected_lang.lower()
-
-                is_owner = bool(author_details.get("isChatOwner"))
-                text_lower = (message or "").lower()
-                addressed_bot = any(key in text_lower for key in MENTION_KEYWORDS)
-
-                # 4a) Detect Super Chat / donation events and thank with shared cooldown
-                event_type = snippet.get("type")
-                super_chat_details = snippet.get("superChatDetails")
-
-                if event_type == "superChatEvent" and super_chat_details:
-                    amount_str = super_chat_details.get("amountDisplayString") or ""
-                    donor_name = author
-
-                    if amount_str:
-                        donation_text = (
-                            f"Thank you for the Super Chat {amount_str}, {donor_name}! "
-                            f"You keep this stream alive 💖"
-                        )
-                    else:
-                        donation_text = (
-                            f"Thank you so much for your support, {donor_name}! 💖"
-                        )
-
-                    # Uses the same 10-min gratitude cooldown as likes
-                    maybe_send_gratitude(donation_text, prefix="💖")
-
-                # 4b) Save *user* message to Supabase once
-                user_msg_payload = {
-                    "id": msg_id,
-                    "author": author,
-                    "content": message,
-                    "language": detected_lang,
-                }
 
-                # If message is from the channel owner, do NOT save to DB and do NOT trigger AI reply.
-                if is_owner:
-                    # Optional: still broadcast owner messages to frontend
-                    await broadcast_message(user_msg_payload)
-                    continue  # skip DB + AI reply for owner
+                item = ChatItem(
+                    session=session,
+                    msg_id=msg_id,
+                    author=author,
+                    author_id=author_details.get("channelId") or author,
+                    message=snippet.get("displayMessage", "[Non-text message]"),
+                    snippet=snippet,
+                    author_details=author_details,
+                    backfill=backfill,
+                )
+                if not await pipeline_put("detect", item):
+                    settle_item(item)
+
+            # Checkpoints move past this page only once its messages are
+            # persisted (see StreamSession.resume_page_token)
+            session.page_done(response.get("nextPageToken"))
+            if response.get("offlineAt"):
+                await wait_for_next_broadcast(session)
+                continue
+            await asyncio.sleep(polling_interval)
 
-                save_message_to_supabase(user_msg_payload)
+        except QuotaExhausted:
+            wait = youtube_quota.seconds_until_reset() + 60
+            print(f"🚫 [{session.key}] YouTube quota exhausted, polling resumes in {wait / 3600:.1f} h.")
+            await asyncio.sleep(wait)
+        except asyncio.TimeoutError:
+            delay = backoff.next_delay()
+            print(f"⏱ [{session.key}] YouTube API call timed out, retrying in {delay:.0f}s.")
+            await asyncio.sleep(delay)
+        except Exception as e:
+            if youtube_error_reason(e) in CHAT_ENDED_REASONS:
+                await wait_for_next_broadcast(session)
+                continue
+            if youtube_error_reason(e) == "pageTokenInvalid":
+                # E.g. an old checkpoint: start over, the seen IDs filter repeats
+                print(f"⚠ [{session.key}] Page token rejected, polling from the start of the chat.")
+                session.reset_page_token()
+            delay = backoff.next_delay()
+            print(f"⚠ [{session.key}] API Error ({youtube_error_reason(e) or type(e).__name__}): {e}; retrying in {delay:.0f}s.")
+            await asyncio.sleep(delay)
+
+
+async def wait_for_next_broadcast(session: StreamSession) -> None:
+    """
+    The session's live chat is over. A session following the channel waits
+    until broadcast discovery moves it to the next active broadcast; other
+    streams only retry slowly instead of looping on API errors.
+    """
+    print(f"🏁 [{session.key}] Live chat {session.live_chat_id} has ended.")
+    if not session.follow_channel or discovery_wake is None:
+        await asyncio.sleep(BROADCAST_DISCOVERY_INTERVAL_SECONDS)
+        return
+    session.chat_ended = True
+    discovery_wake.set()
+    while session.chat_ended:
+        await asyncio.sleep(1)
 
-                # 4c) Respect bot reply cooldown for normal chat replies
-                now = time.time()
-                if not addressed_bot and (now - last_bot_post_time < BOT_COOLDOWN_SECONDS):
-                    # Still broadcast user message to frontend even if bot stays silent
-                    await broadcast_message(user_msg_payload)
-                    continue
 
-                # 4d) Translate to Russian for context / logs / UI
-                translated_ru, _ = translate_message(message, detected_lang)
+# -------- Broadcast discovery --------
 
-                # 4e) Increment counter and decide if this is a "super-fun" turn
-                message_counter += 1
-                is_funny = message_counter >= next_funny_in
+async def discover_broadcasts(max_age: float = BROADCAST_CACHE_SECONDS) -> list[dict]:
+    """
+    Active broadcasts of the authorized channel, as stream dicts
+    ({"key", "live_chat_id", "live_stream_id", "title", "streamer_external_id"});
+    cached for `max_age` seconds.
+    """
+    global _broadcast_cache
+    if _broadcast_cache is not None and time.monotonic() - _broadcast_cache[0] < max_age:
+        return _broadcast_cache[1]
+
+    youtube = await get_youtube_async()
+    request = youtube.liveBroadcasts().list(
+        part="id,snippet",
+        broadcastStatus="active",
+        broadcastType="all",  # "Stream now" broadcasts too, not only scheduled events
+        fields=BROADCAST_FIELDS,
+    )
+    response = await youtube_call("liveBroadcasts.list", request)
+    broadcasts = []
+    for item in response.get("items", []):
+        snippet = item.get("snippet") or {}
+        if not snippet.get("liveChatId"):
+            continue  # chat disabled for this broadcast
+        broadcasts.append({
+            # The channel stays the stream key across broadcasts (dashboards, checkpoints)
+            "key": snippet.get("channelId") or item["id"],
+            "live_chat_id": snippet["liveChatId"],
+            "live_stream_id": item["id"],
+            "title": snippet.get("title", ""),
+            # Resolved to a public.streamers row when the session starts
+            "streamer_external_id": snippet.get("channelId"),
+        })
+    _broadcast_cache = (time.monotonic(), broadcasts)
+    return broadcasts
+
+
+async def sync_broadcasts(broadcasts: list[dict]) -> None:
+    """Roll ended chats over to new broadcasts and start sessions for the rest."""
+    ended = [s for s in sessions.values() if s.follow_channel and s.chat_ended]
+    skip = {s.live_chat_id for s in sessions.values()}  # served, or just ended
+    for broadcast in broadcasts:
+        if broadcast["live_chat_id"] in skip:
+            continue
+        if ended:
+            # Prefer the ended session of the same channel
+            ended.sort(key=lambda s: s.key != broadcast["key"])
+            session = ended.pop(0)
+            print(
+                f"🔀 [{session.key}] Rolling over to broadcast {broadcast['live_stream_id']} "
+                f"({broadcast['title']!r})"
+            )
+            session.switch_chat(broadcast["live_chat_id"], broadcast["live_stream_id"])
+            continue
+        key = broadcast["key"]
+        if key in sessions:
+            key = f"{key}-{broadcast['live_stream_id']}"  # second live broadcast of one channel
+        print(f"📺 Found live broadcast {broadcast['live_stream_id']} ({broadcast['title']!r})")
+        await start_session({**broadcast, "key": key, "follow_channel": True})
+
+
+async def run_broadcast_discovery():
+    """Look for active broadcasts every BROADCAST_DISCOVERY_INTERVAL_SECONDS, or as soon as a chat ends."""
+    global discovery_wake
+    discovery_wake = asyncio.Event()
+    try:
+        while True:
+            discovery_wake.clear()
+            try:
+                await sync_broadcasts(await discover_broadcasts())
+            except Exception as e:
+                print(f"⚠ Broadcast discovery failed: {e}")
+            try:
+                await asyncio.wait_for(discovery_wake.wait(), timeout=BROADCAST_DISCOVERY_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        discovery_wake = None
 
-                reply_text = generate_alesha_reply(
-                    original_message=message,
-                    translated_ru=translated_ru,
-                    source_language=detected_lang,
-                    author_name=author,
-                    joke_mode=is_funny,
-                )
 
-                prefix = "🎉" if is_funny else "💬"
-                send_message_to_chat(reply_text, prefix=prefix)
+# -------- Checkpoints --------
 
-                # Reset funny counter if we just did a super-funny one
-                if is_funny:
-                    message_counter = 0
-                    next_funny_in = random.randint(3, 5)
+def restore_checkpoint(session: StreamSession) -> None:
+    """Resume polling where this stream stopped before a crash or restart."""
+    if checkpoint_store is None:
+        return
+    saved = checkpoint_store.load(session.key, session.live_chat_id)
+    if saved is None:
+        return
+    page_token, seen = saved
+    session.seen.load(seen)
+    if session.next_page_token is None:
+        session.next_page_token = session.checkpoint_page_token = page_token
+    print(f"💾 [{session.key}] Resuming from checkpoint ({len(session.seen)} seen message IDs).")
 
-                # Broadcast original user message to frontend
-                await broadcast_message(user_msg_payload)
 
-            await asyncio.sleep(polling_interval)
+async def save_checkpoint(session: StreamSession) -> None:
+    """
+    Snapshot the page token and new seen IDs here, on the event loop that
+    changes them; only the SQLite write runs in a thread.
+    """
+    if checkpoint_store is None:
+        return
+    seen = session.seen
+    new_ids = seen.take_unsaved()
+    try:
+        await asyncio.to_thread(
+            checkpoint_store.save,
+            session.key,
+            session.live_chat_id,
+            session.resume_page_token(),
+            new_ids,
+            seen.window,
+        )
+    except Exception:
+        seen.return_unsaved(new_ids)  # written with the next checkpoint
+        raise
+
+
+async def run_checkpoints():
+    """Write every stream's page token and new seen IDs every CHECKPOINT_INTERVAL_SECONDS."""
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL_SECONDS)
+        for session in list(sessions.values()):
+            try:
+                await save_checkpoint(session)
+            except Exception as e:
+                print(f"⚠ [{session.key}] Checkpoint failed: {e}")
+
+
+# -------- Stream sessions --------
+
+def load_stream_configs() -> list[dict]:
+    """
+    Streams this process serves:
+    - config.json "STREAMS": [{"live_chat_id", "live_stream_id", "key", "streamer_external_id"}, ...]
+    - plus LIVE_CHAT_ID / LIVE_STREAM_ID from the environment (run_alesha.sh)
+    """
+    streams = [dict(stream) for stream in get_config().get("STREAMS", [])]
+    chat_id, stream_id = initialize_chat_ids()
+    if chat_id and not any(stream.get("live_chat_id") == chat_id for stream in streams):
+        streams.append({"live_chat_id": chat_id, "live_stream_id": stream_id, "follow_channel": True})
+    for stream in streams:
+        stream.setdefault("key", stream_key(stream))
+    return streams
+
+
+def stream_key(stream: dict) -> str:
+    return (
+        stream.get("key")
+        or stream.get("streamer_external_id")
+        or stream.get("live_stream_id")
+        or stream["live_chat_id"]
+    )
 
-        except Exception as e:
-            print(f"⚠ API Error: {e}")
-            await asyncio.sleep(5)
 
+def list_active_streams() -> list[dict] | None:
+    """
+    Streams for the worker pool (supervisor.py): configured streams plus
+    active streamers from public.streamers. None if the DB could not be read.
+    """
+    rows = db.list_active_streams()
+    if rows is None:
+        return None
+    streams = load_stream_configs()
+    known = {stream["live_chat_id"] for stream in streams}
+    for row in rows:
+        if row["live_chat_id"] in known:
+            continue
+        streams.append({
+            "key": row.get("external_id") or row["id"],
+            "live_chat_id": row["live_chat_id"],
+            "live_stream_id": row.get("live_stream_id"),
+            "streamer_id": row["id"],
+        })
+    return streams
+
+
+def new_session(stream: dict) -> StreamSession:
+    return StreamSession(
+        key=stream_key(stream),
+        live_chat_id=stream["live_chat_id"],
+        live_stream_id=stream.get("live_stream_id"),
+        streamer_id=stream.get("streamer_id"),
+        # Set when a worker takes the stream over from an expired lease
+        next_page_token=stream.get("page_token"),
+        backfill_first_page=bool(stream.get("backfill")),
+        follow_channel=bool(stream.get("follow_channel")),
+        donation_card_text=DONATION_CARD_TEXT,
+        buymeacoffee_link=BUYMEACOFFEE_LINK,
+        donationalerts_url=DONATIONALERTS_URL,
+    )
+
+
+async def start_session(stream: dict) -> StreamSession:
+    """
+    Start serving one more live chat in this process: resolve the streamer
+    row, load its settings and start its ingest / periodic / coalescer tasks
+    and its outbound scheduler. Clients, caches and limiters are shared.
+    """
+    session = new_session(stream)
+    if session.key in sessions:
+        print(f"ℹ️ [{session.key}] Stream is already running.")
+        return sessions[session.key]
+
+    # Registered only once restored: the checkpoint task must never save
+    # the blank page token of a session that has not loaded its checkpoint
+    await asyncio.to_thread(restore_checkpoint, session)
+    external_id = stream.get("streamer_external_id")
+    if external_id and not session.streamer_id:
+        streamer = await asyncio.to_thread(get_or_create_streamer, external_id)
+        if streamer:
+            session.streamer_id = streamer.get("id")
+    await load_streamer_settings(session)
+    if session.key in sessions:  # started concurrently meanwhile
+        return sessions[session.key]
+    sessions[session.key] = session
+
+    session.outbound = build_outbound_scheduler(session)
+    session.outbound.start()
+    session.tasks = [
+        asyncio.create_task(fetch_and_process_messages(session), name=f"ingest-{session.key}"),
+        asyncio.create_task(run_periodic_posts(session), name=f"periodic-{session.key}"),
+    ]
+    if COALESCE_REPLIES:
+        session.tasks.append(
+            asyncio.create_task(run_reply_coalescer(session), name=f"coalescer-{session.key}")
+        )
+
+    print(f"🎬 [{session.key}] Serving live chat {session.live_chat_id} ({len(sessions)} stream(s) total)")
+    return session
+
+
+async def stop_session(key: str) -> None:
+    session = sessions.pop(key, None)
+    if session is None:
+        return
+    for task in session.tasks:
+        task.cancel()
+    await asyncio.gather(*session.tasks, return_exceptions=True)
+    session.tasks = []
+    if session.outbound is not None:
+        await session.outbound.stop()
+    try:
+        await save_checkpoint(session)
+    except Exception as e:
+        print(f"⚠ [{key}] Final checkpoint failed: {e}")
+    print(f"🛑 [{key}] Stopped serving live chat {session.live_chat_id}")
+
+
+async def main(
+    worker=None,
+    ws_port: int = WS_PORT,
+    spool_path: str = SPOOL_PATH,
+    checkpoint_path: str | None = CHECKPOINT_PATH,
+):
+    """
+    Run the bot. Without `worker` it serves the configured streams; with a
+    supervisor.StreamWorker the worker decides which streams run here.
+    """
+    global pipeline, message_writer, checkpoint_store
 
-async def main():
-    print("🚀 Alesha is running with integrated WebSocket server")
-    # Load payment settings once at startup
-    load_payment_settings_from_db()
-    async with websockets.serve(handler, "localhost", 8765):
-        await fetch_and_process_messages()
+    print(f"🚀 Alesha is running with integrated WebSocket server on port {ws_port}")
+    streams = load_stream_configs() if worker is None else []
+    discovery = worker is None and BROADCAST_DISCOVERY
+    if worker is None and not streams and not discovery:
+        print("🚫 No live streams configured (LIVE_CHAT_ID or config.json STREAMS).")
+        return
+    daily_quota = int(get_config().get("YOUTUBE_DAILY_QUOTA", YOUTUBE_DAILY_QUOTA_UNITS))
+    youtube_quota.daily_units = daily_quota // max(1, YOUTUBE_QUOTA_SHARE)
+
+    # Messages hit the local spool first and are replayed into Supabase in order
+    message_writer = MessageBatchWriter(spool=MessageSpool(spool_path))
+    message_writer.start()
+    if checkpoint_path:
+        checkpoint_store = CheckpointStore(checkpoint_path)
+    # One pipeline for all streams: every item carries its session
+    pipeline = build_pipeline()
+    pipeline.start()
+    broadcast_hub.start()
+    warmup_task = asyncio.create_task(warmup_reply_cache()) if REPLY_CACHE_WARMUP else None
+    stats_task = asyncio.create_task(run_stream_stats(), name="stream-stats")
+    checkpoint_task = asyncio.create_task(run_checkpoints(), name="checkpoints")
+    settings_task = asyncio.create_task(run_settings_refresh(), name="settings-refresh")
+    discovery_task = None
+    server = None
+    try:
+        # Independent startup steps run side by side: WebSocket bind, API
+        # clients (credentials refresh) and each stream's settings / checkpoint
+        server, *_ = await asyncio.gather(
+            # permessage-deflate keeps the JSON feeds small on the wire
+            websockets.serve(broadcast_hub.handler, "localhost", ws_port, compression="deflate"),
+            warm_up_clients(),
+            *(start_session(stream) for stream in streams),
+        )
+        if discovery:
+            # Waits for a broadcast if none is live yet, and follows the channel to the next one
+            discovery_task = asyncio.create_task(run_broadcast_discovery(), name="broadcast-discovery")
+        if worker is not None:
+            await worker.run()
+        else:
+            # Run until cancelled; more streams can be added with start_session()
+            await asyncio.Future()
+    finally:
+        if warmup_task is not None:
+            warmup_task.cancel()
+        stats_task.cancel()
+        checkpoint_task.cancel()
+        settings_task.cancel()
+        if discovery_task is not None:
+            discovery_task.cancel()
+        if worker is not None:
+            # Releases the leases so other workers can start these streams right away
+            await worker.shutdown()
+        for key in list(sessions):
+            await stop_session(key)
+        await pipeline.stop()
+        await broadcast_hub.stop()
+        await message_writer.stop()
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+        if checkpoint_store is not None:
+            checkpoint_store.close()
+            checkpoint_store = None
 
 
 if __name__ == "__main__":
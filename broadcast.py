@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+broadcast.py — WebSocket fan-out to dashboard clients that never blocks ingest:
+- `publish` is synchronous: it never awaits a viewer's socket
+- clients that keep up get the message through `websockets.broadcast`
+  (fire-and-forget write into their transport)
+- clients that fall behind get their own bounded queue drained by a
+  per-client sender task; on overflow the oldest message is dropped or
+  the client is disconnected (BROADCAST_SLOW_POLICY)
+- per-client lag metrics: queue depth, oldest queued age, drops, bytes buffered
+- every event gets a sequence number and the last BROADCAST_REPLAY_SIZE
+  events stay in a ring buffer; a client sends {"type": "resume", "since": X}
+  and gets everything it missed in one batch frame
+- clients may subscribe to a subset of events (see subscriptions.py);
+  live fan-out and replays only carry matching events
+- clients may switch to the compact feed (see wire.py): events of one
+  batch window (≈ one poll cycle) in a single short-key JSON or
+  MessagePack frame; permessage-deflate is negotiated by websockets.serve
+
+Wire format (server → client):
+- event: the payload plus "seq"
+- batch: {"type": "batch", "events": [...], "last_seq": N, "epoch": E, "complete": bool}
+  ("complete" is false if some requested events already fell out of the buffer;
+  "epoch" changes when the server restarts and sequence numbers start over)
+Client → server:
+- {"type": "resume", "since": X, "epoch": E} (epoch optional)
+- {"type": "subscribe", "filters": {"event": [...], "language": [...], ...}}
+- {"type": "format", "mode": "compact", "encoding": "msgpack" | "json"}
+  (answered with {"type": "format", "mode", "encoding", "keys"}; the
+  encoding falls back to JSON if msgpack is not installed)
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import websockets
+
+from subscriptions import SubscriptionIndex, parse_filters
+from wire import SHORT_KEYS, Frame, available_encoding, compact_event, encode_batch
+
+BROADCAST_QUEUE_SIZE = 200  # messages kept per slow client
+BROADCAST_SLOW_POLICY = "drop_oldest"  # or "disconnect"
+# Bytes waiting in a client's transport before it stops using the broadcast fast path
+BROADCAST_WRITE_BUFFER_LIMIT = 64 * 1024
+BROADCAST_LAG_REPORT_SECONDS = 60
+BROADCAST_LAG_WARN_SECONDS = 5.0
+BROADCAST_REPLAY_SIZE = 500  # events kept for clients that resume
+# A new client that does not ask to resume within this time goes live from
+# the sequence number it connected at
+BROADCAST_RESUME_GRACE_SECONDS = 2.0
+# Compact clients get everything published within this window in one frame;
+# the detect stage handles one poll's messages well inside it
+BROADCAST_BATCH_WINDOW_SECONDS = 0.25
+
+SLOW_POLICIES = ("drop_oldest", "disconnect")
+# 1013 "Try Again Later": the client is too slow, it may reconnect
+SLOW_CLIENT_CLOSE_CODE = 1013
+
+
+class ClientChannel:
+    """Outbound state for one connected WebSocket client."""
+
+    def __init__(self, websocket: Any, maxsize: int, policy: str):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queue: Deque[Tuple[float, Frame]] = deque()
+        self.sending = False
+        self.closing = False
+        # Live events are held back until the client resumed (or the grace period ran out)
+        self.live = False
+        self.resume_timer: Optional[asyncio.TimerHandle] = None
+        # None: one full JSON frame per event; otherwise the compact feed's encoding
+        self.encoding: Optional[str] = None
+        self.batch: List[Dict[str, Any]] = []
+
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0.0
+
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def name(self) -> str:
+        address = getattr(self.websocket, "remote_address", None)
+        return f"{address[0]}:{address[1]}" if address else hex(id(self.websocket))
+
+    def buffered_bytes(self) -> int:
+        transport = getattr(self.websocket, "transport", None)
+        if transport is None:
+            return 0
+        try:
+            return transport.get_write_buffer_size()
+        except Exception:
+            return 0
+
+    def is_fast(self, buffer_limit: int) -> bool:
+        """Nothing queued or in flight and the socket is draining: safe to write directly."""
+        return not self.queue and not self.sending and self.buffered_bytes() < buffer_limit
+
+    def lag(self) -> float:
+        """Age of the oldest message still waiting for this client."""
+        if not self.queue:
+            return 0.0
+        return time.monotonic() - self.queue[0][0]
+
+    def enqueue(self, message: Frame) -> bool:
+        """Queue a message; returns False if the client has to be disconnected."""
+        if len(self.queue) >= self.maxsize:
+            if self.policy == "disconnect":
+                return False
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append((time.monotonic(), message))
+        self._wake.set()
+        return True
+
+    async def run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self.queue:
+                queued_at, message = self.queue.popleft()
+                self.sending = True
+                try:
+                    await self.websocket.send(message)
+                except websockets.exceptions.ConnectionClosed:
+                    self.queue.clear()
+                    return
+                finally:
+                    self.sending = False
+                self.sent += 1
+                self.max_lag = max(self.max_lag, time.monotonic() - queued_at)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run(), name=f"ws-send-{self.name}")
+
+    async def stop(self) -> None:
+        if self.resume_timer is not None:
+            self.resume_timer.cancel()
+            self.resume_timer = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "live": self.live,
+            "queued": len(self.queue),
+            "lag_seconds": round(self.lag(), 3),
+            "max_lag_seconds": round(self.max_lag, 3),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "buffered_bytes": self.buffered_bytes(),
+        }
+
+
+class BroadcastHub:
+    def __init__(
+        self,
+        queue_size: int = BROADCAST_QUEUE_SIZE,
+        policy: str = BROADCAST_SLOW_POLICY,
+        write_buffer_limit: int = BROADCAST_WRITE_BUFFER_LIMIT,
+        replay_size: int = BROADCAST_REPLAY_SIZE,
+        resume_grace: float = BROADCAST_RESUME_GRACE_SECONDS,
+        batch_window: float = BROADCAST_BATCH_WINDOW_SECONDS,
+    ):
+        if policy not in SLOW_POLICIES:
+            raise ValueError(f"Unknown slow-client policy: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.write_buffer_limit = write_buffer_limit
+        self.resume_grace = resume_grace
+        self.clients: Dict[Any, ClientChannel] = {}
+        self.disconnected_slow = 0
+
+        self.seq = 0
+        self.epoch = int(time.time() * 1000)
+        # (seq, event, encoded event), oldest first
+        self.history: Deque[Tuple[int, Dict[str, Any], str]] = deque(maxlen=replay_size)
+        self.subscriptions = SubscriptionIndex()
+        self.batch_window = batch_window
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._report_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.clients)
+
+    # ---------- Connections ----------
+
+    def add(self, websocket: Any) -> ClientChannel:
+        channel = ClientChannel(websocket, self.queue_size, self.policy)
+        self.clients[websocket] = channel
+        # Everything until the client subscribes to something narrower
+        self.subscriptions.set(channel)
+        channel.start()
+        return channel
+
+    async def remove(self, websocket: Any) -> None:
+        channel = self.clients.pop(websocket, None)
+        if channel is not None:
+            self.subscriptions.remove(channel)
+            await channel.stop()
+
+    async def handler(self, websocket: Any) -> None:
+        """websockets.serve() handler: register the client and serve its requests until it goes away."""
+        print("🔌 New client connected")
+        channel = self.add(websocket)
+        connected_seq = self.seq
+        channel.resume_timer = asyncio.get_running_loop().call_later(
+            self.resume_grace, self.resume, channel, connected_seq, None, True
+        )
+        try:
+            async for raw in websocket:
+                self.handle_client_message(channel, raw)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            print("❌ Client disconnected")
+            await self.remove(websocket)
+
+    def handle_client_message(self, channel: ClientChannel, raw: Any) -> None:
+        try:
+            request = json.loads(raw)
+        except (TypeError, ValueError):
+            print(f"⚠ Ignoring malformed WebSocket request from {channel.name}")
+            return
+        if not isinstance(request, dict):
+            return
+        if request.get("type") == "resume":
+            try:
+                since = int(request.get("since") or 0)
+            except (TypeError, ValueError):
+                since = 0
+            self.resume(channel, since, request.get("epoch"))
+        elif request.get("type") == "subscribe":
+            filters = parse_filters(request.get("filters"))
+            self.subscriptions.set(channel, filters)
+            print(f"🔎 {channel.name} subscribed to {filters or 'all events'}")
+        elif request.get("type") == "format":
+            self.set_format(channel, request.get("mode"), request.get("encoding"))
+
+    def set_format(self, channel: ClientChannel, mode: Any, encoding: Any) -> None:
+        """Switch a client between the default feed and the compact batched feed."""
+        if mode == "compact":
+            channel.encoding = available_encoding(encoding)
+        else:
+            self._flush_channel(channel)
+            channel.encoding = None
+        if channel.encoding:
+            ack = {"type": "format", "mode": "compact", "encoding": channel.encoding, "keys": SHORT_KEYS}
+        else:
+            ack = {"type": "format", "mode": "default", "encoding": "json"}
+        # The answer itself is always plain JSON, so the client can read it before switching
+        if not channel.enqueue(json.dumps(ack)):
+            self._disconnect_slow(channel)
+        print(f"🗜 {channel.name} uses the {ack['mode']} feed ({ack['encoding']})")
+
+    def _disconnect_slow(self, channel: ClientChannel) -> None:
+        if channel.closing:
+            return
+        channel.closing = True
+        channel.queue.clear()
+        self.disconnected_slow += 1
+        print(f"🚫 Disconnecting slow WebSocket client {channel.name}")
+        asyncio.create_task(
+            channel.websocket.close(code=SLOW_CLIENT_CLOSE_CODE, reason="client too slow")
+        )
+
+    # ---------- Replay ----------
+
+    def replay_events(self, since: int, channel: Optional[ClientChannel] = None) -> List[str]:
+        return [
+            message
+            for seq, event, message in self.history
+            if seq > since and (channel is None or self.subscriptions.accepts(channel, event))
+        ]
+
+    def replay_frame(self, since: int, channel: Optional[ClientChannel] = None) -> Frame:
+        """One batch frame with every buffered event after `since` (matching the channel's filters)."""
+        oldest = self.history[0][0] if self.history else self.seq + 1
+        complete = since >= oldest - 1
+        if channel is not None and channel.encoding:
+            events = [
+                compact_event(event, seq)
+                for seq, event, _ in self.history
+                if seq > since and self.subscriptions.accepts(channel, event)
+            ]
+            return encode_batch(channel.encoding, events, q=self.seq, ep=self.epoch, ok=complete)
+
+        events = self.replay_events(since, channel)
+        # Events are already encoded, so the frame is assembled as text
+        return (
+            '{"type": "batch", "events": [' + ", ".join(events) + "], "
+            f'"last_seq": {self.seq}, "epoch": {self.epoch}, "complete": {json.dumps(complete)}}}'
+        )
+
+    def resume(
+        self,
+        channel: ClientChannel,
+        since: int,
+        epoch: Optional[int] = None,
+        quiet: bool = False,
+    ) -> None:
+        """
+        Queue the missed events for this client, then switch it to live events.
+        `quiet` (grace timeout, the client never asked) skips an empty batch.
+        """
+        if channel.resume_timer is not None:
+            channel.resume_timer.cancel()
+            channel.resume_timer = None
+        if channel.closing:
+            return
+        if epoch is not None and epoch != self.epoch:
+            # Sequence numbers from before a restart mean nothing now
+            since = 0
+        if quiet and not self.replay_events(since, channel):
+            channel.live = True
+            return
+        # Queued, so live events published afterwards are sent after the batch
+        if not channel.enqueue(self.replay_frame(since, channel)):
+            self._disconnect_slow(channel)
+            return
+        channel.live = True
+
+    # ---------- Fan-out ----------
+
+    def publish(self, event: Dict[str, Any]) -> int:
+        """Number the event and send it to every live, subscribed client without waiting on any of them."""
+        self.seq += 1
+        message = json.dumps({**event, "seq": self.seq})
+        self.history.append((self.seq, event, message))
+
+        fast: List[Any] = []
+        for channel in self.subscriptions.match(event):
+            if channel.closing or not channel.live:
+                continue
+            if channel.encoding:
+                channel.batch.append(compact_event(event, self.seq))
+                self._schedule_flush()
+            elif channel.is_fast(self.write_buffer_limit):
+                fast.append(channel.websocket)
+                channel.sent += 1
+            elif not channel.enqueue(message):
+                self._disconnect_slow(channel)
+
+        if fast:
+            websockets.broadcast(fast, message)
+        return self.seq
+
+    def _deliver(self, channel: ClientChannel, frame: Frame) -> None:
+        if channel.is_fast(self.write_buffer_limit):
+            channel.sent += 1
+            websockets.broadcast([channel.websocket], frame)
+        elif not channel.enqueue(frame):
+            self._disconnect_slow(channel)
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(
+                self.batch_window, self.flush_batches
+            )
+
+    def _flush_channel(self, channel: ClientChannel) -> None:
+        if not channel.batch or channel.closing:
+            channel.batch = []
+            return
+        events, channel.batch = channel.batch, []
+        self._deliver(channel, encode_batch(channel.encoding, events))
+
+    def flush_batches(self) -> None:
+        """Send every compact client its pending events as one frame."""
+        self._flush_handle = None
+        for channel in list(self.clients.values()):
+            self._flush_channel(channel)
+
+    # ---------- Metrics ----------
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {channel.name: channel.stats() for channel in self.clients.values()}
+
+    def lagging(self, threshold: float = BROADCAST_LAG_WARN_SECONDS) -> Dict[str, Dict[str, Any]]:
+        return {
+            channel.name: channel.stats()
+            for channel in self.clients.values()
+            if channel.lag() >= threshold
+        }
+
+    async def report_lag(self, interval: float = BROADCAST_LAG_REPORT_SECONDS) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for name, stats in self.lagging().items():
+                print(f"🐢 WebSocket client {name} is behind: {stats}")
+
+    def start(self) -> None:
+        if self._report_task is None:
+            self._report_task = asyncio.create_task(self.report_lag(), name="ws-lag-report")
+
+    async def stop(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._report_task is not None:
+            self._report_task.cancel()
+            await asyncio.gather(self._report_task, return_exceptions=True)
+            self._report_task = None
+        for websocket in list(self.clients):
+            await self.remove(websocket)
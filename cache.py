@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+cache.py — small caches shared by the bot:
+- TTLCache: in-memory LRU with per-entry TTL and hit/miss counters
+- DiskCache: optional SQLite tier behind a TTLCache that survives restarts
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold and collapse whitespace so trivially different chat lines share a key."""
+    return " ".join((text or "").casefold().split())
+
+
+class DiskCache:
+    """SQLite key/value store with expiry; the connection is opened on first use."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                create table if not exists cache (
+                  key text primary key,
+                  value text not null,
+                  expires_at real not null
+                )
+                """
+            )
+            self._conn.execute("delete from cache where expires_at <= ?", (time.time(),))
+        return self._conn
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        return json.dumps(key, ensure_ascii=False)
+
+    def get(self, key: Hashable) -> Tuple[Any, float] | None:
+        """Return (value, expires_at) or None if missing / expired."""
+        with self._lock:
+            row = self._connection().execute(
+                "select value, expires_at from cache where key = ? and expires_at > ?",
+                (self._encode_key(key), time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), float(row[1])
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._connection().execute(
+                "insert or replace into cache (key, value, expires_at) values (?, ?, ?)",
+                (self._encode_key(key), json.dumps(value, ensure_ascii=False), expires_at),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a time-to-live per entry.
+
+    Lookups check memory first, then the optional disk tier (promoting hits
+    back into memory). Counters: memory_hits, disk_hits, misses.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, disk: Optional[DiskCache] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk = disk
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _store(self, key: Hashable, value: Any, expires_at: float) -> None:
+        # Caller holds the lock
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._data[key]
+
+        if self.disk is not None:
+            try:
+                found = self.disk.get(key)
+            except Exception as e:
+                print(f"⚠ Disk cache read failed: {e}")
+                found = None
+            if found is not None:
+                value, expires_at = found
+                with self._lock:
+                    self._store(key, value, expires_at)
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value, expires_at)
+            except Exception as e:
+                print(f"⚠ Disk cache write failed: {e}")
+
+    def discard(self, key: Hashable) -> None:
+        """Forget a key in memory (e.g. a cached row ID that turned out to be stale)."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "size": len(self._data),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+checkpoint.py — warm restarts for the chat ingest loop:
+- SeenWindow: message IDs seen in the last DEDUP_WINDOW_SECONDS (a time
+  window, so it grows and shrinks with the chat's message rate)
+- CheckpointStore: local SQLite copy of every stream's page token and seen
+  IDs, written periodically; after a crash or restart polling resumes from
+  the stored page token and already handled messages are skipped
+- an ID can be added unsaved-later (`checkpoint=False`) and `settle`d once
+  its message is handled, so a crash never checkpoints unfinished work
+New seen IDs are written incrementally, old ones are pruned by age.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+CHECKPOINT_PATH = "stream_checkpoints.sqlite3"
+CHECKPOINT_INTERVAL_SECONDS = 5.0
+DEDUP_WINDOW_SECONDS = 15 * 60  # YouTube never re-sends older messages for a valid token
+DEDUP_MAX_IDS = 100_000  # hard cap for extremely busy chats
+
+
+class SeenWindow:
+    """Message IDs with the wall-clock time they were first seen, oldest first."""
+
+    def __init__(
+        self,
+        window: float = DEDUP_WINDOW_SECONDS,
+        max_ids: int = DEDUP_MAX_IDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.window = window
+        self.max_ids = max_ids
+        self._clock = clock
+        self._seen: Dict[str, float] = {}  # insertion order == time order
+        self._unsaved: List[Tuple[str, float]] = []
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, msg_id: str) -> bool:
+        return msg_id in self._seen
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window
+        while self._seen:
+            oldest = next(iter(self._seen))
+            if self._seen[oldest] >= cutoff and len(self._seen) <= self.max_ids:
+                break
+            del self._seen[oldest]
+
+    def add(self, msg_id: str, checkpoint: bool = True) -> bool:
+        """
+        Record a message ID; False if it was already seen within the window.
+        With `checkpoint=False` it is only saved after `settle()`.
+        """
+        now = self._clock()
+        self._prune(now)
+        if msg_id in self._seen:
+            return False
+        self._seen[msg_id] = now
+        if checkpoint:
+            self._unsaved.append((msg_id, now))
+        return True
+
+    def settle(self, msg_id: str) -> None:
+        """The message is handled: include its ID in the next checkpoint."""
+        seen_at = self._seen.get(msg_id)
+        if seen_at is not None:
+            self._unsaved.append((msg_id, seen_at))
+
+    def load(self, entries: List[Tuple[str, float]]) -> None:
+        """Restore IDs from a checkpoint (they are already saved)."""
+        for msg_id, seen_at in sorted(entries, key=lambda entry: entry[1]):
+            self._seen.setdefault(msg_id, seen_at)
+        self._prune(self._clock())
+
+    def take_unsaved(self) -> List[Tuple[str, float]]:
+        unsaved, self._unsaved = self._unsaved, []
+        return unsaved
+
+    def return_unsaved(self, entries: List[Tuple[str, float]]) -> None:
+        """Put back IDs whose checkpoint write failed, ahead of the newer ones."""
+        self._unsaved[:0] = entries
+
+
+class CheckpointStore:
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            create table if not exists checkpoints (
+              stream_key text primary key,
+              live_chat_id text not null,
+              page_token text,
+              saved_at real not null
+            );
+            create table if not exists seen_messages (
+              stream_key text not null,
+              msg_id text not null,
+              seen_at real not null,
+              primary key (stream_key, msg_id)
+            );
+            """
+        )
+
+    def save(
+        self,
+        stream_key: str,
+        live_chat_id: str,
+        page_token: Optional[str],
+        new_ids: List[Tuple[str, float]],
+        window: float = DEDUP_WINDOW_SECONDS,
+    ) -> None:
+        """Store the page token, add newly seen IDs and drop those older than `window`."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("begin")
+            try:
+                self._conn.execute(
+                    "insert into checkpoints (stream_key, live_chat_id, page_token, saved_at) values (?, ?, ?, ?) "
+                    "on conflict (stream_key) do update set live_chat_id = excluded.live_chat_id, "
+                    "page_token = excluded.page_token, saved_at = excluded.saved_at",
+                    (stream_key, live_chat_id, page_token, now),
+                )
+                self._conn.executemany(
+                    "insert or ignore into seen_messages (stream_key, msg_id, seen_at) values (?, ?, ?)",
+                    [(stream_key, msg_id, seen_at) for msg_id, seen_at in new_ids],
+                )
+                self._conn.execute(
+                    "delete from seen_messages where stream_key = ? and seen_at < ?",
+                    (stream_key, now - window),
+                )
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+
+    def load(self, stream_key: str, live_chat_id: str) -> Optional[Tuple[Optional[str], List[Tuple[str, float]]]]:
+        """(page_token, seen IDs) of the stream, or None if there is no checkpoint for this chat."""
+        with self._lock:
+            row = self._conn.execute(
+                "select live_chat_id, page_token from checkpoints where stream_key = ?",
+                (stream_key,),
+            ).fetchone()
+            # A new broadcast has a new chat: its page tokens and IDs start fresh
+            if row is None or row[0] != live_chat_id:
+                return None
+            seen = self._conn.execute(
+                "select msg_id, seen_at from seen_messages where stream_key = ? order by seen_at",
+                (stream_key,),
+            ).fetchall()
+        return row[1], [(msg_id, float(seen_at)) for msg_id, seen_at in seen]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -3,22 +3,30 @@
 db.py — single place for working with Supabase:
 - initialization of the client
 - management of streamers
-- management of subscribers
-- saving messages
+- management of subscribers (LRU identity cache, one bulk upsert for the
+  unknown authors of a batch)
+- saving messages (single writes and the batched background writer)
 """
 
+import asyncio
 import json
+import random
 import time
-from typing import Any, Dict, Optional
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Tuple
 
-from supabase.client import create_client, Client
+from cache import TTLCache
+from spool import MessageSpool
+
+if TYPE_CHECKING:
+    from supabase.client import Client
 
 # ---------- Supabase init ----------
 
-_supabase: Optional[Client] = None
+_supabase: Optional["Client"] = None
 
 
-def get_supabase() -> Optional[Client]:
+def get_supabase() -> Optional["Client"]:
     """
     Return a shared Supabase client.
     If initialization fails, returns None.
@@ -28,6 +36,9 @@ def get_supabase() -> Optional[Client]:
         return _supabase
 
     try:
+        # Imported on first use: the SDK alone takes a quarter of a second
+        from supabase.client import create_client
+
         with open("config.json") as f:
             config = json.load(f)
 
@@ -44,6 +55,15 @@ def get_supabase() -> Optional[Client]:
 
 # ---------- Streamers ----------
 
+# Row IDs never change; the TTL only bounds how long a deleted row is remembered
+IDENTITY_CACHE_TTL_SECONDS = 24 * 3600
+STREAMER_CACHE_SIZE = 1_000
+SUBSCRIBER_CACHE_SIZE = 50_000  # (streamer_id, external_user_id, platform) -> subscribers.id
+
+streamer_cache = TTLCache(maxsize=STREAMER_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL_SECONDS)
+subscriber_cache = TTLCache(maxsize=SUBSCRIBER_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL_SECONDS)
+
+
 def get_or_create_streamer(
     external_id: str,
     platform: str = "youtube",
@@ -51,53 +71,140 @@ def get_or_create_streamer(
     email: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
     """
-    Find or create a streamer row.
+    Find or create a streamer row with one upsert on (external_id, platform),
+    so concurrent callers cannot create duplicates. Cached afterwards.
 
     external_id:
         Generic external ID for the streamer. For now this can be something
         simple like 'default_youtube_streamer'. Later it can be YouTube channel
         ID, Telegram ID, or an auth.users.id mapping.
     """
+    cached = streamer_cache.get((external_id, platform))
+    if cached is not None:
+        return cached
+
     client = get_supabase()
     if client is None:
         print("🚫 Supabase not initialized in get_or_create_streamer")
         return None
 
     try:
-        resp = (
-            client.table("streamers")
-            .select("*")
-            .eq("external_id", external_id)
-            .eq("platform", platform)
-            .limit(1)
-            .execute()
-        )
-        rows = resp.data or []
-        if rows:
-            return rows[0]
-
-        insert_data: Dict[str, Any] = {
+        upsert_data: Dict[str, Any] = {
             "external_id": external_id,
             "platform": platform,
         }
         if display_name is not None:
-            insert_data["display_name"] = display_name
+            upsert_data["display_name"] = display_name
         if email is not None:
-            insert_data["email"] = email
+            upsert_data["email"] = email
 
-        resp = client.table("streamers").insert(insert_data).execute()
+        resp = (
+            client.table("streamers")
+            .upsert(upsert_data, on_conflict="external_id,platform")
+            .execute()
+        )
         rows = resp.data or []
-        if rows:
-            print(f"✅ Created new streamer in DB: {rows[0].get('id')}")
-        return rows[0] if rows else None
+        if not rows:
+            return None
+        streamer_cache.set((external_id, platform), rows[0])
+        return rows[0]
 
     except Exception as e:
         print(f"⚠ get_or_create_streamer error: {e}")
         return None
 
 
+def list_active_streams() -> Optional[List[Dict[str, Any]]]:
+    """
+    Streamers that are live right now (active, with a live chat ID).
+    Returns None if the list could not be read, so callers can keep
+    their current assignments instead of dropping everything.
+    """
+    client = get_supabase()
+    if client is None:
+        print("🚫 Supabase not initialized in list_active_streams")
+        return None
+
+    try:
+        resp = (
+            client.table("streamers")
+            .select("id, external_id, live_chat_id, live_stream_id")
+            .eq("active", True)
+            .not_.is_("live_chat_id", "null")
+            .execute()
+        )
+        return resp.data or []
+    except Exception as e:
+        print(f"⚠ list_active_streams error: {e}")
+        return None
+
+
+# ---------- Streamer settings ----------
+
+STREAMER_SETTINGS_COLUMNS = (
+    "streamer_id, card_number_full, buymeacoffee_link, donation_alerts_link, "
+    "auto_translate, source_language, target_language, settings, updated_at"
+)
+
+
+def fetch_streamer_settings(
+    streamer_ids: Optional[List[str]],
+    changed_since: Optional[str] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Rows of public.streamer_settings for these streamers; with `changed_since`
+    (an updated_at value) only rows edited after it, so an unchanged poll is
+    an empty response. `streamer_ids=None` reads the first row (the
+    single-streamer setup; one small row, compared by the caller).
+    Returns None if the table could not be read.
+    """
+    client = get_supabase()
+    if client is None:
+        print("🚫 Supabase not initialized in fetch_streamer_settings")
+        return None
+
+    try:
+        query = client.table("streamer_settings").select(STREAMER_SETTINGS_COLUMNS)
+        if streamer_ids is None:
+            query = query.order("created_at").limit(1)
+        else:
+            query = query.in_("streamer_id", streamer_ids)
+            if changed_since is not None:
+                query = query.gt("updated_at", changed_since)
+        resp = query.execute()
+        return resp.data or []
+    except Exception as e:
+        print(f"⚠ fetch_streamer_settings error: {e}")
+        return None
+
+
 # ---------- Subscribers ----------
 
+def upsert_subscribers(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Find-or-create many subscribers with ONE bulk upsert on
+    (streamer_id, external_user_id); returns the stored rows (with `id`)
+    and caches them. Raises on failure.
+    """
+    if not rows:
+        return []
+
+    client = get_supabase()
+    if client is None:
+        raise RuntimeError("Supabase not initialized")
+
+    resp = (
+        client.table("subscribers")
+        .upsert(rows, on_conflict="streamer_id,external_user_id")
+        .execute()
+    )
+    stored = resp.data or []
+    for row in stored:
+        key = (row["streamer_id"], row["external_user_id"], row.get("platform") or "youtube")
+        subscriber_cache.set(key, row["id"])
+    return stored
+
+
 def get_or_create_subscriber(
     streamer_id: str,
     external_user_id: str,
@@ -105,60 +212,85 @@ def get_or_create_subscriber(
     display_name: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
     """
-    Find or create a subscriber for a specific streamer.
+    Find or create a subscriber for a specific streamer (one upsert).
 
     streamer_id:
         UUID of the streamer (FK to streamers.id)
     external_user_id:
         External ID of the user (e.g. YouTube channelId).
     """
-    client = get_supabase()
-    if client is None:
-        print("🚫 Supabase not initialized in get_or_create_subscriber")
-        return None
+    row: Dict[str, Any] = {
+        "streamer_id": streamer_id,
+        "external_user_id": external_user_id,
+        "platform": platform,
+    }
+    # In the current schema the column is `username`
+    if display_name is not None:
+        row["username"] = display_name
 
     try:
-        resp = (
-            client.table("subscribers")
-            .select("*")
-            .eq("streamer_id", streamer_id)
-            .eq("external_user_id", external_user_id)
-            .eq("platform", platform)
-            .limit(1)
-            .execute()
-        )
-        rows = resp.data or []
-        if rows:
-            return rows[0]
+        rows = upsert_subscribers([row])
+        return rows[0] if rows else None
+    except Exception as e:
+        print(f"⚠ get_or_create_subscriber error: {e}")
+        return None
+
 
-        insert_data: Dict[str, Any] = {
+def resolve_subscriber_ids(rows: List[Dict[str, Any]]) -> int:
+    """
+    Fill `subscriber_id` on message rows in place: from the cache, and all
+    misses of the batch with one upsert_subscribers call. Returns the number
+    of authors that had to be looked up.
+    """
+    misses: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        if row.get("subscriber_id") or not row.get("streamer_id") or not row.get("author_id"):
+            continue
+        key = (row["streamer_id"], row["author_id"], row.get("platform") or "youtube")
+        subscriber_id = subscriber_cache.get(key)
+        if subscriber_id is not None:
+            row["subscriber_id"] = subscriber_id
+        else:
+            misses.setdefault(key, []).append(row)
+
+    if not misses:
+        return 0
+
+    upsert_subscribers([
+        {
             "streamer_id": streamer_id,
             "external_user_id": external_user_id,
             "platform": platform,
+            "username": waiting[-1].get("author"),
         }
-        # In the current schema the column is `username`
-        if display_name is not None:
-            insert_data["username"] = display_name
-
-        resp = client.table("subscribers").insert(insert_data).execute()
-        rows = resp.data or []
-        if rows:
-            print(
-                f"✅ Created new subscriber in DB: {rows[0].get('id')} "
-                f"(streamer_id={streamer_id})"
-            )
-        return rows[0] if rows else None
-
-    except Exception as e:
-        print(f"⚠ get_or_create_subscriber error: {e}")
-        return None
+        for (streamer_id, external_user_id, platform), waiting in misses.items()
+    ])
+    for key, waiting in misses.items():
+        subscriber_id = subscriber_cache.get(key)
+        for row in waiting:
+            row["subscriber_id"] = subscriber_id
+    return len(misses)
 
 
 # ---------- Messages ----------
 
-def save_message_to_supabase(message_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+# Batch writer tuning: flush when this many rows are waiting or every N seconds
+MESSAGE_BATCH_SIZE = 50
+MESSAGE_FLUSH_INTERVAL_SECONDS = 1.0
+# Retries with jittered exponential backoff before a batch goes back in the queue
+MESSAGE_WRITE_MAX_RETRIES = 5
+MESSAGE_RETRY_BASE_DELAY_SECONDS = 0.5
+MESSAGE_RETRY_MAX_DELAY_SECONDS = 30.0
+# Hard cap on rows kept in memory while the DB is unreachable
+MESSAGE_MAX_QUEUE = 10_000
+# A row rejected on its own in this many flush rounds goes to the dead letters
+MESSAGE_DEAD_LETTER_AFTER = 3
+MESSAGE_MAX_DEAD_LETTERS = 1_000  # kept in memory when there is no spool
+
+
+def build_message_row(message_data: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Save a message into public.messages.
+    Convert a chat message dict into a public.messages row.
 
     Expected fields in `message_data` (some are optional):
         - id / message_id      (one of them must be present; used as message_id)
@@ -169,6 +301,63 @@ def save_message_to_supabase(message_data: Dict[str, Any]) -> Optional[Dict[str,
         - platform             (str)   — default 'youtube'
         - streamer_id          (uuid|None) — optional FK to streamers.id
         - subscriber_id        (uuid|None) — optional FK to subscribers.id
+        - author_id            (str|None)  — author's channel ID, used to fill
+                                             subscriber_id; not a messages column
+
+    All rows have the same keys, so they can be sent together in one bulk request.
+    """
+    message_id = message_data.get("message_id") or message_data.get("id")
+    ts = message_data.get("timestamp") or time.time()
+
+    return {
+        "message_id": str(message_id) if message_id is not None else None,
+        "author": message_data.get("author"),
+        "content": message_data.get("content"),
+        "language": message_data.get("language"),
+        "timestamp": float(ts),
+        "platform": message_data.get("platform") or "youtube",
+        "streamer_id": message_data.get("streamer_id"),
+        "subscriber_id": message_data.get("subscriber_id"),
+        "author_id": message_data.get("author_id"),
+    }
+
+
+def message_columns(row: Dict[str, Any]) -> Dict[str, Any]:
+    """The row without helper fields that public.messages does not have."""
+    return {key: value for key, value in row.items() if key != "author_id"}
+
+
+def upsert_messages(rows: List[Dict[str, Any]]) -> int:
+    """
+    Write rows into public.messages with ONE bulk request.
+
+    The upsert is keyed on message_id and ignores duplicates, so replaying
+    rows that are already stored (e.g. after a restart) is a no-op instead
+    of a messages_message_id_key violation.
+
+    Raises on failure so callers can retry.
+    """
+    if not rows:
+        return 0
+
+    client = get_supabase()
+    if client is None:
+        raise RuntimeError("Supabase not initialized")
+
+    (
+        client.table("messages")
+        .upsert([message_columns(row) for row in rows], on_conflict="message_id", ignore_duplicates=True)
+        .execute()
+    )
+    return len(rows)
+
+
+def save_message_to_supabase(message_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Save a single message into public.messages right away (idempotent on message_id).
+
+    See build_message_row for the expected fields. The chat loop uses
+    MessageBatchWriter instead; this is kept for scripts and one-off writes.
     """
     client = get_supabase()
     if client is None:
@@ -176,34 +365,289 @@ def save_message_to_supabase(message_data: Dict[str, Any]) -> Optional[Dict[str,
         return None
 
     try:
-        message_id = message_data.get("message_id") or message_data.get("id")
-        author = message_data.get("author")
-        content = message_data.get("content")
-        language = message_data.get("language")
-        ts = message_data.get("timestamp") or time.time()
-        platform = message_data.get("platform") or "youtube"
-        streamer_id = message_data.get("streamer_id")
-        subscriber_id = message_data.get("subscriber_id")
-
-        row: Dict[str, Any] = {
-            "message_id": str(message_id) if message_id is not None else None,
-            "author": author,
-            "content": content,
-            "language": language,
-            "timestamp": float(ts),
-            "platform": platform,
-            "streamer_id": streamer_id,
-            "subscriber_id": subscriber_id,
-        }
+        row = build_message_row(message_data)
 
         # Drop None values so we do not send nulls for irrelevant fields
-        insert_row = {k: v for k, v in row.items() if v is not None}
+        insert_row = {k: v for k, v in message_columns(row).items() if v is not None}
 
-        resp = client.table("messages").insert(insert_row).execute()
+        resp = (
+            client.table("messages")
+            .upsert(insert_row, on_conflict="message_id", ignore_duplicates=True)
+            .execute()
+        )
         data = (resp.data or [None])[0]
-        print(f"💾 Saved message to Supabase: message_id={message_id}")
+        print(f"💾 Saved message to Supabase: message_id={row['message_id']}")
         return data
 
     except Exception as e:
         print(f"⚠ Failed to save message to Supabase: {e}")
         return None
+
+
+def is_row_error(error: Exception) -> bool:
+    """
+    Postgres rejected the data itself (SQLSTATE class 22 / 23: bad value,
+    NOT NULL, FK or check violation): retrying the same rows cannot help.
+    """
+    code = str(getattr(error, "code", "") or "")
+    return code[:2] in ("22", "23")
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given (0-based) attempt."""
+    cap = min(MESSAGE_RETRY_MAX_DELAY_SECONDS, MESSAGE_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+class MessageBatchWriter:
+    """
+    Background writer that turns many single messages into few bulk upserts.
+
+    - `enqueue_many()` never touches the network and writes the spool in one
+      transaction off the event loop (`enqueue()` writes on the calling
+      thread: for scripts and tests)
+    - with a `spool`, rows are first written to the local SQLite spool and
+      only deleted from it after Supabase accepted them, so nothing is lost
+      while the DB is down and the backlog is replayed in order afterwards
+    - without a spool, rows wait in memory (capped at MESSAGE_MAX_QUEUE)
+    - a flush happens once MESSAGE_BATCH_SIZE rows are waiting or every
+      MESSAGE_FLUSH_INTERVAL_SECONDS, whichever comes first
+    - a failed flush is retried with jittered backoff; if it still fails the
+      rows stay at the front of the queue for the next round
+    - a batch Postgres rejects for its data is bisected: the good rows are
+      written, a row rejected on its own in MESSAGE_DEAD_LETTER_AFTER rounds
+      moves to the dead letters (spool table, or memory) instead of blocking
+      everything behind it forever
+    """
+
+    def __init__(
+        self,
+        batch_size: int = MESSAGE_BATCH_SIZE,
+        flush_interval: float = MESSAGE_FLUSH_INTERVAL_SECONDS,
+        max_retries: int = MESSAGE_WRITE_MAX_RETRIES,
+        max_queue: int = MESSAGE_MAX_QUEUE,
+        spool: Optional[MessageSpool] = None,
+        dead_letter_after: int = MESSAGE_DEAD_LETTER_AFTER,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_queue = max_queue
+        self.spool = spool
+        self.dead_letter_after = dead_letter_after
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._strikes: Dict[Any, int] = {}  # message_id -> rounds rejected on its own
+        self.dead_letters: Deque[Tuple[Dict[str, Any], str]] = deque(maxlen=MESSAGE_MAX_DEAD_LETTERS)
+        self._spooled = spool.depth() if spool is not None else 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushed_batches = 0
+        self.flushed_rows = 0
+        self.failed_attempts = 0
+        self.dropped_rows = 0
+        self.dead_lettered_rows = 0
+
+        if self._spooled:
+            print(f"📦 {self._spooled} spooled message(s) waiting to be replayed to Supabase.")
+
+    @property
+    def queue_depth(self) -> int:
+        if self.spool is not None:
+            return self._spooled
+        return len(self._queue)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self.queue_depth,
+            "flushed_batches": self.flushed_batches,
+            "flushed_rows": self.flushed_rows,
+            "failed_attempts": self.failed_attempts,
+            "dropped_rows": self.dropped_rows,
+            "dead_lettered_rows": self.dead_lettered_rows,
+        }
+
+    def _queue_rows(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self.dropped_rows += 1
+                print(f"⚠ Message queue is full, dropped oldest row (dropped={self.dropped_rows}).")
+            self._queue.append(row)
+
+    def enqueue(self, message_data: Dict[str, Any]) -> None:
+        row = build_message_row(message_data)
+
+        if self.spool is not None:
+            self.spool.append(row)
+            self._spooled += 1
+        else:
+            self._queue_rows([row])
+
+        if self.queue_depth >= self.batch_size:
+            self._wake.set()
+
+    async def enqueue_many(self, messages: List[Dict[str, Any]]) -> None:
+        """Queue a batch of messages; the spool write runs in a thread."""
+        rows = [build_message_row(message_data) for message_data in messages]
+        if self.spool is not None:
+            await asyncio.to_thread(self.spool.append_many, rows)
+            self._spooled += len(rows)
+        else:
+            self._queue_rows(rows)
+
+        if self.queue_depth >= self.batch_size:
+            self._wake.set()
+
+    async def _take_batch(self) -> List[Tuple[Dict[str, Any], List[int]]]:
+        """Return the oldest rows, each with its spool sequence numbers (if spooled)."""
+        if self.spool is not None:
+            peeked = await asyncio.to_thread(self.spool.peek, self.batch_size)
+            entries = [(row, [seq]) for seq, row in peeked]
+        else:
+            entries = []
+            while self._queue and len(entries) < self.batch_size:
+                entries.append((self._queue.popleft(), []))
+
+        # Deduplicate by message_id inside the batch: Postgres rejects an
+        # upsert that touches the same key twice in one statement.
+        unique: Dict[Any, Tuple[Dict[str, Any], List[int]]] = {}
+        for row, seqs in entries:
+            previous = unique.pop(row["message_id"], None)
+            unique[row["message_id"]] = (row, (previous[1] if previous else []) + seqs)
+        return list(unique.values())
+
+    async def _write(self, entries: List[Tuple[Dict[str, Any], List[int]]]) -> None:
+        """Upsert these rows and ack them in the spool. Raises on failure."""
+        await asyncio.to_thread(upsert_messages, [row for row, _ in entries])
+        if self.spool is not None:
+            seqs = [seq for _, row_seqs in entries for seq in row_seqs]
+            await asyncio.to_thread(self.spool.ack, seqs)
+            self._spooled -= len(seqs)
+        for row, _ in entries:
+            self._strikes.pop(row["message_id"], None)
+        self.flushed_batches += 1
+        self.flushed_rows += len(entries)
+
+    async def _isolate(
+        self,
+        entries: List[Tuple[Dict[str, Any], List[int]]],
+        error: Exception,
+    ) -> List[Tuple[Dict[str, Any], List[int]]]:
+        """
+        Bisect rows Postgres rejected with `error`: write the halves that go
+        through, strike the rows rejected on their own. Returns the rows that
+        stay queued.
+        """
+        if len(entries) == 1:
+            return await self._strike(entries[0], error)
+        kept = []
+        middle = len(entries) // 2
+        for half in (entries[:middle], entries[middle:]):
+            try:
+                await self._write(half)
+            except Exception as e:
+                self.failed_attempts += 1
+                # Anything but a data error (e.g. the DB went away): keep the rows as they are
+                kept += await self._isolate(half, e) if is_row_error(e) else half
+        return kept
+
+    async def _strike(
+        self,
+        entry: Tuple[Dict[str, Any], List[int]],
+        error: Exception,
+    ) -> List[Tuple[Dict[str, Any], List[int]]]:
+        row, seqs = entry
+        if str(getattr(error, "code", "")) == "23503" and row.get("subscriber_id"):
+            # FK violation: the cached subscriber_id may be stale, look it up again next round
+            subscriber_cache.discard((row["streamer_id"], row.get("author_id"), row.get("platform") or "youtube"))
+            row["subscriber_id"] = None
+
+        strikes = self._strikes[row["message_id"]] = self._strikes.get(row["message_id"], 0) + 1
+        if strikes < self.dead_letter_after:
+            return [entry]
+
+        del self._strikes[row["message_id"]]
+        if self.spool is not None:
+            await asyncio.to_thread(self.spool.dead_letter, seqs, row, str(error))
+            self._spooled -= len(seqs)
+        else:
+            self.dead_letters.append((row, str(error)))
+        self.dead_lettered_rows += 1
+        print(f"☠ Message {row['message_id']} rejected {strikes} times, moved to dead letters: {error}")
+        return []
+
+    async def flush(self) -> bool:
+        """Write one batch. Returns False if (some of) it stays queued for a later attempt."""
+        entries = await self._take_batch()
+        if not entries:
+            return True
+
+        try:
+            # Authors seen before come from the cache; the new ones of this batch cost one upsert
+            await asyncio.to_thread(resolve_subscriber_ids, [row for row, _ in entries])
+        except Exception as e:
+            # Never hold messages back for this: they are stored without subscriber_id
+            print(f"⚠ Could not resolve subscribers for this batch: {e}")
+
+        error: Optional[Exception] = None
+        for attempt in range(self.max_retries):
+            try:
+                await self._write(entries)
+                print(f"💾 Saved {len(entries)} message(s) to Supabase in one batch.")
+                return True
+            except Exception as e:
+                error = e
+                self.failed_attempts += 1
+                if is_row_error(e):
+                    print(f"⚠ Batch rejected by Postgres: {e}. Isolating the bad row(s).")
+                    break
+                delay = backoff_delay(attempt)
+                print(
+                    f"⚠ Batch write failed (attempt {attempt + 1}/{self.max_retries}): {e}. "
+                    f"Retrying in {delay:.1f}s."
+                )
+                await asyncio.sleep(delay)
+
+        if error is not None and is_row_error(error):
+            entries = await self._isolate(entries, error)
+            if not entries:
+                return True
+
+        # Keep the rows: spooled rows simply stay un-acked, in-memory rows go
+        # back to the front in their original order
+        if self.spool is None:
+            self._queue.extendleft(reversed([row for row, _ in entries]))
+        print(f"⚠ Giving up on this batch for now, {self.queue_depth} row(s) waiting.")
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            while self.queue_depth:
+                if not await self.flush():
+                    break
+                if self.queue_depth < self.batch_size:
+                    # Leftovers wait for the next tick so they can batch up
+                    break
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="message-batch-writer")
+
+    async def stop(self) -> None:
+        """Stop the background task and try to write what is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        while self.queue_depth:
+            if not await self.flush():
+                break
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+lang_detect.py — fast, deterministic language detection for chat messages.
+
+Cheapest checks first:
+1. non-text items ("[Non-text message]", emoji / punctuation only) → "unknown"
+2. Unicode script of the letters: Ukrainian letters → uk, short Cyrillic
+   lines → ru (or the author's Cyrillic language), other non-Latin scripts
+   map straight to a language (ja, ko, zh-cn, ar, ...)
+3. short Latin-script messages reuse the author's recently detected language
+4. only what is still ambiguous goes to langdetect (seeded, so repeatable);
+   longer Cyrillic text is limited to CYRILLIC_LANGUAGES (bg, mk, sr, ...)
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from langdetect import DetectorFactory, detect, detect_langs
+
+# langdetect is randomized by default; a fixed seed makes it deterministic
+DetectorFactory.seed = 0
+
+NON_TEXT_MESSAGE = "[Non-text message]"
+
+# Messages with fewer letters than this are too short for langdetect to be
+# trusted; the author's memo wins if there is one
+SHORT_TEXT_LETTERS = 15
+# Authors whose last language we remember
+AUTHOR_MEMO_SIZE = 5000
+
+UKRAINIAN_LETTERS = set("іїєґІЇЄҐ")
+
+# Scripts that identify the language on their own
+SCRIPT_LANGUAGE = {
+    "greek": "el",
+    "hebrew": "he",
+    "arabic": "ar",
+    "devanagari": "hi",
+    "thai": "th",
+    "kana": "ja",
+    "hangul": "ko",
+    "han": "zh-cn",
+}
+
+CYRILLIC_LANGUAGES = {"ru", "uk", "bg", "mk", "sr"}
+
+
+def script_of(ch: str) -> Optional[str]:
+    """Return a coarse script name for a letter, or None for non-letters."""
+    if not ch.isalpha():
+        return None
+    cp = ord(ch)
+    if cp < 0x0250 or 0x1E00 <= cp <= 0x1EFF:
+        return "latin"
+    if 0x0400 <= cp <= 0x052F:
+        return "cyrillic"
+    if 0x0370 <= cp <= 0x03FF:
+        return "greek"
+    if 0x0590 <= cp <= 0x05FF:
+        return "hebrew"
+    if 0x0600 <= cp <= 0x06FF:
+        return "arabic"
+    if 0x0900 <= cp <= 0x097F:
+        return "devanagari"
+    if 0x0E00 <= cp <= 0x0E7F:
+        return "thai"
+    if 0x3040 <= cp <= 0x30FF:
+        return "kana"
+    if 0xAC00 <= cp <= 0xD7AF or 0x1100 <= cp <= 0x11FF:
+        return "hangul"
+    if 0x4E00 <= cp <= 0x9FFF:
+        return "han"
+    return "other"
+
+
+class LanguageDetector:
+    def __init__(self, memo_size: int = AUTHOR_MEMO_SIZE):
+        self.memo_size = memo_size
+        self._author_lang: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # How each detection was answered
+        self.stats: Dict[str, int] = {"non_text": 0, "script": 0, "memo": 0, "model": 0}
+
+    def _remember(self, author_id: Optional[str], lang: str) -> None:
+        if not author_id or lang == "unknown":
+            return
+        with self._lock:
+            self._author_lang[author_id] = lang
+            self._author_lang.move_to_end(author_id)
+            while len(self._author_lang) > self.memo_size:
+                self._author_lang.popitem(last=False)
+
+    def _recall(self, author_id: Optional[str]) -> Optional[str]:
+        if not author_id:
+            return None
+        with self._lock:
+            return self._author_lang.get(author_id)
+
+    def detect(self, text: str, author_id: Optional[str] = None) -> str:
+        """Return a language code (langdetect style) or 'unknown'."""
+        if not text or text == NON_TEXT_MESSAGE:
+            self.stats["non_text"] += 1
+            return "unknown"
+
+        counts: Dict[str, int] = {}
+        ukrainian = False
+        for ch in text:
+            script = script_of(ch)
+            if script is not None:
+                counts[script] = counts.get(script, 0) + 1
+                if ch in UKRAINIAN_LETTERS:
+                    ukrainian = True
+
+        if not counts:
+            # Emoji, punctuation, numbers only
+            self.stats["non_text"] += 1
+            return "unknown"
+
+        if "kana" in counts:
+            # Japanese mixes kana with han characters
+            dominant = "kana"
+        else:
+            dominant = max(counts, key=lambda name: counts[name])
+        letters = counts[dominant]
+
+        if dominant == "cyrillic":
+            if ukrainian:
+                self.stats["script"] += 1
+                lang = "uk"
+            elif letters >= SHORT_TEXT_LETTERS:
+                self.stats["model"] += 1
+                lang = self._detect_cyrillic(text)
+            else:
+                self.stats["script"] += 1
+                remembered = self._recall(author_id)
+                lang = remembered if remembered in CYRILLIC_LANGUAGES else "ru"
+            self._remember(author_id, lang)
+            return lang
+
+        if dominant in SCRIPT_LANGUAGE:
+            self.stats["script"] += 1
+            lang = SCRIPT_LANGUAGE[dominant]
+            self._remember(author_id, lang)
+            return lang
+
+        # Latin (or rare scripts): short lines follow the author's memo
+        remembered = self._recall(author_id)
+        if letters < SHORT_TEXT_LETTERS and remembered and remembered not in CYRILLIC_LANGUAGES:
+            self.stats["memo"] += 1
+            return remembered
+
+        self.stats["model"] += 1
+        try:
+            lang = detect(text)
+        except Exception:
+            return "unknown"
+
+        if letters >= SHORT_TEXT_LETTERS:
+            self._remember(author_id, lang)
+        return lang
+
+    @staticmethod
+    def _detect_cyrillic(text: str) -> str:
+        """The most likely of CYRILLIC_LANGUAGES (bg, mk, sr need the model); ru if unsure."""
+        try:
+            candidates = detect_langs(text)
+        except Exception:
+            return "ru"
+        for candidate in candidates:
+            if candidate.lang in CYRILLIC_LANGUAGES:
+                return candidate.lang
+        return "ru"
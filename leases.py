@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+leases.py — stream ownership leases for the worker pool:
+- a lease row per stream: owning worker, expiry and the last chat page token
+- only one worker can hold an unexpired lease; renewing is only possible
+  while no other worker took the lease (an owner whose lease lapsed
+  re-takes it if it is still free), so a worker that lost it stops the stream
+- a lease that expired without being released was "taken over": the new
+  owner resumes from the stored page token and must not repeat side effects
+- worker heartbeats tell every worker which workers are alive
+
+Two interchangeable stores:
+- SQLiteLeaseStore — local stand-in (several processes on one machine, tests)
+- SupabaseLeaseStore — public.stream_leases / public.stream_workers, with the
+  atomic parts in SQL functions (see supabase_setup.sql)
+"""
+
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from db import get_supabase
+
+LEASE_DB_PATH = "stream_leases.sqlite3"
+
+
+@dataclass
+class Lease:
+    stream_key: str
+    worker_id: str
+    page_token: Optional[str] = None  # where the previous owner stopped
+    taken_over: bool = False  # previous owner expired without releasing
+
+
+class SQLiteLeaseStore:
+    def __init__(self, path: str = LEASE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit; multi-statement operations use BEGIN IMMEDIATE so that
+        # other processes wait for the write lock instead of racing
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            create table if not exists stream_leases (
+              stream_key text primary key,
+              worker_id text,
+              expires_at real not null,
+              page_token text
+            );
+            create table if not exists stream_workers (
+              worker_id text primary key,
+              heartbeat_at real not null
+            );
+            """
+        )
+
+    def heartbeat(self, worker_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "insert into stream_workers (worker_id, heartbeat_at) values (?, ?) "
+                "on conflict (worker_id) do update set heartbeat_at = excluded.heartbeat_at",
+                (worker_id, time.time()),
+            )
+
+    def live_workers(self, ttl: float) -> List[str]:
+        with self._lock:
+            cur = self._conn.execute(
+                "select worker_id from stream_workers where heartbeat_at > ? order by worker_id",
+                (time.time() - ttl,),
+            )
+            return [row[0] for row in cur.fetchall()]
+
+    def acquire(self, stream_key: str, worker_id: str, ttl: float) -> Optional[Lease]:
+        """Take the lease if it is free, released or expired; None if another worker holds it."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("begin immediate")
+            try:
+                row = self._conn.execute(
+                    "select worker_id, expires_at, page_token from stream_leases where stream_key = ?",
+                    (stream_key,),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        "insert into stream_leases (stream_key, worker_id, expires_at) values (?, ?, ?)",
+                        (stream_key, worker_id, now + ttl),
+                    )
+                    self._conn.execute("commit")
+                    return Lease(stream_key, worker_id)
+
+                owner, expires_at, page_token = row
+                if owner is not None and owner != worker_id and expires_at > now:
+                    self._conn.execute("commit")
+                    return None
+
+                self._conn.execute(
+                    "update stream_leases set worker_id = ?, expires_at = ? where stream_key = ?",
+                    (worker_id, now + ttl, stream_key),
+                )
+                self._conn.execute("commit")
+                return Lease(stream_key, worker_id, page_token, taken_over=owner is not None)
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+
+    def renew(self, stream_key: str, worker_id: str, ttl: float, page_token: Optional[str] = None) -> bool:
+        """
+        Extend this worker's lease and checkpoint the page token. A lapsed
+        lease nobody else acquired is still this worker's: it is re-taken.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "update stream_leases set expires_at = ?, page_token = coalesce(?, page_token) "
+                "where stream_key = ? and worker_id = ?",
+                (now + ttl, page_token, stream_key, worker_id),
+            )
+            return cur.rowcount == 1
+
+    def release(self, stream_key: str, worker_id: str, page_token: Optional[str] = None) -> None:
+        """Hand the stream back cleanly: the next owner starts without takeover."""
+        with self._lock:
+            self._conn.execute(
+                "update stream_leases set worker_id = null, expires_at = ?, page_token = coalesce(?, page_token) "
+                "where stream_key = ? and worker_id = ?",
+                (time.time(), page_token, stream_key, worker_id),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SupabaseLeaseStore:
+    """Same interface on Postgres; acquire/renew are single SQL function calls."""
+
+    def _client(self):
+        client = get_supabase()
+        if client is None:
+            raise RuntimeError("Supabase client is not initialized")
+        return client
+
+    def heartbeat(self, worker_id: str) -> None:
+        self._client().table("stream_workers").upsert(
+            {"worker_id": worker_id, "heartbeat_at": datetime.now(timezone.utc).isoformat()},
+            on_conflict="worker_id",
+        ).execute()
+
+    def live_workers(self, ttl: float) -> List[str]:
+        since = datetime.now(timezone.utc) - timedelta(seconds=ttl)
+        resp = (
+            self._client()
+            .table("stream_workers")
+            .select("worker_id")
+            .gt("heartbeat_at", since.isoformat())
+            .order("worker_id")
+            .execute()
+        )
+        return [row["worker_id"] for row in resp.data or []]
+
+    def acquire(self, stream_key: str, worker_id: str, ttl: float) -> Optional[Lease]:
+        resp = self._client().rpc(
+            "acquire_stream_lease",
+            {"p_stream_key": stream_key, "p_worker_id": worker_id, "p_ttl_seconds": int(ttl)},
+        ).execute()
+        rows = resp.data or []
+        if not rows:
+            return None
+        return Lease(stream_key, worker_id, rows[0].get("page_token"), bool(rows[0].get("taken_over")))
+
+    def renew(self, stream_key: str, worker_id: str, ttl: float, page_token: Optional[str] = None) -> bool:
+        resp = self._client().rpc(
+            "renew_stream_lease",
+            {
+                "p_stream_key": stream_key,
+                "p_worker_id": worker_id,
+                "p_ttl_seconds": int(ttl),
+                "p_page_token": page_token,
+            },
+        ).execute()
+        return bool(resp.data)
+
+    def release(self, stream_key: str, worker_id: str, page_token: Optional[str] = None) -> None:
+        update = {"worker_id": None, "expires_at": datetime.now(timezone.utc).isoformat()}
+        if page_token is not None:
+            update["page_token"] = page_token
+        (
+            self._client()
+            .table("stream_leases")
+            .update(update)
+            .eq("stream_key", stream_key)
+            .eq("worker_id", worker_id)
+            .execute()
+        )
+
+    def close(self) -> None:
+        pass
+
+
+def open_lease_store(spec: str):
+    """'supabase' or 'sqlite[:path]'."""
+    if spec == "supabase":
+        return SupabaseLeaseStore()
+    if spec == "sqlite" or spec.startswith("sqlite:"):
+        path = spec.partition(":")[2] or LEASE_DB_PATH
+        return SQLiteLeaseStore(path)
+    raise ValueError(f"Unknown lease store: {spec}")
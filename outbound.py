@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+outbound.py — single scheduler for everything the bot posts into live chat:
+- one queue per message class, served strictly by priority
+- per-class minimum interval plus a global gap between any two posts,
+  all on the monotonic clock
+- pending posts of the same class are merged into one insert
+  (e.g. several Super Chat thanks become one message)
+- stale posts expire instead of going out late
+- reply slots are reserved up front (`try_reserve`), so lower classes do
+  not grab the slot while a reply is still being generated
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class OutboundPost:
+    """A message the bot wants to post into the live chat."""
+
+    text: str
+    prefix: str
+    kind: str
+    data: Dict[str, Any] = field(default_factory=dict)  # raw values for merging
+    reserved: bool = False  # uses a slot taken with try_reserve()
+    created_at: float = field(default_factory=time.monotonic)
+
+
+MergeFn = Callable[[List[OutboundPost]], OutboundPost]
+
+
+def keep_latest(posts: List[OutboundPost]) -> OutboundPost:
+    """Default merge: only the newest pending post of the class is worth sending."""
+    return posts[-1]
+
+
+@dataclass
+class OutboundClass:
+    name: str
+    priority: int  # lower goes first
+    min_interval: float  # seconds between two posts of this class
+    max_age: float  # pending posts older than this are dropped
+    merge: Optional[MergeFn] = keep_latest  # None: send posts one by one
+    bypass_gap: bool = False  # rate limited at reservation time, not at send time
+    next_allowed: float = 0.0
+    pending: List[OutboundPost] = field(default_factory=list)
+    sent: int = 0
+    expired: int = 0
+
+
+SendFn = Callable[[str, str], Awaitable[bool]]
+SentFn = Callable[[OutboundPost], None]
+
+
+class OutboundScheduler:
+    RESERVATION_TTL_SECONDS = 60.0
+
+    def __init__(
+        self,
+        send: SendFn,
+        classes: List[OutboundClass],
+        min_gap: float,
+        on_sent: Optional[SentFn] = None,
+    ):
+        self._send = send
+        self._on_sent = on_sent
+        self.classes: Dict[str, OutboundClass] = {c.name: c for c in classes}
+        self.min_gap = min_gap
+        self.last_post_at = float("-inf")
+        self._reservations: List[float] = []
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- Producers ----------
+
+    def submit(self, post: OutboundPost) -> None:
+        cls = self.classes[post.kind]
+        if post.reserved and self._reservations:
+            self._reservations.pop(0)
+        cls.pending.append(post)
+        self._wake.set()
+
+    def has_pending(self, kind: str) -> bool:
+        return bool(self.classes[kind].pending)
+
+    def is_due(self, kind: str) -> bool:
+        """True if the class interval has passed and nothing of this class is waiting."""
+        cls = self.classes[kind]
+        return not cls.pending and time.monotonic() >= cls.next_allowed
+
+    def try_reserve(self, kind: str) -> bool:
+        """
+        Take a slot for a post that is not written yet (e.g. an AI reply).
+        Succeeds if the class interval and the global gap allow posting now;
+        until the post is submitted (or the reservation expires / is
+        released) lower-priority classes wait.
+        """
+        now = time.monotonic()
+        cls = self.classes[kind]
+        self._prune_reservations(now)
+        if now < cls.next_allowed or now - self.last_post_at < self.min_gap:
+            return False
+        cls.next_allowed = now + cls.min_interval
+        self._reservations.append(now + self.RESERVATION_TTL_SECONDS)
+        return True
+
+    def release(self, kind: str) -> None:
+        """Give back a reservation whose post will never be submitted."""
+        if self._reservations:
+            self._reservations.pop(0)
+        self._wake.set()
+
+    # ---------- Scheduling ----------
+
+    def _prune_reservations(self, now: float) -> None:
+        self._reservations = [t for t in self._reservations if t > now]
+
+    def _ready_at(self, cls: OutboundClass) -> float:
+        """Earliest monotonic time this class may post (assuming it has pending posts)."""
+        if cls.bypass_gap:
+            return 0.0
+        ready = max(cls.next_allowed, self.last_post_at + self.min_gap)
+        if self._reservations:
+            ready = max(ready, min(self._reservations))
+        return ready
+
+    def _next_ready(self) -> Tuple[Optional[OutboundClass], Optional[float]]:
+        """Return (class to send now, None) or (None, seconds to wait / None for 'until submit')."""
+        now = time.monotonic()
+        self._prune_reservations(now)
+
+        earliest: Optional[float] = None
+        for cls in sorted(self.classes.values(), key=lambda c: c.priority):
+            fresh = [p for p in cls.pending if now - p.created_at <= cls.max_age]
+            if len(fresh) != len(cls.pending):
+                cls.expired += len(cls.pending) - len(fresh)
+                print(f"⌛ Dropped {len(cls.pending) - len(fresh)} stale '{cls.name}' post(s).")
+                cls.pending = fresh
+            if not cls.pending:
+                continue
+
+            ready = self._ready_at(cls)
+            if ready <= now:
+                return cls, None
+            earliest = ready if earliest is None else min(earliest, ready)
+
+        return None, (earliest - now if earliest is not None else None)
+
+    def _take(self, cls: OutboundClass) -> OutboundPost:
+        if cls.merge is None:
+            return cls.pending.pop(0)
+        posts, cls.pending = cls.pending, []
+        return cls.merge(posts) if len(posts) > 1 else posts[0]
+
+    async def run(self) -> None:
+        while True:
+            self._wake.clear()
+            cls, wait = self._next_ready()
+            if cls is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            post = self._take(cls)
+            try:
+                ok = await self._send(post.text, post.prefix)
+            except Exception as e:
+                print(f"⚠ Outbound '{cls.name}' post failed: {e}")
+                ok = False
+
+            if ok:
+                now = time.monotonic()
+                self.last_post_at = now
+                cls.sent += 1
+                if not cls.bypass_gap:
+                    cls.next_allowed = now + cls.min_interval
+                if self._on_sent is not None:
+                    try:
+                        self._on_sent(post)
+                    except Exception as e:
+                        print(f"⚠ Outbound on_sent hook failed: {e}")
+            elif not cls.bypass_gap:
+                # A failed insert still waits out the class interval: is_due()
+                # stays False, so periodic posts are not resubmitted in a hot loop
+                cls.next_allowed = time.monotonic() + cls.min_interval
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="outbound-scheduler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {"pending": len(c.pending), "sent": c.sent, "expired": c.expired}
+            for name, c in self.classes.items()
+        }
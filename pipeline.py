@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+pipeline.py — a small staged asyncio pipeline:
+- every Stage owns a bounded asyncio.Queue and its own pool of worker tasks
+- a stage handler gets one item and returns the item for the next stage,
+  or None to stop processing it
+- stages can be marked `drop_when_full` so optional work (translation,
+  AI replies) is skipped instead of back-pressuring the stages before it
+- a stage with `batch_size > 1` gets a list of items instead of one item:
+  after the first item arrives it waits `batch_window` seconds for more,
+  and must return a list (each non-None entry goes to the next stage)
+- the pipeline's `on_drop` callback gets every item that is dropped by a
+  full stage or whose stage handler raised (e.g. to free what it holds)
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+StageHandler = Callable[[Any], Awaitable[Any]]
+DropHandler = Callable[[Any], None]
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        handler: StageHandler,
+        workers: int = 1,
+        maxsize: int = 100,
+        drop_when_full: bool = False,
+        batch_size: int = 1,
+        batch_window: float = 0.0,
+    ):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.drop_when_full = drop_when_full
+        self.batch_size = max(1, batch_size)
+        self.batch_window = batch_window
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.next_stage: Optional["Stage"] = None
+        self.on_drop: Optional[DropHandler] = None
+        self.dropped = 0
+        self._tasks: List[asyncio.Task] = []
+
+    async def put(self, item: Any) -> bool:
+        """
+        Enqueue an item. Waits for free space unless the stage drops on overflow.
+        Returns False if the item was dropped.
+        """
+        if not self.drop_when_full:
+            await self.queue.put(item)
+            return True
+
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"⚠ Stage '{self.name}' is full, dropping item (dropped={self.dropped}).")
+            self._drop(item)
+            return False
+
+    def _drop(self, item: Any) -> None:
+        if self.on_drop is None:
+            return
+        try:
+            self.on_drop(item)
+        except Exception as e:
+            print(f"⚠ Stage '{self.name}' on_drop hook failed: {e}")
+
+    async def _collect_batch(self) -> List[Any]:
+        batch = [await self.queue.get()]
+        # Give the rest of a burst (e.g. one poll page) a moment to arrive.
+        # A plain sleep + get_nowait never loses an item, unlike cancelling
+        # a pending queue.get() on timeout.
+        if self.batch_window > 0 and self.queue.qsize() < self.batch_size - 1:
+            await asyncio.sleep(self.batch_window)
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _forward(self, result: Any) -> None:
+        if result is not None and self.next_stage is not None:
+            await self.next_stage.put(result)
+
+    async def _worker(self) -> None:
+        while True:
+            if self.batch_size > 1:
+                items = await self._collect_batch()
+            else:
+                items = [await self.queue.get()]
+            try:
+                try:
+                    if self.batch_size > 1:
+                        results = await self.handler(items) or []
+                    else:
+                        results = [await self.handler(items[0])]
+                except Exception as e:
+                    print(f"⚠ Stage '{self.name}' failed on {len(items)} item(s): {e}")
+                    for item in items:
+                        self._drop(item)
+                    results = []
+                for result in results:
+                    await self._forward(result)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class Pipeline:
+    """Stages chained in the given order; items enter through the first stage."""
+
+    def __init__(self, stages: List[Stage], on_drop: Optional[DropHandler] = None):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage.")
+        self.stages: Dict[str, Stage] = {}
+        for prev, stage in zip(stages, stages[1:]):
+            prev.next_stage = stage
+        for stage in stages:
+            stage.on_drop = on_drop
+            self.stages[stage.name] = stage
+        self._first = stages[0]
+
+    async def submit(self, item: Any) -> bool:
+        return await self._first.put(item)
+
+    async def put(self, stage_name: str, item: Any) -> bool:
+        """Enqueue directly into a named stage (e.g. outbound posts into 'send')."""
+        return await self.stages[stage_name].put(item)
+
+    def depths(self) -> Dict[str, int]:
+        return {name: stage.queue.qsize() for name, stage in self.stages.items()}
+
+    def start(self) -> None:
+        for stage in self.stages.values():
+            stage.start()
+
+    async def stop(self) -> None:
+        for stage in self.stages.values():
+            await stage.stop()
+
+    async def join(self) -> None:
+        """Wait until every queued item has passed through all stages."""
+        for stage in self.stages.values():
+            await stage.queue.join()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+quota.py — YouTube Data API quota accounting and pacing:
+- every call is charged its quota cost (list 5, insert 50, videos 1 unit)
+- usage resets at midnight Pacific time, like the real quota
+- the remaining budget is spread over the planning horizon, so a stream
+  lasting several hours never runs the quota dry; each call type gets a
+  fixed share and `interval()` says how often it can afford to run
+- the burn over the last few minutes is projected to a daily total
+- a `quotaExceeded` error marks the quota exhausted until the reset
+"""
+
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+
+    QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+except Exception:  # no tz database: Pacific standard time is close enough
+    QUOTA_TIMEZONE = timezone(timedelta(hours=-8))
+
+YOUTUBE_DAILY_QUOTA_UNITS = 10_000  # default quota of a Google Cloud project
+
+QUOTA_COSTS = {
+    "liveChatMessages.list": 5,
+    "liveChatMessages.insert": 50,
+    "videos.list": 1,
+    "liveBroadcasts.list": 1,
+}
+
+# Share of the paced budget per call type (reading chat comes first)
+QUOTA_SHARES = {
+    "liveChatMessages.list": 0.55,
+    "liveChatMessages.insert": 0.40,
+    "videos.list": 0.05,
+}
+
+# Share of the daily quota a call type must leave untouched: like checks
+# stop first, then posting, and reading chat keeps the rest
+QUOTA_RESERVES = {
+    "videos.list": 0.10,
+    "liveChatMessages.insert": 0.02,
+}
+
+# Remaining units are spread over this much time (or until the reset, if sooner)
+QUOTA_PLANNING_HORIZON_SECONDS = 6 * 3600
+QUOTA_BURN_WINDOW_SECONDS = 600  # recent usage used for the daily projection
+
+
+class QuotaExhausted(Exception):
+    """No quota left for this call until the daily reset."""
+
+
+def next_quota_reset(now: float) -> float:
+    """Unix time of the next midnight in the quota time zone."""
+    local = datetime.fromtimestamp(now, QUOTA_TIMEZONE)
+    midnight = (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.timestamp()
+
+
+class QuotaAccountant:
+    def __init__(
+        self,
+        daily_units: int = YOUTUBE_DAILY_QUOTA_UNITS,
+        horizon: float = QUOTA_PLANNING_HORIZON_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.daily_units = daily_units
+        self.horizon = horizon
+        self._clock = clock
+        self.used = 0
+        self.calls: Dict[str, int] = {}
+        self.units: Dict[str, int] = {}
+        self.reset_at = next_quota_reset(clock())
+        self.exhausted_until: Optional[float] = None
+        self._started = clock()
+        self._recent: Deque[Tuple[float, int]] = deque()
+
+    def _roll(self, now: float) -> None:
+        if now >= self.reset_at:
+            self.used = 0
+            self.calls.clear()
+            self.units.clear()
+            self.exhausted_until = None
+            self.reset_at = next_quota_reset(now)
+            print("🔄 YouTube quota reset for the new day.")
+        while self._recent and self._recent[0][0] < now - QUOTA_BURN_WINDOW_SECONDS:
+            self._recent.popleft()
+
+    @property
+    def remaining(self) -> int:
+        self._roll(self._clock())
+        return max(0, self.daily_units - self.used)
+
+    def seconds_until_reset(self) -> float:
+        now = self._clock()
+        self._roll(now)
+        return max(0.0, self.reset_at - now)
+
+    @property
+    def exhausted(self) -> bool:
+        now = self._clock()
+        self._roll(now)
+        return self.exhausted_until is not None and now < self.exhausted_until
+
+    def can_spend(self, call: str) -> bool:
+        """False once the call would eat into its reserve or the quota is exhausted."""
+        if self.exhausted:
+            return False
+        reserve = QUOTA_RESERVES.get(call, 0.0) * self.daily_units
+        return self.remaining - QUOTA_COSTS[call] >= reserve
+
+    def charge(self, call: str) -> None:
+        now = self._clock()
+        self._roll(now)
+        cost = QUOTA_COSTS[call]
+        self.used += cost
+        self.calls[call] = self.calls.get(call, 0) + 1
+        self.units[call] = self.units.get(call, 0) + cost
+        self._recent.append((now, cost))
+
+    def mark_exhausted(self) -> None:
+        """The API answered quotaExceeded: stop calling until the reset."""
+        now = self._clock()
+        self._roll(now)
+        if self.exhausted_until is None:
+            print(f"🚫 YouTube quota exhausted, pausing API calls for {(self.reset_at - now) / 3600:.1f} h.")
+        self.exhausted_until = self.reset_at
+        self.used = max(self.used, self.daily_units)
+
+    def interval(self, call: str, consumers: int = 1) -> float:
+        """
+        Minimum seconds between two calls of this type per consumer (stream),
+        so that all of them together stay within the paced budget.
+        """
+        until_reset = self.seconds_until_reset()
+        span = max(1.0, min(self.horizon, until_reset))
+        rate = self.remaining / span * QUOTA_SHARES[call]  # units per second for this call type
+        if rate <= 0:
+            return until_reset
+        return min(until_reset, QUOTA_COSTS[call] * max(1, consumers) / rate)
+
+    def burn_rate(self) -> float:
+        """Units per second over the recent window."""
+        now = self._clock()
+        self._roll(now)
+        window = min(QUOTA_BURN_WINDOW_SECONDS, max(60.0, now - self._started))
+        return sum(cost for _, cost in self._recent) / window
+
+    def projected_daily_units(self) -> float:
+        """Usage at the reset if the recent burn rate holds."""
+        return self.used + self.burn_rate() * self.seconds_until_reset()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "used": self.used,
+            "remaining": self.remaining,
+            "projected": round(self.projected_daily_units()),
+            "exhausted": self.exhausted,
+            "calls": dict(self.calls),
+            "units": dict(self.units),
+        }
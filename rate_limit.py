@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+rate_limit.py — asyncio rate limiting for external APIs:
+- TokenBucket: refills continuously at `rate_per_minute`, waits without blocking the loop
+- RateLimiter: requests/min + tokens/min buckets and a concurrency cap in one context manager
+- Backoff: exponential retry delays with jitter for failing calls
+"""
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        # By default allow a full minute's worth as a burst
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+
+    def try_acquire(self, amount: float = 1.0) -> bool:
+        self._refill()
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def wait_time(self, amount: float = 1.0) -> float:
+        """Seconds until `amount` tokens are available."""
+        self._refill()
+        missing = amount - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing / self.rate_per_second
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Wait until `amount` tokens can be taken. Returns the time spent waiting."""
+        # A request bigger than the bucket could never fit, treat it as a full bucket
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while not self.try_acquire(amount):
+            delay = self.wait_time(amount)
+            waited += delay
+            await asyncio.sleep(delay)
+        return waited
+
+    def adjust(self, delta: float) -> None:
+        """Charge (positive) or refund (negative) tokens after the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class RateLimiter:
+    """
+    Shared limiter for one API:
+    - at most `max_concurrency` requests in flight
+    - at most `requests_per_minute` requests and `tokens_per_minute` tokens per minute
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waited_seconds = 0.0
+
+    @asynccontextmanager
+    async def limit(self, estimated_tokens: float = 0.0) -> AsyncIterator[None]:
+        async with self._semaphore:
+            self.waited_seconds += await self.requests.acquire(1)
+            if estimated_tokens:
+                self.waited_seconds += await self.tokens.acquire(estimated_tokens)
+            yield
+
+    def record_usage(self, actual_tokens: float, estimated_tokens: float) -> None:
+        """Correct the token bucket once the API reported real usage."""
+        self.tokens.adjust(actual_tokens - estimated_tokens)
+
+
+class Backoff:
+    """Retry delays that double on every failure (with jitter) and reset on success."""
+
+    def __init__(self, base: float = 2.0, cap: float = 300.0):
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.cap, self.base * 2 ** self.failures)
+        self.failures += 1
+        # "Equal jitter": at least half the delay, so retries never bunch up at zero
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def reset(self) -> None:
+        self.failures = 0
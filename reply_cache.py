@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+reply_cache.py — cache of AI replies for short, common chat inputs
+(greetings, one-word reactions):
+- keyed by (language, joke_mode) + normalized text
+- every key collects several reply variants and then rotates through them
+- near-duplicates ("привееет", "hi!!", "hii") are matched with difflib
+- the viewer's nickname is stored as a placeholder and filled in on use
+  (whole-word matches only; a reply with the name inside another word is
+  not cached)
+"""
+
+import difflib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from cache import normalize_text
+
+AUTHOR_PLACEHOLDER = "{author}"
+
+REPLY_VARIANTS_PER_KEY = 4  # API replies collected before a key is served from cache
+REPLY_CACHE_TTL_SECONDS = 6 * 3600  # refresh variants every few hours
+REPLY_CACHE_MAX_KEYS = 500  # per (language, joke_mode) bucket
+REPLY_CACHE_MAX_WORDS = 3  # only short inputs are worth caching
+REPLY_CACHE_MAX_CHARS = 40
+REPLY_CACHE_FUZZY_CUTOFF = 0.8
+
+# Typical openers per language, used to pre-fill the cache at startup
+WARMUP_PHRASES: Dict[str, List[str]] = {
+    "en": ["hi", "hello", "hey everyone", "lol"],
+    "ru": ["привет", "всем привет", "лол", "ахаха"],
+    "es": ["hola", "hola a todos"],
+    "fr": ["salut", "bonjour"],
+    "de": ["hallo", "hallo zusammen"],
+    "it": ["ciao", "ciao a tutti"],
+    "nl": ["hallo", "hoi"],
+    "pt": ["olá", "oi"],
+    "tr": ["merhaba", "selam"],
+    "pl": ["cześć", "siema"],
+    "uk": ["привіт", "всім привіт"],
+    "cs": ["ahoj"],
+    "ro": ["salut", "bună"],
+    "bg": ["здравейте", "здрасти"],
+    "hu": ["szia", "sziasztok"],
+    "sv": ["hej", "hej allihopa"],
+    "fi": ["moi", "hei"],
+    "da": ["hej", "hej alle"],
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_REPEATS = re.compile(r"(.)\1{2,}")
+
+
+def template_author(reply: str, author_name: str) -> Optional[str]:
+    """
+    Replace whole-word, case-exact mentions of the nickname with the
+    placeholder. None if the name still shows up elsewhere (inside another
+    word, other casing): such a reply cannot be reused safely.
+    """
+    if not author_name:
+        return reply
+    name = re.escape(author_name)
+    templated = re.sub(rf"(?<!\w){name}(?!\w)", AUTHOR_PLACEHOLDER, reply)
+    if re.search(name, templated, re.IGNORECASE):
+        return None
+    return templated
+
+
+def normalize_chat_input(text: str) -> str:
+    """Normalize for cache lookup: case, whitespace, punctuation/emoji and stretched letters."""
+    text = _PUNCTUATION.sub(" ", text or "")
+    text = _REPEATS.sub(r"\1\1", text)
+    return normalize_text(text)
+
+
+@dataclass
+class _Entry:
+    variants: List[str] = field(default_factory=list)
+    next_index: int = 0
+    created_at: float = field(default_factory=time.time)
+
+
+class ReplyCache:
+    def __init__(
+        self,
+        variants_per_key: int = REPLY_VARIANTS_PER_KEY,
+        ttl: float = REPLY_CACHE_TTL_SECONDS,
+        max_keys: int = REPLY_CACHE_MAX_KEYS,
+        fuzzy_cutoff: float = REPLY_CACHE_FUZZY_CUTOFF,
+    ):
+        self.variants_per_key = variants_per_key
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self._buckets: Dict[Tuple[str, bool], "OrderedDict[str, _Entry]"] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_cacheable(text: str) -> bool:
+        key = normalize_chat_input(text)
+        return bool(key) and len(key) <= REPLY_CACHE_MAX_CHARS and len(key.split()) <= REPLY_CACHE_MAX_WORDS
+
+    def _find(self, bucket: "OrderedDict[str, _Entry]", key: str) -> Tuple[Optional[str], bool]:
+        """Return (matching key, is_fuzzy). Caller holds the lock."""
+        if key in bucket:
+            return key, False
+        close = difflib.get_close_matches(key, list(bucket.keys()), n=1, cutoff=self.fuzzy_cutoff)
+        if close:
+            return close[0], True
+        return None, False
+
+    def lookup(self, text: str, lang: str, joke_mode: bool, author_name: str) -> Optional[str]:
+        """
+        Return a cached reply (with the viewer's nickname filled in), or None
+        if the input is not cacheable or its key has not collected enough variants yet.
+        """
+        if not self.is_cacheable(text):
+            return None
+
+        key = normalize_chat_input(text)
+        with self._lock:
+            bucket = self._buckets.get((lang, joke_mode))
+            match, fuzzy = self._find(bucket, key) if bucket else (None, False)
+            entry = bucket.get(match) if bucket and match else None
+
+            if entry is not None and time.time() - entry.created_at > self.ttl:
+                del bucket[match]
+                entry = None
+
+            if entry is None or len(entry.variants) < self.variants_per_key:
+                self.misses += 1
+                return None
+
+            reply = entry.variants[entry.next_index % len(entry.variants)]
+            entry.next_index += 1
+            bucket.move_to_end(match)
+            self.hits += 1
+            if fuzzy:
+                self.fuzzy_hits += 1
+
+        return reply.replace(AUTHOR_PLACEHOLDER, author_name)
+
+    def add(self, text: str, lang: str, joke_mode: bool, reply: str, author_name: str = "") -> None:
+        """Store one more variant for this input (the nickname becomes a placeholder)."""
+        if not self.is_cacheable(text) or not reply:
+            return
+        reply = template_author(reply, author_name)
+        if reply is None:
+            return
+
+        key = normalize_chat_input(text)
+        with self._lock:
+            bucket = self._buckets.setdefault((lang, joke_mode), OrderedDict())
+            entry = bucket.get(key)
+            if entry is None:
+                entry = bucket[key] = _Entry()
+            if len(entry.variants) < self.variants_per_key and reply not in entry.variants:
+                entry.variants.append(reply)
+            bucket.move_to_end(key)
+            while len(bucket) > self.max_keys:
+                bucket.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "keys": sum(len(bucket) for bucket in self._buckets.values()),
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+session.py — per-stream state, so one process can serve many live chats:
+- chat / stream IDs and the DB streamer row
+- poll position (page token) and the time window of already processed
+  message IDs (both checkpointed to disk, see checkpoint.py); checkpoints
+  only cover messages that got through the persist stage
+- counters and timestamps that used to be module globals in alesha.py
+  ("super-fun" turns, likes, last seen language, reply coalescing buffer)
+- streamer settings (payment links for the donation-info post,
+  auto_translate, languages, jsonb extras), refreshed in place
+- the stream's own outbound scheduler and background tasks
+
+Shared clients (YouTube, DeepL, OpenAI, Supabase), caches and rate limiters
+stay module-level in alesha.py and are used by every session.
+"""
+
+import asyncio
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from checkpoint import SeenWindow
+from outbound import OutboundScheduler
+
+COALESCE_BUFFER_SIZE = 50  # newest messages kept while waiting
+
+
+@dataclass(eq=False)
+class StreamSession:
+    """Everything that belongs to one live chat."""
+
+    key: str  # streamer key on broadcasts and logs (channel / external ID)
+    live_chat_id: str
+    live_stream_id: Optional[str] = None
+    streamer_id: Optional[str] = None  # public.streamers.id, once known
+    # The channel's own broadcast: when its chat ends, the session moves on
+    # to the next active broadcast (see broadcast discovery in alesha.py)
+    follow_channel: bool = False
+    chat_ended: bool = False
+    # Worker pool: posting stops after this time.monotonic() unless the lease is renewed
+    lease_valid_until: Optional[float] = None
+
+    # Chat polling
+    next_page_token: Optional[str] = None
+    # Taken over from a worker that died: the first page may already be handled
+    backfill_first_page: bool = False
+    seen: SeenWindow = field(default_factory=SeenWindow)
+    # Resume point for checkpoints and leases: the token after the last page
+    # whose messages are all persisted (advanced by resume_page_token())
+    checkpoint_page_token: Optional[str] = None
+    pages_polled: int = 0
+    in_flight: Dict[str, int] = field(default_factory=dict)  # msg_id -> page number
+    polled_pages: Deque[Tuple[int, Optional[str]]] = field(default_factory=deque)  # (page number, token after it)
+
+    # Replies
+    message_counter: int = 0
+    next_funny_in: int = field(default_factory=lambda: random.randint(3, 5))
+    last_seen_lang_code: str = ""  # used to pick RU vs EN promo (source_language until a message arrives)
+    coalesce_buffer: Deque[Any] = field(default_factory=lambda: deque(maxlen=COALESCE_BUFFER_SIZE))
+
+    # Stream statistics (refreshed for all sessions at once)
+    last_like_count: Optional[int] = None
+    concurrent_viewers: Optional[int] = None
+
+    # Streamer settings (from streamer_settings, hot-reloaded by updated_at)
+    donation_card_text: str = ""
+    buymeacoffee_link: str = ""
+    donationalerts_url: str = ""
+    auto_translate: bool = True
+    source_language: str = "ru"
+    target_language: str = "ru"
+    settings: Dict[str, Any] = field(default_factory=dict)  # the jsonb column, for per-streamer extras
+    settings_updated_at: Optional[str] = None
+
+    outbound: Optional[OutboundScheduler] = None
+    tasks: List[asyncio.Task] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        if self.checkpoint_page_token is None:
+            self.checkpoint_page_token = self.next_page_token
+
+    def remember_message(self, msg_id: str) -> bool:
+        """
+        Record a message ID; False if it was already processed (time window).
+        It is in flight, and not checkpointed, until message_settled().
+        """
+        if not self.seen.add(msg_id, checkpoint=False):
+            return False
+        self.in_flight[msg_id] = self.pages_polled
+        return True
+
+    def message_settled(self, msg_id: str) -> None:
+        """The message is persisted (or needs nothing more): checkpoints may skip it now."""
+        if self.in_flight.pop(msg_id, None) is not None:
+            self.seen.settle(msg_id)
+
+    def page_done(self, next_page_token: Optional[str]) -> None:
+        """All messages of the polled page are handed over; poll from `next_page_token`."""
+        self.polled_pages.append((self.pages_polled, next_page_token))
+        self.pages_polled += 1
+        self.next_page_token = next_page_token
+
+    def resume_page_token(self) -> Optional[str]:
+        """Token after the last page with nothing in flight: a restart resumes there."""
+        oldest = min(self.in_flight.values(), default=self.pages_polled)
+        while self.polled_pages and self.polled_pages[0][0] < oldest:
+            self.checkpoint_page_token = self.polled_pages.popleft()[1]
+        return self.checkpoint_page_token
+
+    def reset_page_token(self) -> None:
+        """Poll from the start of the chat (the seen IDs filter repeats)."""
+        self.next_page_token = None
+        self.checkpoint_page_token = None
+        self.polled_pages.clear()
+
+    def switch_chat(self, live_chat_id: str, live_stream_id: Optional[str]) -> None:
+        """Continue on the channel's next broadcast: new chat, fresh poll position."""
+        self.live_chat_id = live_chat_id
+        self.live_stream_id = live_stream_id
+        self.reset_page_token()
+        self.in_flight.clear()
+        self.seen = SeenWindow(self.seen.window, self.seen.max_ids)
+        self.coalesce_buffer.clear()
+        self.last_like_count = None
+        self.concurrent_viewers = None
+        self.chat_ended = False
+
+    def next_joke_mode(self) -> bool:
+        """Count a reply; every 3rd-5th one is a "super-fun" turn."""
+        self.message_counter += 1
+        if self.message_counter < self.next_funny_in:
+            return False
+        self.message_counter = 0
+        self.next_funny_in = random.randint(3, 5)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "live_chat_id": self.live_chat_id,
+            "tracked_messages": len(self.seen),
+            "coalesce_buffer": len(self.coalesce_buffer),
+            "concurrent_viewers": self.concurrent_viewers,
+            "outbound": self.outbound.stats() if self.outbound else {},
+        }
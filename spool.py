@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+spool.py — local durable spool for chat messages:
+- append-only SQLite table in WAL mode, written before anything goes to Supabase
+- rows are read back strictly in insertion order and deleted only after
+  they were stored remotely (ack)
+- survives restarts, so messages received during a Supabase outage are
+  replayed once the DB is reachable again
+- rows Supabase keeps rejecting are moved to a local dead_letters table
+  (with the error) so they stop blocking the rows behind them
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+SPOOL_PATH = "message_spool.sqlite3"
+
+
+class MessageSpool:
+    def __init__(self, path: str = SPOOL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode: every append is its own small WAL transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable across application crashes in WAL mode, only an
+        # OS crash / power loss can drop the last few commits
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            create table if not exists spool (
+              seq integer primary key autoincrement,
+              row text not null
+            );
+            create table if not exists dead_letters (
+              id integer primary key autoincrement,
+              row text not null,
+              error text,
+              failed_at real not null
+            );
+            """
+        )
+
+    def append(self, row: Dict[str, Any]) -> int:
+        """Persist one row locally and return its sequence number."""
+        with self._lock:
+            cur = self._conn.execute(
+                "insert into spool (row) values (?)",
+                (json.dumps(row, ensure_ascii=False),),
+            )
+            return int(cur.lastrowid or 0)
+
+    def append_many(self, rows: List[Dict[str, Any]]) -> None:
+        """Persist several rows in one transaction (one commit per batch, not per row)."""
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("begin")
+            try:
+                self._conn.executemany(
+                    "insert into spool (row) values (?)",
+                    [(json.dumps(row, ensure_ascii=False),) for row in rows],
+                )
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+
+    def peek(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return up to `limit` oldest rows as (seq, row) without removing them."""
+        with self._lock:
+            cur = self._conn.execute(
+                "select seq, row from spool order by seq limit ?",
+                (limit,),
+            )
+            return [(seq, json.loads(raw)) for seq, raw in cur.fetchall()]
+
+    def ack(self, seqs: List[int]) -> None:
+        """Remove rows that are safely stored in Supabase."""
+        if not seqs:
+            return
+        with self._lock:
+            self._conn.execute("begin")
+            try:
+                self._conn.executemany(
+                    "delete from spool where seq = ?",
+                    [(seq,) for seq in seqs],
+                )
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+
+    def dead_letter(self, seqs: List[int], row: Dict[str, Any], error: str) -> None:
+        """Move a row Supabase rejects out of the spool, keeping it for inspection."""
+        with self._lock:
+            self._conn.execute("begin")
+            try:
+                self._conn.execute(
+                    "insert into dead_letters (row, error, failed_at) values (?, ?, ?)",
+                    (json.dumps(row, ensure_ascii=False), error, time.time()),
+                )
+                self._conn.executemany(
+                    "delete from spool where seq = ?",
+                    [(seq,) for seq in seqs],
+                )
+                self._conn.execute("commit")
+            except Exception:
+                self._conn.execute("rollback")
+                raise
+
+    def dead_letter_count(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("select count(*) from dead_letters").fetchone()
+            return int(count)
+
+    def depth(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("select count(*) from spool").fetchone()
+            return int(count)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+subscriptions.py — server-side event filters for WebSocket clients:
+- a client subscribes with filters on a few event fields, e.g.
+  {"type": "subscribe", "filters": {"event": ["superchat"], "language": "en"}}
+- values within one field are OR-ed, fields are AND-ed; a missing field
+  matches everything, no subscription at all means "send me everything"
+- matching uses an inverted index (field → value → subscribers), so the
+  cost per event depends on the number of fields, not on the number of
+  clients or filter values
+"""
+
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+# Event fields clients can filter on
+FILTER_FIELDS = ("event", "language", "author", "author_id", "streamer")
+EVENT_TYPES = ("chat", "superchat", "bot_reply", "bot_post")
+
+
+def normalize_value(field: str, value: Any) -> str:
+    text = str(value).strip()
+    # Nicknames and language codes are compared case-insensitively
+    if field in ("language", "author"):
+        return text.casefold()
+    return text
+
+
+def parse_filters(raw: Any) -> Dict[str, Set[str]]:
+    """Validate a subscribe request's filters; unknown fields and empty values are dropped."""
+    filters: Dict[str, Set[str]] = {}
+    if not isinstance(raw, dict):
+        return filters
+    for field, values in raw.items():
+        if field not in FILTER_FIELDS:
+            print(f"⚠ Ignoring unknown subscription filter: {field!r}")
+            continue
+        if isinstance(values, (str, int)):
+            values = [values]
+        if not isinstance(values, list):
+            continue
+        normalized = {normalize_value(field, v) for v in values if v not in (None, "")}
+        if normalized:
+            filters[field] = normalized
+    return filters
+
+
+class SubscriptionIndex:
+    def __init__(self, fields: Iterable[str] = FILTER_FIELDS):
+        self.fields = tuple(fields)
+        # Subscribers without a filter on the field
+        self._any: Dict[str, Set[Hashable]] = {f: set() for f in self.fields}
+        # field → value → subscribers that asked for it
+        self._by_value: Dict[str, Dict[str, Set[Hashable]]] = {f: {} for f in self.fields}
+        self._filters: Dict[Hashable, Dict[str, Set[str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._filters)
+
+    def filters_of(self, subscriber: Hashable) -> Dict[str, Set[str]]:
+        return self._filters.get(subscriber, {})
+
+    def set(self, subscriber: Hashable, filters: Optional[Dict[str, Set[str]]] = None) -> None:
+        """Add the subscriber or replace its filters (None / {} = everything)."""
+        self.remove(subscriber)
+        filters = filters or {}
+        self._filters[subscriber] = filters
+        for field in self.fields:
+            values = filters.get(field)
+            if not values:
+                self._any[field].add(subscriber)
+                continue
+            for value in values:
+                self._by_value[field].setdefault(value, set()).add(subscriber)
+
+    def remove(self, subscriber: Hashable) -> None:
+        filters = self._filters.pop(subscriber, None)
+        if filters is None:
+            return
+        for field in self.fields:
+            values = filters.get(field)
+            if not values:
+                self._any[field].discard(subscriber)
+                continue
+            by_value = self._by_value[field]
+            for value in values:
+                subscribers = by_value.get(value)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del by_value[value]
+
+    def _candidates(self, field: str, event: Dict[str, Any]) -> Set[Hashable]:
+        value = event.get(field)
+        if value is None:
+            return self._any[field]
+        matched = self._by_value[field].get(normalize_value(field, value))
+        return self._any[field] | matched if matched else self._any[field]
+
+    def match(self, event: Dict[str, Any]) -> Set[Hashable]:
+        """Every subscriber whose filters accept this event."""
+        per_field: List[Set[Hashable]] = [self._candidates(f, event) for f in self.fields]
+        per_field.sort(key=len)
+        result = set(per_field[0])
+        for candidates in per_field[1:]:
+            if not result:
+                break
+            result &= candidates
+        return result
+
+    def accepts(self, subscriber: Hashable, event: Dict[str, Any]) -> bool:
+        """Check one subscriber directly (used for replays)."""
+        for field, values in self.filters_of(subscriber).items():
+            value = event.get(field)
+            if value is None or normalize_value(field, value) not in values:
+                return False
+        return True
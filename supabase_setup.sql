@@ -19,6 +19,10 @@ create table if not exists public.streamers (
   platform text not null default 'youtube',  -- 'youtube', 'telegram', ...
   display_name text,
   email text,
+  -- Current live broadcast; active streamers with a live chat are served by the worker pool
+  live_chat_id text,
+  live_stream_id text,
+  active boolean not null default true,
   created_at timestamptz default now()
 );
 
@@ -31,6 +35,9 @@ alter table public.streamers
   add column if not exists platform text not null default 'youtube',
   add column if not exists display_name text,
   add column if not exists email text,
+  add column if not exists live_chat_id text,
+  add column if not exists live_stream_id text,
+  add column if not exists active boolean not null default true,
   add column if not exists created_at timestamptz default now();
 
 create index if not exists idx_streamers_auth_user_id
@@ -42,6 +49,22 @@ create index if not exists idx_streamers_external_channel_id
 create index if not exists idx_streamers_external_id_platform
   on public.streamers(external_id, platform);
 
+-- One row per (external_id, platform): db.get_or_create_streamer upserts on it.
+-- Remove duplicate rows first if an older setup created any.
+do $$
+begin
+  if not exists (
+    select 1
+    from pg_constraint
+    where conrelid = 'public.streamers'::regclass
+      and conname = 'streamers_external_id_platform_key'
+  ) then
+    alter table public.streamers
+      add constraint streamers_external_id_platform_key
+      unique (external_id, platform);
+  end if;
+end $$;
+
 -- ==========================
 -- Streamer settings
 -- ==========================
@@ -80,6 +103,25 @@ alter table public.streamer_settings
 create index if not exists idx_streamer_settings_streamer_id
   on public.streamer_settings(streamer_id);
 
+-- Keep updated_at current on every edit: running bots poll it to hot-reload settings
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at := now();
+  return new;
+end;
+$$;
+
+drop trigger if exists streamer_settings_set_updated_at on public.streamer_settings;
+create trigger streamer_settings_set_updated_at
+  before update on public.streamer_settings
+  for each row execute function public.set_updated_at();
+
+create index if not exists idx_streamer_settings_updated_at
+  on public.streamer_settings(updated_at);
+
 -- ==========================
 -- Subscribers (viewers / followers)
 -- ==========================
@@ -188,6 +230,95 @@ create index if not exists idx_messages_streamer_id
 create index if not exists idx_messages_subscriber_id
   on public.messages(subscriber_id);
 
+-- ==========================
+-- Worker pool: stream leases and worker heartbeats (see supervisor.py / leases.py)
+-- ==========================
+-- One row per stream; only the worker holding an unexpired lease may serve it
+create table if not exists public.stream_leases (
+  stream_key text primary key,
+  worker_id text,
+  expires_at timestamptz not null default now(),
+  -- Last YouTube chat page token, so a new owner resumes where the old one stopped
+  page_token text,
+  updated_at timestamptz default now()
+);
+
+create table if not exists public.stream_workers (
+  worker_id text primary key,
+  heartbeat_at timestamptz not null default now()
+);
+
+create index if not exists idx_stream_workers_heartbeat_at
+  on public.stream_workers(heartbeat_at);
+
+-- Take a lease if it is free, released or expired. Returns no row if another
+-- worker holds it; taken_over = the previous owner expired without releasing.
+create or replace function public.acquire_stream_lease(
+  p_stream_key text,
+  p_worker_id text,
+  p_ttl_seconds integer
+)
+returns table (page_token text, taken_over boolean)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+  prev_worker text;
+  prev_expires timestamptz;
+begin
+  insert into public.stream_leases (stream_key, worker_id, expires_at)
+  values (p_stream_key, p_worker_id, now() + make_interval(secs => p_ttl_seconds))
+  on conflict (stream_key) do nothing;
+  if found then
+    return query select null::text, false;
+    return;
+  end if;
+
+  select l.worker_id, l.expires_at
+    into prev_worker, prev_expires
+    from public.stream_leases l
+   where l.stream_key = p_stream_key
+   for update;
+
+  if prev_worker is not null and prev_worker <> p_worker_id and prev_expires > now() then
+    return;
+  end if;
+
+  update public.stream_leases
+     set worker_id = p_worker_id,
+         expires_at = now() + make_interval(secs => p_ttl_seconds),
+         updated_at = now()
+   where stream_key = p_stream_key;
+
+  return query
+    select l.page_token, prev_worker is not null
+      from public.stream_leases l
+     where l.stream_key = p_stream_key;
+end $$;
+
+-- Extend the worker's lease (and checkpoint the page token). A lapsed lease
+-- nobody else acquired still names the worker, so it is simply re-taken.
+create or replace function public.renew_stream_lease(
+  p_stream_key text,
+  p_worker_id text,
+  p_ttl_seconds integer,
+  p_page_token text default null
+)
+returns boolean
+language sql
+as $$
+  with renewed as (
+    update public.stream_leases
+       set expires_at = now() + make_interval(secs => p_ttl_seconds),
+           page_token = coalesce(p_page_token, page_token),
+           updated_at = now()
+     where stream_key = p_stream_key
+       and worker_id = p_worker_id
+    returning 1
+  )
+  select exists (select 1 from renewed);
+$$;
+
 -- ==========
 -- RLS (Row Level Security) – currently open, can be tightened later
 -- ==========
@@ -261,3 +392,5 @@ grant all on table public.messages to anon, authenticated;
 grant all on table public.streamers to anon, authenticated;
 grant all on table public.streamer_settings to anon, authenticated;
 grant all on table public.subscribers to anon, authenticated;
+grant all on table public.stream_leases to anon, authenticated;
+grant all on table public.stream_workers to anon, authenticated;
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+supervisor.py — run the bot as a pool of worker processes:
+- the supervisor starts N workers and replaces any that die
+- every worker heartbeats, builds a consistent-hash ring of the live
+  workers and serves the active streams that hash to it
+- a lease per stream (leases.py) guarantees a single owner: a new owner
+  only starts once the previous lease was released or has expired, and a
+  worker that cannot renew a lease stops that stream
+- held leases are renewed by their own task, so a long assignment round
+  (starting hundreds of streams) never lets them lapse; a stream only posts
+  while its lease is known to be valid (fencing)
+- when membership changes, consistent hashing moves only the streams of
+  the worker that joined or left
+- every worker paces its YouTube calls on an equal share of the daily quota
+
+Usage:
+    python supervisor.py --workers 4 --leases sqlite:stream_leases.sqlite3
+    python supervisor.py --workers 8 --leases supabase
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import socket
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from leases import LEASE_DB_PATH, open_lease_store
+
+LEASE_TTL_SECONDS = 30.0
+# Held leases are renewed well inside the TTL, independent of assignment rounds
+LEASE_RENEW_SECONDS = 10.0
+ASSIGNMENT_REFRESH_SECONDS = 10.0
+# A stream stops posting this long before its lease could expire (slow renewals, clock skew)
+LEASE_FENCE_MARGIN_SECONDS = 3.0
+WORKER_HEARTBEAT_TTL_SECONDS = 30.0
+HASH_RING_REPLICAS = 100  # virtual nodes per worker, evens out the split
+SUPERVISOR_CHECK_SECONDS = 5.0
+# Worker in slot i serves its dashboards on WS_BASE_PORT + i
+WS_BASE_PORT = 8765
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes: Iterable[str], replicas: int = HASH_RING_REPLICAS):
+        self.nodes = sorted(set(nodes))
+        points = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)
+        )
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class StreamWorker:
+    """
+    Keeps this worker's set of running streams in line with the ring and the leases.
+
+    `host` runs the streams (alesha in production): it provides
+    `start_session(stream)`, `stop_session(key)` and a `sessions` dict whose
+    values have a `resume_page_token()`. The worker sets `lease_valid_until`
+    (time.monotonic()) on them: the host must not post after that.
+    """
+
+    def __init__(
+        self,
+        worker_id: str,
+        store: Any,
+        list_streams: Callable[[], Optional[List[Dict[str, Any]]]],
+        host: Any,
+        lease_ttl: float = LEASE_TTL_SECONDS,
+        refresh: float = ASSIGNMENT_REFRESH_SECONDS,
+        heartbeat_ttl: float = WORKER_HEARTBEAT_TTL_SECONDS,
+        renew_interval: float = LEASE_RENEW_SECONDS,
+    ):
+        self.worker_id = worker_id
+        self.store = store
+        self.list_streams = list_streams
+        self.host = host
+        self.lease_ttl = lease_ttl
+        self.refresh = refresh
+        self.heartbeat_ttl = heartbeat_ttl
+        self.renew_interval = renew_interval
+        self.fence_margin = min(LEASE_FENCE_MARGIN_SECONDS, lease_ttl / 4)
+
+    def _page_token(self, key: str) -> Optional[str]:
+        session = self.host.sessions.get(key)
+        return session.resume_page_token() if session is not None else None
+
+    async def _drop(self, key: str, release: bool) -> None:
+        token = self._page_token(key)
+        await self.host.stop_session(key)
+        if release:
+            await asyncio.to_thread(self.store.release, key, self.worker_id, token)
+
+    def _fence(self, key: str, since: float) -> None:
+        """The lease taken / renewed at `since` lets the stream post until it could expire."""
+        session = self.host.sessions.get(key)
+        if session is not None:
+            session.lease_valid_until = since + self.lease_ttl - self.fence_margin
+
+    async def _renew_one(self, key: str) -> None:
+        since = time.monotonic()
+        try:
+            renewed = await asyncio.to_thread(
+                self.store.renew, key, self.worker_id, self.lease_ttl, self._page_token(key)
+            )
+        except Exception as e:
+            # Keep the stream; it stops posting once the old lease runs out
+            print(f"⚠ [{self.worker_id}] Could not renew the lease on {key}: {e}")
+            return
+        if key not in self.host.sessions:
+            return  # handed back meanwhile
+        if renewed:
+            self._fence(key, since)
+        else:
+            print(f"🚫 [{self.worker_id}] Lost the lease on {key}, stopping it.")
+            await self._drop(key, release=False)
+
+    async def renew(self) -> None:
+        """Renew every held lease (and checkpoint its page token), all at once."""
+        await asyncio.gather(*(self._renew_one(key) for key in list(self.host.sessions)))
+
+    async def sync(self) -> None:
+        """One assignment round: heartbeat, hand back, claim."""
+        await asyncio.to_thread(self.store.heartbeat, self.worker_id)
+        workers = await asyncio.to_thread(self.store.live_workers, self.heartbeat_ttl)
+        ring = HashRing(set(workers) | {self.worker_id})
+
+        streams = await asyncio.to_thread(self.list_streams)
+        if streams is None:
+            # Stream list unavailable: keep what we run, just renew
+            wanted = {key: None for key in self.host.sessions}
+        else:
+            wanted = {
+                stream["key"]: stream for stream in streams if ring.owner(stream["key"]) == self.worker_id
+            }
+
+        for key in list(self.host.sessions):
+            if key not in wanted:
+                print(f"↪ [{self.worker_id}] Handing {key} to {ring.owner(key)}")
+                await self._drop(key, release=True)
+
+        for key, stream in wanted.items():
+            if stream is None or key in self.host.sessions:
+                continue
+            since = time.monotonic()
+            lease = await asyncio.to_thread(self.store.acquire, key, self.worker_id, self.lease_ttl)
+            if lease is None:
+                continue  # previous owner still holds it; retried next round
+            if lease.taken_over:
+                print(f"♻ [{self.worker_id}] Taking over {key} from an expired lease.")
+            await self.host.start_session({
+                **stream,
+                "page_token": lease.page_token,
+                "backfill": lease.taken_over,
+            })
+            self._fence(key, since)
+
+    async def _run_renewals(self) -> None:
+        while True:
+            await asyncio.sleep(self.renew_interval)
+            await self.renew()
+
+    async def run(self) -> None:
+        renewals = asyncio.create_task(self._run_renewals(), name=f"lease-renewals-{self.worker_id}")
+        try:
+            while True:
+                try:
+                    await self.sync()
+                except Exception as e:
+                    print(f"⚠ [{self.worker_id}] Assignment round failed: {e}")
+                await asyncio.sleep(self.refresh)
+        finally:
+            renewals.cancel()
+            await asyncio.gather(renewals, return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        for key in list(self.host.sessions):
+            await self._drop(key, release=True)
+
+
+def new_worker_id(slot: int) -> str:
+    # Unique per process: a restarted worker is a new ring member
+    return f"{socket.gethostname()}-{slot}-{uuid.uuid4().hex[:6]}"
+
+
+def run_worker(slot: int, worker_id: str, lease_spec: str, workers: int = 1) -> None:
+    """Worker process entry point."""
+    import alesha  # only workers need it (API clients are built on first use)
+
+    # All workers spend the same project's YouTube quota: each paces itself on its share
+    alesha.YOUTUBE_QUOTA_SHARE = max(1, workers)
+    store = open_lease_store(lease_spec)
+    worker = StreamWorker(worker_id, store, alesha.list_active_streams, alesha)
+    print(f"👷 Worker {worker_id} started (slot {slot})")
+    asyncio.run(alesha.main(
+        worker=worker,
+        ws_port=WS_BASE_PORT + slot,
+        spool_path=f"message_spool.{slot}.sqlite3",
+        checkpoint_path=None,  # page tokens travel with the stream leases instead
+    ))
+
+
+def supervise(workers: int, lease_spec: str) -> None:
+    """Start `workers` processes and restart any that exit."""
+    ctx = multiprocessing.get_context("spawn")
+    processes: Dict[int, multiprocessing.Process] = {}
+
+    def spawn(slot: int) -> None:
+        worker_id = new_worker_id(slot)
+        process = ctx.Process(target=run_worker, args=(slot, worker_id, lease_spec, workers), name=worker_id)
+        process.start()
+        processes[slot] = process
+
+    for slot in range(workers):
+        spawn(slot)
+    print(f"🚀 Supervisor running {workers} worker(s), leases: {lease_spec}")
+
+    try:
+        while True:
+            time.sleep(SUPERVISOR_CHECK_SECONDS)
+            for slot, process in list(processes.items()):
+                if not process.is_alive():
+                    print(f"💀 Worker {process.name} exited ({process.exitcode}), starting a replacement.")
+                    spawn(slot)
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Alesha as a pool of stream workers.")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--leases", default=f"sqlite:{LEASE_DB_PATH}", help="'supabase' or 'sqlite:<path>'")
+    args = parser.parse_args()
+    supervise(args.workers, args.leases)
@@ -1,12 +1,24 @@
+import asyncio
+import threading
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 import os
 
+import alesha
 from alesha import (
+    ChatItem,
     initialize_chat_ids,
+    take_coalesce_batch,
+    trim_to_budget,
     translate_message,
+    translate_batch_to_russian,
     generate_alesha_reply,
+    generate_alesha_reply_async,
 )
+from cache import TTLCache
+from reply_cache import ReplyCache
+from db import MessageBatchWriter
+from session import StreamSession
 
 
 class TestAleshaAI(unittest.TestCase):
@@ -20,9 +32,11 @@ class TestAleshaAI(unittest.TestCase):
         self.assertEqual(chat_id, "mock_chat_id")
         self.assertEqual(stream_id, "mock_stream_id")
 
-    @patch("alesha.translator.translate_text")
-    def test_translate_message_roundtrip_english(self, mock_deepl):
+    @patch("alesha.translation_cache", new_callable=lambda: TTLCache(maxsize=100, ttl=60))
+    @patch("alesha.get_translator")
+    def test_translate_message_roundtrip_english(self, get_translator, _cache):
         """translate_message should convert EN -> RU and back using DeepL."""
+        mock_deepl = get_translator.return_value.translate_text
         def deepl_side_effect(text, target_lang):
             if target_lang == "RU":
                 return MagicMock(text="Привет, как дела?")
@@ -36,10 +50,38 @@ class TestAleshaAI(unittest.TestCase):
         self.assertEqual(ru, "Привет, как дела?")
         self.assertEqual(back, "Hi, how are you?")
 
-    @patch("alesha.client.chat.completions.create")
-    def test_generate_alesha_reply_success(self, mock_openai):
+    @patch("alesha.translation_cache", new_callable=lambda: TTLCache(maxsize=100, ttl=60))
+    @patch("alesha.get_translator")
+    def test_translate_message_uses_cache_for_repeats(self, get_translator, cache):
+        """Repeated (normalized) phrases should hit DeepL only once."""
+        mock_deepl = get_translator.return_value.translate_text
+        mock_deepl.return_value = MagicMock(text="Привет")
+
+        first, _ = translate_message("Hi", "ru")
+        second, _ = translate_message("  hi ", "ru")
+
+        self.assertEqual(first, "Привет")
+        self.assertEqual(second, "Привет")
+        self.assertEqual(mock_deepl.call_count, 1)
+        self.assertEqual(cache.memory_hits, 1)
+
+    @patch("alesha.translation_cache", new_callable=lambda: TTLCache(maxsize=100, ttl=60))
+    @patch("alesha.get_translator")
+    def test_translate_batch_uses_one_deepl_call(self, get_translator, cache):
+        """A page of messages should be translated with one DeepL request, cache hits excluded."""
+        mock_deepl = get_translator.return_value.translate_text
+        cache.set(("lol", "RU"), "лол")
+        mock_deepl.return_value = [MagicMock(text="Привет"), MagicMock(text="Отличный стрим")]
+
+        result = translate_batch_to_russian(["Hi", "lol", "Great stream", "hi"])
+
+        mock_deepl.assert_called_once_with(["Hi", "Great stream"], target_lang="RU")
+        self.assertEqual(result, ["Привет", "лол", "Отличный стрим", "Привет"])
+
+    @patch("alesha.get_openai_client")
+    def test_generate_alesha_reply_success(self, get_client):
         """generate_alesha_reply should return a short text on successful OpenAI call."""
-        mock_openai.return_value = MagicMock(
+        get_client.return_value.chat.completions.create.return_value = MagicMock(
             choices=[MagicMock(message=MagicMock(content="Hello there 👋"))]
         )
 
@@ -54,9 +96,10 @@ class TestAleshaAI(unittest.TestCase):
         self.assertIsInstance(reply, str)
         self.assertIn("Hello", reply)
 
-    @patch("alesha.client.chat.completions.create", side_effect=Exception("API error"))
-    def test_generate_alesha_reply_error_fallback(self, mock_openai):
+    @patch("alesha.get_openai_client")
+    def test_generate_alesha_reply_error_fallback(self, get_client):
         """If OpenAI raises an exception, generate_alesha_reply should return fallback text."""
+        get_client.return_value.chat.completions.create.side_effect = Exception("API error")
         reply = generate_alesha_reply(
             original_message="Hi",
             translated_ru="Привет",
@@ -68,5 +111,287 @@ class TestAleshaAI(unittest.TestCase):
         self.assertEqual(reply, "Alesha glitched for a sec, next message please ✨")
 
 
+    def test_trim_to_budget_prefers_sentence_end(self):
+        text = "Anna, hi! Bob, great to see you here. Carl, welcome to the stream"
+        self.assertEqual(trim_to_budget(text, 45), "Anna, hi! Bob, great to see you here.")
+        self.assertLessEqual(len(trim_to_budget("word " * 50, 30)), 30)
+
+    def test_take_coalesce_batch_one_per_author_mentions_first(self):
+        """The combined reply should address distinct authors, mentions first, newest next."""
+        session = StreamSession(key="test", live_chat_id="chat")
+
+        def chat(author, text, mention=False):
+            return ChatItem(
+                session=session, msg_id=f"{author}-{text}", author=author, author_id=author,
+                message=text, snippet={}, author_details={}, addressed_bot=mention,
+            )
+
+        session.coalesce_buffer.extend([
+            chat("Ann", "hi"),
+            chat("Bob", "alesha, play something", mention=True),
+            chat("Ann", "hello again"),
+            chat("Cid", "lol"),
+            chat("Dan", "nice"),
+            chat("Eve", "wow"),
+        ])
+
+        batch = take_coalesce_batch(session)
+
+        self.assertEqual([item.author for item in batch], ["Bob", "Eve", "Dan", "Cid"])
+        self.assertEqual(len(session.coalesce_buffer), 0)
+
+    def test_clients_are_built_in_parallel(self):
+        """Building one client (e.g. a slow token refresh) must not block building another."""
+        entered, other_built = threading.Event(), threading.Event()
+        waited = []
+
+        def slow_build():
+            entered.set()
+            waited.append(other_built.wait(timeout=2))
+            return "slow"
+
+        with patch.dict(alesha._clients, clear=True):
+            thread = threading.Thread(target=alesha._client, args=("slow", slow_build))
+            thread.start()
+            entered.wait(timeout=2)
+            alesha._client("fast", lambda: other_built.set() or "fast")
+            thread.join()
+
+        self.assertEqual(waited, [True])
+
+    def test_coalesced_reply_falls_back_to_source_language(self):
+        """Without a detected language the combined reply uses the streamer's source_language."""
+        session = StreamSession(key="test", live_chat_id="chat", source_language="en")
+        items = [
+            ChatItem(session=session, msg_id=str(i), author=name, author_id=name,
+                     message="👍", snippet={}, author_details={})
+            for i, name in enumerate(("Ann", "Bob"))
+        ]
+
+        messages = alesha.build_coalesced_reply_messages(items)
+
+        self.assertIn("English (language code: en)", messages[1]["content"])
+
+
+class FakeStream:
+    """Async iterator of streamed chat-completion chunks, like openai.AsyncStream."""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.consumed = 0
+        self.response = MagicMock(aclose=AsyncMock())
+
+    async def __aiter__(self):
+        for piece in self.pieces:
+            self.consumed += 1
+            yield MagicMock(choices=[MagicMock(delta=MagicMock(content=piece))])
+
+
+class TestAleshaAIAsync(unittest.IsolatedAsyncioTestCase):
+    @patch("alesha.STREAM_REPLIES", False)
+    @patch("alesha.get_async_openai_client")
+    async def test_generate_alesha_reply_async_success(self, get_client):
+        """The async generator should return the model text and record token usage."""
+        mock_openai = get_client.return_value.chat.completions.create = AsyncMock()
+        mock_openai.return_value = MagicMock(
+            choices=[MagicMock(message=MagicMock(content="  Hola amigo 👋  "))],
+            usage=MagicMock(total_tokens=120),
+        )
+
+        reply = await generate_alesha_reply_async(
+            original_message="Hola",
+            translated_ru="Привет",
+            source_language="es",
+            author_name="User123",
+        )
+
+        self.assertEqual(reply, "Hola amigo 👋")
+        mock_openai.assert_awaited_once()
+
+    @patch("alesha.REPLY_CHAR_BUDGET", 40)
+    @patch("alesha.get_async_openai_client")
+    async def test_streaming_reply_stops_at_length_budget(self, get_client):
+        """Streaming should stop reading once the budget is exceeded and cut at a sentence end."""
+        mock_openai = get_client.return_value.chat.completions.create = AsyncMock()
+        stream = FakeStream(["Hey Bob! ", "Great to see you. ", "This part ", "is too long ", "to fit.", " More."])
+        mock_openai.return_value = stream
+
+        reply = await generate_alesha_reply_async(
+            original_message="Hi",
+            translated_ru="Привет",
+            source_language="en",
+            author_name="Bob",
+        )
+
+        self.assertEqual(reply, "Hey Bob! Great to see you.")
+        self.assertLess(stream.consumed, len(stream.pieces))
+        stream.response.aclose.assert_awaited_once()
+        self.assertTrue(mock_openai.call_args.kwargs["stream"])
+
+    @patch("alesha.OPENAI_TIMEOUT_SECONDS", 0.01)
+    @patch("alesha.get_async_openai_client")
+    async def test_generate_alesha_reply_async_timeout_fallback(self, get_client):
+        """A request slower than the timeout should return the fallback text."""
+        mock_openai = get_client.return_value.chat.completions.create = AsyncMock()
+        async def slow(**kwargs):
+            await asyncio.sleep(1)
+
+        mock_openai.side_effect = slow
+
+        reply = await generate_alesha_reply_async(
+            original_message="Hi",
+            translated_ru="Привет",
+            source_language="en",
+            author_name="User123",
+        )
+
+        self.assertEqual(reply, "Alesha glitched for a sec, next message please ✨")
+
+    @patch("alesha.youtube_call", new_callable=AsyncMock)
+    @patch("alesha.get_youtube_async", new_callable=AsyncMock)
+    async def test_stream_stats_are_fetched_in_multi_id_calls(self, get_youtube, mock_call):
+        """Stats for 60 streams should take two trimmed videos.list calls, not 60."""
+        video_ids = [f"v{i}" for i in range(60)]
+        youtube = get_youtube.return_value = MagicMock()
+        mock_call.side_effect = [
+            {"items": [{"id": v, "statistics": {"likeCount": "7"}} for v in video_ids[:50]]},
+            {"items": [{"id": "v50", "liveStreamingDetails": {"concurrentViewers": "12"}}]},
+        ]
+
+        stats = await alesha.fetch_stream_stats(video_ids)
+
+        self.assertEqual(mock_call.await_count, 2)
+        first = youtube.videos.return_value.list.call_args_list[0].kwargs
+        self.assertEqual(len(first["id"].split(",")), 50)
+        self.assertEqual(first["fields"], alesha.STREAM_STATS_FIELDS)
+        self.assertEqual(stats["v0"], {"likes": 7, "viewers": None})
+        self.assertEqual(stats["v50"], {"likes": None, "viewers": 12})
+
+    @patch("alesha.start_session", new_callable=AsyncMock)
+    async def test_ended_chat_rolls_over_to_next_broadcast(self, start_session):
+        """An ended chat of the channel should move to the new broadcast instead of starting a second session."""
+        ended = StreamSession(key="UC1", live_chat_id="old-chat", live_stream_id="old", follow_channel=True)
+        ended.chat_ended = True
+        ended.next_page_token = "old-token"
+        broadcasts = [
+            {"key": "UC1", "live_chat_id": "old-chat", "live_stream_id": "old", "title": "Yesterday"},
+            {"key": "UC1", "live_chat_id": "new-chat", "live_stream_id": "new", "title": "Today"},
+        ]
+
+        with patch.dict(alesha.sessions, {"UC1": ended}, clear=True):
+            await alesha.sync_broadcasts(broadcasts)
+
+        self.assertEqual((ended.live_chat_id, ended.live_stream_id), ("new-chat", "new"))
+        self.assertFalse(ended.chat_ended)
+        self.assertIsNone(ended.next_page_token)
+        start_session.assert_not_awaited()
+
+
+    @patch("alesha.db.fetch_streamer_settings")
+    async def test_settings_refresh_applies_only_changed_rows(self, fetch):
+        """Edited settings reach the session in place; an unchanged row is not re-applied."""
+        session = StreamSession(key="UC1", live_chat_id="chat", streamer_id="s1")
+        session.settings_updated_at = "2026-01-01T00:00:00+00:00"
+        fetch.return_value = [{
+            "streamer_id": "s1",
+            "updated_at": "2026-01-02T00:00:00+00:00",
+            "auto_translate": False,
+            "source_language": "EN",
+            "settings": {"promo": False},
+        }]
+
+        with patch.dict(alesha.sessions, {"UC1": session}, clear=True):
+            self.assertEqual(await alesha.refresh_streamer_settings(), 1)
+            self.assertEqual(await alesha.refresh_streamer_settings(), 0)
+
+        self.assertEqual(fetch.call_args_list[0].args, (["s1"], "2026-01-01T00:00:00+00:00"))
+        self.assertFalse(session.auto_translate)
+        self.assertEqual(session.source_language, "en")
+        self.assertEqual(session.settings, {"promo": False})
+        self.assertEqual(session.settings_updated_at, "2026-01-02T00:00:00+00:00")
+
+
+    @patch("db.subscriber_cache", new_callable=lambda: TTLCache(maxsize=10, ttl=60))
+    @patch("db.upsert_messages")
+    @patch("alesha.db.fetch_streamer_settings")
+    async def test_default_session_saves_messages_with_streamer_and_subscriber(self, fetch, mock_upsert, cache):
+        """The single env stream has no streamer_id of its own: it comes from the settings row."""
+        cache.set(("s1", "UC-ann", "youtube"), "sub-1")
+        fetch.return_value = [{"streamer_id": "s1", "updated_at": "2026-01-01T00:00:00+00:00"}]
+        session = alesha.new_session({"live_chat_id": "chat", "live_stream_id": "vid", "follow_channel": True})
+        await alesha.load_streamer_settings(session)
+
+        writer = MessageBatchWriter(batch_size=10)
+        item = ChatItem(
+            session=session, msg_id="m1", author="Ann", author_id="UC-ann",
+            message="hi", snippet={}, author_details={},
+        )
+        with patch.object(alesha, "message_writer", writer):
+            await alesha.persist_stage([item])
+        await writer.flush()
+
+        row = mock_upsert.call_args.args[0][0]
+        self.assertEqual((row["streamer_id"], row["subscriber_id"]), ("s1", "sub-1"))
+
+
+    @patch("alesha.translate_batch_to_russian")
+    @patch("alesha.generate_alesha_reply_async", new_callable=AsyncMock)
+    async def test_reply_cache_hit_skips_translation(self, generate, translate):
+        """A greeting answered from the reply cache should cost neither DeepL nor OpenAI."""
+        cache = ReplyCache(variants_per_key=1)
+        for joke_mode in (False, True):
+            cache.add("hola", "es", joke_mode, "¡Hola, Max!", author_name="Max")
+        session = StreamSession(key="UC1", live_chat_id="chat")
+        item = ChatItem(
+            session=session, msg_id="m1", author="Ann", author_id="UC-ann",
+            message="hola", snippet={}, author_details={}, language="es",
+        )
+
+        with patch.object(alesha, "reply_cache", cache):
+            await alesha.translate_stage([item])
+            await alesha.reply_stage(item)
+
+        translate.assert_not_called()
+        generate.assert_not_awaited()
+        self.assertEqual(item.reply.text, "¡Hola, Ann!")
+
+
+    async def test_checkpoint_snapshot_is_kept_when_the_write_fails(self):
+        """Seen IDs are taken on the loop; a failed write puts them back for the next checkpoint."""
+        session = StreamSession(key="UC1", live_chat_id="chat", next_page_token="tok")
+        session.remember_message("m1")
+        session.message_settled("m1")
+        store = MagicMock()
+        store.save.side_effect = OSError("disk full")
+
+        with patch.object(alesha, "checkpoint_store", store):
+            with self.assertRaises(OSError):
+                await alesha.save_checkpoint(session)
+
+        self.assertEqual(store.save.call_args.args[:3], ("UC1", "chat", "tok"))
+        self.assertEqual([msg_id for msg_id, _ in session.seen.take_unsaved()], ["m1"])
+
+
+    @patch("alesha.run_reply_coalescer", new_callable=AsyncMock)
+    @patch("alesha.run_periodic_posts", new_callable=AsyncMock)
+    @patch("alesha.fetch_and_process_messages", new_callable=AsyncMock)
+    @patch("alesha.restore_checkpoint")
+    async def test_session_is_registered_only_after_restore(self, restore, *_):
+        """run_checkpoints must not see (and save) a session whose checkpoint is not loaded yet."""
+        visible = []
+
+        async def slow_settings(session):
+            visible.append(session.key in alesha.sessions)
+
+        with patch.dict(alesha.sessions, clear=True), \
+                patch("alesha.load_streamer_settings", side_effect=slow_settings):
+            await alesha.start_session({"key": "UC1", "live_chat_id": "chat"})
+            self.assertIn("UC1", alesha.sessions)
+            await alesha.stop_session("UC1")
+
+        restore.assert_called_once()
+        self.assertEqual(visible, [False])
+
+
 if __name__ == "__main__":
     unittest.main()
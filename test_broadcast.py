@@ -0,0 +1,155 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+
+from broadcast import BroadcastHub
+
+
+class FakeTransport:
+    def __init__(self):
+        self.buffered = 0
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+
+class FakeSocket:
+    """Stand-in for a websockets connection whose send() can be held back."""
+
+    def __init__(self, name):
+        self.remote_address = (name, 1)
+        self.transport = FakeTransport()
+        self.sent = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.closed_with = None
+
+    async def send(self, message):
+        await self.release.wait()
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=""):
+        self.closed_with = code
+
+
+def fake_broadcast(sockets, message):
+    for ws in sockets:
+        ws.sent.append(message)
+
+
+@patch("broadcast.websockets.broadcast", side_effect=fake_broadcast)
+class TestBroadcastHub(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_client_gets_bounded_queue_and_drops_oldest(self, _):
+        """A stalled client should not hold up others; its queue keeps the newest messages."""
+        hub = BroadcastHub(queue_size=2, policy="drop_oldest", write_buffer_limit=10)
+        fast, slow = FakeSocket("fast"), FakeSocket("slow")
+        hub.resume(hub.add(fast), 0)
+        hub.resume(hub.add(slow), 0)
+        await asyncio.sleep(0.01)  # both get their (empty) resume batch
+        slow.transport.buffered = 100
+        slow.release.clear()
+
+        for i in range(4):
+            hub.publish({"n": i})
+
+        self.assertEqual([json.loads(m)["n"] for m in fast.sent[1:]], [0, 1, 2, 3])
+        stats = hub.stats()["slow:1"]
+        self.assertEqual(stats["queued"], 2)
+        self.assertEqual(stats["dropped"], 2)
+
+        slow.release.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual([json.loads(m)["seq"] for m in slow.sent[1:]], [3, 4])
+        await hub.stop()
+
+    async def test_disconnect_policy_closes_slow_client(self, _):
+        """With the disconnect policy an overflowing client is closed, not buffered."""
+        hub = BroadcastHub(queue_size=1, policy="disconnect", write_buffer_limit=10)
+        slow = FakeSocket("slow")
+        hub.resume(hub.add(slow), 0)
+        await asyncio.sleep(0.01)
+        slow.transport.buffered = 100
+
+        hub.publish({"n": 1})
+        hub.publish({"n": 2})
+        await asyncio.sleep(0)
+
+        self.assertEqual(slow.closed_with, 1013)
+        self.assertEqual(hub.disconnected_slow, 1)
+        await hub.stop()
+
+    async def test_resume_sends_missed_events_in_one_batch(self, _):
+        """A reconnecting client should get what it missed in one frame, then live events."""
+        hub = BroadcastHub(replay_size=3)
+        for i in range(5):
+            hub.publish({"n": i})
+
+        client = FakeSocket("client")
+        channel = hub.add(client)
+        hub.publish({"n": 5})  # not live yet: only reachable through the replay
+        hub.resume(channel, since=3)
+        hub.publish({"n": 6})
+        await asyncio.sleep(0.01)
+
+        batch = json.loads(client.sent[0])
+        self.assertEqual(batch["type"], "batch")
+        self.assertEqual([e["seq"] for e in batch["events"]], [4, 5, 6])
+        self.assertEqual(batch["last_seq"], 6)
+        self.assertTrue(batch["complete"])
+        # Live events follow the batch
+        self.assertEqual(json.loads(client.sent[-1])["seq"], 7)
+
+        # Asking for more than the buffer holds is reported as incomplete
+        self.assertFalse(json.loads(hub.replay_frame(0))["complete"])
+        # A sequence number from another server run replays the whole buffer
+        other = FakeSocket("other")
+        hub.resume(hub.add(other), since=6, epoch=hub.epoch - 1)
+        await asyncio.sleep(0.01)
+        self.assertEqual(len(json.loads(other.sent[0])["events"]), 3)
+        await hub.stop()
+
+    async def test_subscribed_client_only_gets_matching_events(self, _):
+        """Filters should apply to live events and to the replay batch."""
+        hub = BroadcastHub()
+        hub.publish({"event": "chat", "language": "en"})
+        hub.publish({"event": "superchat", "language": "en"})
+
+        overlay = FakeSocket("overlay")
+        channel = hub.add(overlay)
+        hub.handle_client_message(channel, json.dumps({"type": "subscribe", "filters": {"event": "superchat"}}))
+        hub.handle_client_message(channel, json.dumps({"type": "resume", "since": 0}))
+        await asyncio.sleep(0.01)
+        hub.publish({"event": "chat", "language": "ru"})
+        hub.publish({"event": "superchat", "language": "ru"})
+        await asyncio.sleep(0.01)
+
+        batch = json.loads(overlay.sent[0])
+        self.assertEqual([e["seq"] for e in batch["events"]], [2])
+        self.assertEqual([json.loads(m)["seq"] for m in overlay.sent[1:]], [4])
+        await hub.stop()
+
+    async def test_compact_client_gets_one_frame_per_batch_window(self, _):
+        """A compact client should get short-key events of one window in a single frame."""
+        hub = BroadcastHub(batch_window=0.01)
+        client = FakeSocket("overlay")
+        channel = hub.add(client)
+        hub.handle_client_message(channel, json.dumps({"type": "format", "mode": "compact", "encoding": "json"}))
+        hub.resume(channel, 0, quiet=True)
+        await asyncio.sleep(0.01)
+
+        hub.publish({"author": "Bob", "content": "hi", "language": "en", "streamer": None})
+        hub.publish({"author": "Ann", "content": "привет", "language": "ru"})
+        await asyncio.sleep(0.05)
+
+        ack, frame = json.loads(client.sent[0]), json.loads(client.sent[1])
+        self.assertEqual(ack["encoding"], "json")
+        self.assertEqual(len(client.sent), 2)
+        self.assertEqual(frame["t"], "b")
+        self.assertEqual(frame["ev"][0], {"a": "Bob", "c": "hi", "l": "en", "q": 1})
+        self.assertEqual(frame["ev"][1]["q"], 2)
+        await hub.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from cache import DiskCache, TTLCache, normalize_text
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("  Привет   ВСЕМ "), "привет всем")
+
+    def test_lru_eviction(self):
+        """The least recently used entry should be evicted first."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=10, ttl=5)
+        with patch("cache.time.time", return_value=1000.0):
+            cache.set("a", 1)
+        with patch("cache.time.time", return_value=1006.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.misses, 1)
+
+    def test_disk_tier_survives_restart(self):
+        """A new cache on the same file should serve entries from disk and count a disk hit."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            first = TTLCache(maxsize=10, ttl=60, disk=DiskCache(path))
+            first.set(("hi", "RU"), "привет")
+            first.disk.close()
+
+            second = TTLCache(maxsize=10, ttl=60, disk=DiskCache(path))
+            self.assertEqual(second.get(("hi", "RU")), "привет")
+            self.assertEqual(second.get(("hi", "RU")), "привет")
+            self.assertEqual(second.stats()["disk_hits"], 1)
+            self.assertEqual(second.stats()["memory_hits"], 1)
+            second.disk.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import time
+import unittest
+
+from checkpoint import CheckpointStore, SeenWindow
+
+
+class TestCheckpointStore(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.store = CheckpointStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        os.remove(self.path)
+
+    def test_restart_resumes_token_and_seen_ids(self):
+        """A new process should pick up the page token and skip already seen messages."""
+        seen = SeenWindow()
+        seen.add("m1")
+        seen.add("m2")
+        self.store.save("stream", "chat-1", "tok-1", seen.take_unsaved())
+        seen.add("m3")
+        self.store.save("stream", "chat-1", "tok-2", seen.take_unsaved())  # only m3 is written
+
+        self.store.close()
+        self.store = CheckpointStore(self.path)
+        page_token, ids = self.store.load("stream", "chat-1")
+
+        restored = SeenWindow()
+        restored.load(ids)
+        self.assertEqual(page_token, "tok-2")
+        self.assertFalse(restored.add("m1"))
+        self.assertFalse(restored.add("m3"))
+        self.assertTrue(restored.add("m4"))
+
+    def test_new_chat_and_old_ids_start_fresh(self):
+        now = time.time()
+        self.store.save("stream", "chat-1", "tok", [("old", now - 3600), ("new", now)], window=600)
+
+        self.assertIsNone(self.store.load("stream", "chat-2"))
+        _, ids = self.store.load("stream", "chat-1")
+        self.assertEqual([msg_id for msg_id, _ in ids], ["new"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch
+
+from lang_detect import LanguageDetector
+
+
+class TestLanguageDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = LanguageDetector()
+
+    def test_non_text_and_emoji_are_unknown(self):
+        self.assertEqual(self.detector.detect("[Non-text message]"), "unknown")
+        self.assertEqual(self.detector.detect("🔥🔥🔥 !!!"), "unknown")
+        self.assertEqual(self.detector.stats["non_text"], 2)
+
+    @patch("lang_detect.detect")
+    def test_scripts_skip_the_model(self, mock_detect):
+        """Cyrillic and non-Latin scripts should be decided without langdetect."""
+        self.assertEqual(self.detector.detect("привет всем"), "ru")
+        self.assertEqual(self.detector.detect("привіт усім"), "uk")
+        self.assertEqual(self.detector.detect("こんにちは"), "ja")
+        self.assertEqual(self.detector.detect("안녕하세요"), "ko")
+        mock_detect.assert_not_called()
+
+    @patch("lang_detect.detect", return_value="es")
+    def test_short_latin_message_uses_author_memo(self, mock_detect):
+        """Once an author's language is known, short lines should reuse it."""
+        self.detector.detect("hola a todos, que tal el directo de hoy", author_id="u1")
+        self.assertEqual(mock_detect.call_count, 1)
+
+        self.assertEqual(self.detector.detect("jaja", author_id="u1"), "es")
+        self.assertEqual(mock_detect.call_count, 1)
+        self.assertEqual(self.detector.stats["memo"], 1)
+
+    def test_longer_cyrillic_text_can_be_bulgarian(self):
+        """Only short Cyrillic lines default to ru; longer ones go to the model."""
+        self.assertEqual(self.detector.detect("Здравейте на всички, много хубав стрийм днес!"), "bg")
+        self.assertEqual(self.detector.detect("Всем привет, отличный сегодня стрим!"), "ru")
+        self.assertEqual(self.detector.stats["model"], 2)
+
+    def test_model_result_is_deterministic(self):
+        text = "ok lol"
+        results = {LanguageDetector().detect(text) for _ in range(5)}
+        self.assertEqual(len(results), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import ANY, patch
+
+import db
+from cache import TTLCache
+from db import MessageBatchWriter, build_message_row
+from spool import MessageSpool
+
+
+class TestMessageBatchWriter(unittest.IsolatedAsyncioTestCase):
+    def test_build_message_row_uses_id_as_message_id(self):
+        """build_message_row should map `id` to message_id and fill defaults."""
+        row = build_message_row({"id": 42, "author": "A", "content": "hi"})
+        self.assertEqual(row["message_id"], "42")
+        self.assertEqual(row["platform"], "youtube")
+        self.assertIsInstance(row["timestamp"], float)
+
+    @patch("db.upsert_messages")
+    async def test_flush_sends_one_bulk_upsert_without_duplicates(self, mock_upsert):
+        """Queued rows should go out in one call, deduplicated by message_id."""
+        writer = MessageBatchWriter(batch_size=10)
+        for msg_id in ("a", "b", "a"):
+            writer.enqueue({"id": msg_id, "author": "A", "content": "x"})
+
+        self.assertEqual(writer.queue_depth, 3)
+        await writer.flush()
+
+        mock_upsert.assert_called_once()
+        rows = mock_upsert.call_args.args[0]
+        self.assertEqual(sorted(r["message_id"] for r in rows), ["a", "b"])
+        self.assertEqual(writer.queue_depth, 0)
+
+    @patch("db.subscriber_cache", new_callable=lambda: TTLCache(maxsize=100, ttl=60))
+    @patch("db.upsert_messages")
+    @patch("db.get_supabase")
+    async def test_new_authors_resolved_with_one_upsert(self, get_supabase, mock_upsert, cache):
+        """Every saved message should carry subscriber_id; unknown authors cost one bulk upsert per batch."""
+        cache.set(("s1", "UC-old", "youtube"), "sub-old")
+        table = get_supabase.return_value.table
+        table.return_value.upsert.return_value.execute.return_value.data = [
+            {"id": "sub-new", "streamer_id": "s1", "external_user_id": "UC-new", "platform": "youtube"},
+        ]
+        writer = MessageBatchWriter(batch_size=10)
+        for msg_id, author_id in (("1", "UC-old"), ("2", "UC-new"), ("3", "UC-new")):
+            writer.enqueue({"id": msg_id, "author": "A", "content": "x", "streamer_id": "s1", "author_id": author_id})
+
+        await writer.flush()
+
+        table.assert_called_once_with("subscribers")
+        self.assertEqual(len(table.return_value.upsert.call_args.args[0]), 1)
+        rows = mock_upsert.call_args.args[0]
+        self.assertEqual([r["subscriber_id"] for r in rows], ["sub-old", "sub-new", "sub-new"])
+        self.assertNotIn("author_id", db.message_columns(rows[0]))
+
+    @patch("db.backoff_delay", return_value=0)
+    @patch("db.upsert_messages", side_effect=Exception("db down"))
+    async def test_failed_batch_is_kept_in_order(self, mock_upsert, _):
+        """After all retries fail, rows should go back to the front of the queue."""
+        writer = MessageBatchWriter(batch_size=2, max_retries=2)
+        for msg_id in ("1", "2", "3"):
+            writer.enqueue({"id": msg_id, "author": "A", "content": "x"})
+
+        ok = await writer.flush()
+
+        self.assertFalse(ok)
+        self.assertEqual(mock_upsert.call_count, 2)
+        self.assertEqual([r["message_id"] for r in writer._queue], ["1", "2", "3"])
+
+
+    @patch("db.backoff_delay", return_value=0)
+    async def test_spooled_rows_survive_outage_and_replay_in_order(self, _):
+        """Rows should stay in the spool while the DB is down and replay in order later."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "spool.sqlite3")
+            writer = MessageBatchWriter(batch_size=10, max_retries=1, spool=MessageSpool(path))
+            for msg_id in ("1", "2", "3"):
+                writer.enqueue({"id": msg_id, "author": "A", "content": "x"})
+
+            with patch("db.upsert_messages", side_effect=Exception("db down")):
+                self.assertFalse(await writer.flush())
+            writer.spool.close()
+
+            # Simulate a restart: a new writer picks up the same spool file
+            restarted = MessageBatchWriter(batch_size=10, spool=MessageSpool(path))
+            self.assertEqual(restarted.queue_depth, 3)
+
+            with patch("db.upsert_messages") as mock_upsert:
+                self.assertTrue(await restarted.flush())
+
+            rows = mock_upsert.call_args.args[0]
+            self.assertEqual([r["message_id"] for r in rows], ["1", "2", "3"])
+            self.assertEqual(restarted.queue_depth, 0)
+            self.assertEqual(restarted.spool.depth(), 0)
+            restarted.spool.close()
+
+
+    async def test_rejected_row_is_isolated_and_dead_lettered(self):
+        """A row Postgres keeps rejecting must not block the rows behind it forever."""
+        class RowError(Exception):
+            code = "23502"  # not_null_violation
+
+        def upsert(rows):
+            if any(r["message_id"] == "bad" for r in rows):
+                raise RowError("null value in column")
+            written.extend(r["message_id"] for r in rows)
+
+        written = []
+        with tempfile.TemporaryDirectory() as tmp:
+            spool = MessageSpool(os.path.join(tmp, "spool.sqlite3"))
+            writer = MessageBatchWriter(batch_size=10, spool=spool, dead_letter_after=2)
+            for msg_id in ("1", "bad", "2", "3"):
+                writer.enqueue({"id": msg_id, "author": "A", "content": "x"})
+
+            with patch("db.upsert_messages", side_effect=upsert):
+                self.assertFalse(await writer.flush())
+                self.assertEqual(writer.queue_depth, 1)  # the good rows are written already
+                self.assertTrue(await writer.flush())
+
+            self.assertEqual(sorted(written), ["1", "2", "3"])
+            self.assertEqual(writer.queue_depth, 0)
+            self.assertEqual(spool.dead_letter_count(), 1)
+            self.assertEqual(writer.dead_lettered_rows, 1)
+            spool.close()
+
+
+    async def test_enqueue_many_spools_a_batch_off_the_event_loop(self):
+        """The persist stage spools a whole batch in one transaction in a worker thread."""
+        with tempfile.TemporaryDirectory() as tmp:
+            spool = MessageSpool(os.path.join(tmp, "spool.sqlite3"))
+            writer = MessageBatchWriter(batch_size=10, spool=spool)
+
+            with patch("db.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+                await writer.enqueue_many([{"id": str(i), "author": "A", "content": "x"} for i in range(3)])
+
+            to_thread.assert_called_once_with(spool.append_many, ANY)
+            self.assertEqual(writer.queue_depth, 3)
+            self.assertEqual([row["message_id"] for _, row in spool.peek(10)], ["0", "1", "2"])
+            spool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+
+from outbound import OutboundClass, OutboundPost, OutboundScheduler
+
+
+def merge_texts(posts):
+    return OutboundPost(" + ".join(p.text for p in posts), posts[0].prefix, posts[0].kind)
+
+
+class TestOutboundScheduler(unittest.IsolatedAsyncioTestCase):
+    def make_scheduler(self, sent, min_gap=0.0):
+        async def send(text, prefix):
+            sent.append(text)
+            return True
+
+        return OutboundScheduler(
+            send,
+            [
+                OutboundClass("reply", 0, 0.0, max_age=60, merge=None, bypass_gap=True),
+                OutboundClass("superchat", 1, 0.0, max_age=60, merge=merge_texts),
+                OutboundClass("promo", 3, 0.0, max_age=60),
+            ],
+            min_gap=min_gap,
+        )
+
+    async def test_higher_priority_goes_first_and_same_class_merges(self):
+        """Pending posts should be served by priority; one class becomes one insert."""
+        sent = []
+        scheduler = self.make_scheduler(sent)
+        scheduler.submit(OutboundPost("promo", "📣", "promo"))
+        scheduler.submit(OutboundPost("thanks A", "💝", "superchat"))
+        scheduler.submit(OutboundPost("thanks B", "💝", "superchat"))
+
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+        self.assertEqual(sent, ["thanks A + thanks B", "promo"])
+
+    async def test_reserved_reply_slot_holds_back_lower_classes(self):
+        """While a reply is being generated, promo should wait for it."""
+        sent = []
+        scheduler = self.make_scheduler(sent, min_gap=10.0)
+        self.assertTrue(scheduler.try_reserve("reply"))
+        scheduler.submit(OutboundPost("promo", "📣", "promo"))
+
+        scheduler.start()
+        await asyncio.sleep(0.02)
+        self.assertEqual(sent, [])
+
+        scheduler.submit(OutboundPost("reply", "💬", "reply", reserved=True))
+        await asyncio.sleep(0.02)
+        await scheduler.stop()
+
+        # The reply goes out; promo now waits for the global gap
+        self.assertEqual(sent, ["reply"])
+        self.assertTrue(scheduler.has_pending("promo"))
+        self.assertFalse(scheduler.try_reserve("reply"))
+
+
+    async def test_failed_post_waits_out_the_class_interval(self):
+        """A failing insert must not make the class due again right away."""
+        attempts = []
+
+        async def send(text, prefix):
+            attempts.append(text)
+            return False
+
+        scheduler = OutboundScheduler(send, [OutboundClass("promo", 3, 600.0, max_age=60)], min_gap=0.0)
+        scheduler.submit(OutboundPost("promo", "📣", "promo"))
+
+        scheduler.start()
+        await asyncio.sleep(0.02)
+        await scheduler.stop()
+
+        self.assertEqual(attempts, ["promo"])
+        self.assertFalse(scheduler.is_due("promo"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+
+from pipeline import Pipeline, Stage
+
+
+class TestPipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_items_flow_through_all_stages(self):
+        """Each stage result should be handed to the next stage; None stops the item."""
+        seen = []
+
+        async def double(x):
+            return x * 2
+
+        async def only_big(x):
+            return x if x >= 4 else None
+
+        async def collect(x):
+            seen.append(x)
+
+        pipeline = Pipeline([
+            Stage("double", double),
+            Stage("filter", only_big, workers=2),
+            Stage("collect", collect),
+        ])
+        pipeline.start()
+        for x in (1, 2, 3):
+            await pipeline.submit(x)
+        await pipeline.join()
+        await pipeline.stop()
+
+        self.assertEqual(sorted(seen), [4, 6])
+
+    async def test_batch_stage_receives_burst_as_one_list(self):
+        """A batching stage should get items that arrive within the window together."""
+        batches = []
+
+        async def record(items):
+            batches.append(list(items))
+            return items
+
+        pipeline = Pipeline([Stage("batch", record, batch_size=10, batch_window=0.05)])
+        pipeline.start()
+        for x in range(4):
+            await pipeline.submit(x)
+        await pipeline.join()
+        await pipeline.stop()
+
+        self.assertEqual(batches, [[0, 1, 2, 3]])
+
+    async def test_slow_stage_drops_instead_of_blocking(self):
+        """A full drop_when_full stage should drop items, not block the producer."""
+        release = asyncio.Event()
+
+        async def slow(x):
+            await release.wait()
+
+        stage = Stage("slow", slow, maxsize=1, drop_when_full=True)
+        pipeline = Pipeline([stage])
+        pipeline.start()
+
+        results = [await pipeline.submit(i) for i in range(5)]
+        await asyncio.sleep(0)
+
+        self.assertIn(False, results)
+        self.assertGreater(stage.dropped, 0)
+
+        release.set()
+        await pipeline.join()
+        await pipeline.stop()
+
+
+    async def test_on_drop_gets_dropped_and_failed_items(self):
+        """Items dropped by a full stage or whose handler raised go to on_drop."""
+        dropped = []
+
+        async def first(x):
+            if x == "boom":
+                raise ValueError("stage failed")
+            return x
+
+        async def stuck(x):
+            await asyncio.Event().wait()
+
+        pipeline = Pipeline([
+            Stage("first", first),
+            Stage("stuck", stuck, maxsize=1, drop_when_full=True),
+        ], on_drop=dropped.append)
+        pipeline.start()
+        for x in ("boom", "a", "b", "c"):
+            await pipeline.submit(x)
+        await pipeline.stages["first"].queue.join()
+        await pipeline.stop()
+
+        self.assertEqual(dropped[0], "boom")
+        self.assertGreater(pipeline.stages["stuck"].dropped, 0)
+        self.assertEqual(len(dropped), 1 + pipeline.stages["stuck"].dropped)
+
+
+if __name__ == "__main__":
+    unittest.main()
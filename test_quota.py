@@ -0,0 +1,75 @@
+import json
+import unittest
+from datetime import datetime
+
+from quota import QUOTA_TIMEZONE, QuotaAccountant, next_quota_reset
+from youtube_io import youtube_error_reason
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# 06:00 Pacific: 18 hours until the daily reset
+MORNING = datetime(2024, 3, 5, 6, 0, tzinfo=QUOTA_TIMEZONE).timestamp()
+
+
+class TestQuotaAccountant(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(MORNING)
+        self.quota = QuotaAccountant(daily_units=10_000, horizon=6 * 3600, clock=self.clock)
+
+    def test_polling_pace_fits_the_budget_over_the_horizon(self):
+        interval = self.quota.interval("liveChatMessages.list")
+        calls = 6 * 3600 / interval
+        # Polling alone stays within its share of the budget for a 6 hour stream
+        self.assertLessEqual(calls * 5, 10_000 * 0.55 + 1)
+        # Two streams on the same quota poll half as often
+        self.assertAlmostEqual(self.quota.interval("liveChatMessages.list", consumers=2), 2 * interval)
+
+    def test_pace_slows_down_as_the_quota_is_spent(self):
+        before = self.quota.interval("liveChatMessages.insert")
+        for _ in range(100):
+            self.quota.charge("liveChatMessages.insert")
+        self.assertEqual(self.quota.remaining, 5_000)
+        self.assertGreater(self.quota.interval("liveChatMessages.insert"), before)
+
+    def test_reserves_stop_like_checks_before_polling(self):
+        self.quota.used = 9_500
+        self.assertFalse(self.quota.can_spend("videos.list"))
+        self.assertTrue(self.quota.can_spend("liveChatMessages.list"))
+
+    def test_quota_exceeded_pauses_until_reset(self):
+        self.quota.mark_exhausted()
+        self.assertFalse(self.quota.can_spend("liveChatMessages.list"))
+
+        self.clock.now = next_quota_reset(MORNING) + 1
+        self.assertFalse(self.quota.exhausted)
+        self.assertEqual(self.quota.remaining, 10_000)
+        self.assertTrue(self.quota.can_spend("liveChatMessages.list"))
+
+    def test_projection_uses_recent_burn(self):
+        for _ in range(120):  # one list call every 5s for 10 minutes
+            self.quota.charge("liveChatMessages.list")
+            self.clock.now += 5
+        # 1 unit/s for the remaining ~17.8 h blows way past the daily quota
+        self.assertGreater(self.quota.projected_daily_units(), 60_000)
+
+
+class FakeHttpError(Exception):
+    def __init__(self, reason):
+        self.content = json.dumps({"error": {"code": 403, "errors": [{"reason": reason}]}}).encode()
+
+
+class TestErrorReason(unittest.TestCase):
+    def test_reason_from_http_error_body(self):
+        self.assertEqual(youtube_error_reason(FakeHttpError("quotaExceeded")), "quotaExceeded")
+        self.assertIsNone(youtube_error_reason(ValueError("boom")))
+
+
+if __name__ == "__main__":
+    unittest.main()
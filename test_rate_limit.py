@@ -0,0 +1,63 @@
+import asyncio
+import time
+import unittest
+
+from rate_limit import Backoff, RateLimiter, TokenBucket
+
+
+class TestTokenBucket(unittest.IsolatedAsyncioTestCase):
+    def test_burst_up_to_capacity(self):
+        bucket = TokenBucket(rate_per_minute=60, capacity=3)
+        self.assertTrue(all(bucket.try_acquire() for _ in range(3)))
+        self.assertFalse(bucket.try_acquire())
+
+    async def test_acquire_waits_for_refill_without_blocking(self):
+        """acquire() should sleep asynchronously until tokens are refilled."""
+        bucket = TokenBucket(rate_per_minute=600, capacity=1)  # 10 tokens per second
+        await bucket.acquire()
+
+        start = time.monotonic()
+        waited = await bucket.acquire()
+
+        self.assertGreater(waited, 0)
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+
+    def test_adjust_charges_real_usage(self):
+        bucket = TokenBucket(rate_per_minute=60, capacity=100)
+        bucket.adjust(150)
+        self.assertLess(bucket.tokens, 0)
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrency_cap(self):
+        """No more than max_concurrency requests should run at the same time."""
+        limiter = RateLimiter(requests_per_minute=1000, tokens_per_minute=100_000, max_concurrency=2)
+        running = 0
+        peak = 0
+
+        async def call():
+            nonlocal running, peak
+            async with limiter.limit(10):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.02)
+                running -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        self.assertEqual(peak, 2)
+
+
+class TestBackoff(unittest.TestCase):
+    def test_delays_double_up_to_cap_and_reset(self):
+        backoff = Backoff(base=2, cap=16)
+        delays = [backoff.next_delay() for _ in range(6)]
+        for delay, full in zip(delays, [2, 4, 8, 16, 16, 16]):
+            self.assertGreaterEqual(delay, full / 2)
+            self.assertLessEqual(delay, full)
+
+        backoff.reset()
+        self.assertLessEqual(backoff.next_delay(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+
+from reply_cache import ReplyCache, normalize_chat_input
+
+
+class TestReplyCache(unittest.TestCase):
+    def test_normalize_chat_input(self):
+        self.assertEqual(normalize_chat_input("Привееееет!!! 🔥"), "привеет")
+        self.assertEqual(normalize_chat_input("  Hi,   ALL "), "hi all")
+
+    def test_long_messages_are_not_cacheable(self):
+        self.assertFalse(ReplyCache.is_cacheable("what song is playing right now please"))
+        self.assertFalse(ReplyCache.is_cacheable("🔥🔥🔥"))
+        self.assertTrue(ReplyCache.is_cacheable("привет всем"))
+
+    def test_variants_rotate_once_collected(self):
+        """A key is served only after it has all variants, then rotates through them."""
+        cache = ReplyCache(variants_per_key=2)
+        cache.add("hi", "en", False, "Hey Bob!", author_name="Bob")
+        self.assertIsNone(cache.lookup("hi", "en", False, "Ann"))
+
+        cache.add("hi", "en", False, "Hello there, Bob 👋", author_name="Bob")
+        first = cache.lookup("hi", "en", False, "Ann")
+        second = cache.lookup("hi", "en", False, "Ann")
+
+        self.assertEqual({first, second}, {"Hey Ann!", "Hello there, Ann 👋"})
+
+    def test_key_includes_language_and_joke_mode(self):
+        cache = ReplyCache(variants_per_key=1)
+        cache.add("hola", "es", False, "¡Hola!")
+        self.assertIsNone(cache.lookup("hola", "es", True, "Ann"))
+        self.assertIsNone(cache.lookup("hola", "pt", False, "Ann"))
+        self.assertEqual(cache.lookup("hola", "es", False, "Ann"), "¡Hola!")
+
+    def test_fuzzy_match_catches_near_duplicates(self):
+        cache = ReplyCache(variants_per_key=1)
+        cache.add("привет", "ru", False, "Привет-привет!")
+        self.assertEqual(cache.lookup("привeт!!", "ru", False, "Ann"), "Привет-привет!")
+        self.assertEqual(cache.fuzzy_hits, 1)
+
+
+    def test_nickname_is_replaced_as_a_whole_word_only(self):
+        cache = ReplyCache(variants_per_key=1)
+        cache.add("hi", "en", False, "Hi Max!", author_name="Max")
+        self.assertEqual(cache.lookup("hi", "en", False, "Ann"), "Hi Ann!")
+
+    def test_reply_with_name_inside_another_word_is_not_cached(self):
+        cache = ReplyCache(variants_per_key=1)
+        cache.add("hello", "en", False, "Hi Max! Maximum vibes", author_name="Max")
+        cache.add("hey", "en", False, "Hey Al, always a pleasure", author_name="al")
+        self.assertIsNone(cache.lookup("hello", "en", False, "Ann"))
+        self.assertIsNone(cache.lookup("hey", "en", False, "Bob"))
+
+
+if __name__ == "__main__":
+    unittest.main()
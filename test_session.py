@@ -0,0 +1,52 @@
+import unittest
+
+from checkpoint import SeenWindow
+from session import StreamSession
+
+
+class TestStreamSession(unittest.TestCase):
+    def test_processed_ids_window_is_per_session(self):
+        """Each stream should dedupe its own messages within a time window."""
+        now = [1000.0]
+        first = StreamSession(key="a", live_chat_id="chat-a", seen=SeenWindow(window=60, clock=lambda: now[0]))
+        second = StreamSession(key="b", live_chat_id="chat-b")
+
+        self.assertTrue(first.remember_message("m1"))
+        self.assertFalse(first.remember_message("m1"))
+        self.assertTrue(second.remember_message("m1"))
+
+        now[0] += 30
+        first.remember_message("m2")
+        now[0] += 45  # m1 is now older than the window, m2 is not
+        self.assertTrue(first.remember_message("m1"))
+        self.assertFalse(first.remember_message("m2"))
+
+    def test_checkpoint_covers_only_settled_messages(self):
+        """A crash must not checkpoint messages that are still in the pipeline."""
+        session = StreamSession(key="a", live_chat_id="chat-a", next_page_token="tok-0")
+        session.remember_message("m1")
+        session.remember_message("m2")
+        session.page_done("tok-1")
+        session.remember_message("m3")
+        session.page_done("tok-2")
+
+        session.message_settled("m1")
+        self.assertEqual(session.resume_page_token(), "tok-0")  # m2 of the first page is in flight
+
+        session.message_settled("m2")
+        self.assertEqual(session.resume_page_token(), "tok-1")
+        self.assertEqual([msg_id for msg_id, _ in session.seen.take_unsaved()], ["m1", "m2"])
+
+        session.message_settled("m3")
+        self.assertEqual(session.resume_page_token(), "tok-2")
+
+    def test_joke_mode_every_few_replies(self):
+        session = StreamSession(key="a", live_chat_id="chat-a")
+        turns = [session.next_joke_mode() for _ in range(20)]
+
+        self.assertGreaterEqual(turns.count(True), 4)
+        self.assertNotIn([True, True], [turns[i:i + 2] for i in range(len(turns) - 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
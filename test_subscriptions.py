@@ -0,0 +1,39 @@
+import unittest
+
+from subscriptions import SubscriptionIndex, parse_filters
+
+
+class TestSubscriptionIndex(unittest.TestCase):
+    def test_fields_are_anded_and_values_ored(self):
+        """An event should reach exactly the subscribers whose every filter accepts it."""
+        index = SubscriptionIndex()
+        index.set("all")
+        index.set("superchats", parse_filters({"event": "superchat"}))
+        index.set("en_ru_chat", parse_filters({"event": ["chat"], "language": ["EN", "ru"]}))
+        index.set("bob", parse_filters({"author": "Bob"}))
+
+        event = {"event": "chat", "language": "en", "author": "bob"}
+        self.assertEqual(index.match(event), {"all", "en_ru_chat", "bob"})
+        self.assertEqual(index.match({"event": "superchat", "language": "de"}), {"all", "superchats"})
+        # A filtered field missing from the event never matches
+        self.assertEqual(index.match({"author": "bob"}), {"all", "bob"})
+
+        for subscriber in ("all", "superchats", "en_ru_chat", "bob"):
+            self.assertEqual(subscriber in index.match(event), index.accepts(subscriber, event))
+
+    def test_resubscribe_replaces_filters(self):
+        """Changing or removing a subscription should leave nothing behind in the index."""
+        index = SubscriptionIndex()
+        index.set("overlay", parse_filters({"language": "en"}))
+        index.set("overlay", parse_filters({"language": "ru", "bogus": "x"}))
+
+        self.assertEqual(index.match({"language": "en"}), set())
+        self.assertEqual(index.match({"language": "ru"}), {"overlay"})
+
+        index.remove("overlay")
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.match({"language": "ru"}), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+
+from leases import SQLiteLeaseStore
+from supervisor import HashRing, StreamWorker
+
+
+class FakeSession:
+    def __init__(self, stream):
+        self.stream = stream
+        self.next_page_token = stream.get("page_token")
+
+    def resume_page_token(self):
+        return self.next_page_token
+
+
+class FakeHost:
+    """Stands in for alesha: records which streams run where."""
+
+    def __init__(self):
+        self.sessions = {}
+
+    async def start_session(self, stream):
+        self.sessions[stream["key"]] = FakeSession(stream)
+
+    async def stop_session(self, key):
+        self.sessions.pop(key, None)
+
+
+STREAMS = [{"key": f"stream-{i}", "live_chat_id": f"chat-{i}"} for i in range(20)]
+
+
+class TestHashRing(unittest.TestCase):
+    def test_adding_a_worker_moves_only_its_share(self):
+        keys = [f"stream-{i}" for i in range(1000)]
+        before = HashRing(["w1", "w2", "w3"])
+        after = HashRing(["w1", "w2", "w3", "w4"])
+
+        moved = [k for k in keys if before.owner(k) != after.owner(k)]
+
+        self.assertTrue(all(after.owner(k) == "w4" for k in moved))
+        self.assertLess(len(moved), 400)
+        self.assertGreater(len(moved), 150)
+
+
+class TestLeases(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.store = SQLiteLeaseStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        os.remove(self.path)
+
+    def test_single_owner_and_takeover_after_expiry(self):
+        lease = self.store.acquire("s", "w1", ttl=0.05)
+        self.assertFalse(lease.taken_over)
+        self.assertIsNone(self.store.acquire("s", "w2", ttl=0.05))
+        self.assertTrue(self.store.renew("s", "w1", ttl=0.05, page_token="tok-1"))
+
+        time.sleep(0.1)
+        taken = self.store.acquire("s", "w2", ttl=1)
+        self.assertTrue(taken.taken_over)
+        self.assertEqual(taken.page_token, "tok-1")
+        # The old owner can no longer renew, so it stops the stream
+        self.assertFalse(self.store.renew("s", "w1", ttl=1))
+
+    def test_owner_retakes_its_own_lapsed_lease(self):
+        """A lease that lapsed but nobody acquired is renewed instead of lost."""
+        self.store.acquire("s", "w1", ttl=0.05)
+        time.sleep(0.1)
+        self.assertTrue(self.store.renew("s", "w1", ttl=10))
+        self.assertIsNone(self.store.acquire("s", "w2", ttl=10))
+
+    def test_released_lease_is_not_a_takeover(self):
+        self.store.acquire("s", "w1", ttl=10)
+        self.store.release("s", "w1", page_token="tok-2")
+
+        lease = self.store.acquire("s", "w2", ttl=10)
+        self.assertFalse(lease.taken_over)
+        self.assertEqual(lease.page_token, "tok-2")
+
+
+class TestStreamWorker(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.store = SQLiteLeaseStore(self.path)
+
+    async def asyncTearDown(self):
+        self.store.close()
+        os.remove(self.path)
+
+    def make_worker(self, worker_id, ttl=10.0):
+        return StreamWorker(
+            worker_id, self.store, lambda: STREAMS, FakeHost(), lease_ttl=ttl, heartbeat_ttl=ttl,
+        )
+
+    async def test_streams_split_without_overlap_and_move_on_death(self):
+        """Every stream runs on exactly one worker; a dead worker's streams are taken over."""
+        w1, w2 = self.make_worker("w1", ttl=0.2), self.make_worker("w2", ttl=0.2)
+        for _ in range(2):  # first round: both see each other only after heartbeating
+            await w1.sync()
+            await w2.sync()
+            await w1.sync()
+
+        running1, running2 = set(w1.host.sessions), set(w2.host.sessions)
+        self.assertFalse(running1 & running2)
+        self.assertEqual(running1 | running2, {s["key"] for s in STREAMS})
+        self.assertTrue(running1 and running2)
+
+        # w2 dies: no heartbeat, no renewals. After the TTL, w1 takes its streams over.
+        await asyncio.sleep(0.3)
+        await w1.sync()
+
+        self.assertEqual(set(w1.host.sessions), {s["key"] for s in STREAMS})
+        taken = [w1.host.sessions[key].stream for key in running2]
+        self.assertTrue(all(stream["backfill"] for stream in taken))
+
+    async def test_renewal_keeps_lapsed_leases_and_fences_lost_ones(self):
+        """Renewals re-take lapsed free leases; a stream taken by another worker stops and may not post."""
+        w1 = self.make_worker("w1", ttl=0.2)
+        await w1.sync()  # w1 alone: it claims every stream
+        self.assertEqual(len(w1.host.sessions), len(STREAMS))
+
+        await asyncio.sleep(0.3)  # a slow round: all of w1's leases lapse
+        self.assertIsNotNone(self.store.acquire("stream-0", "w2", ttl=10))
+        fenced = w1.host.sessions["stream-1"]
+        self.assertLess(fenced.lease_valid_until, time.monotonic())
+
+        await w1.renew()
+
+        self.assertNotIn("stream-0", w1.host.sessions)
+        self.assertEqual(len(w1.host.sessions), len(STREAMS) - 1)
+        self.assertGreater(fenced.lease_valid_until, time.monotonic())
+
+
+if __name__ == "__main__":
+    unittest.main()
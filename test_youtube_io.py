@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from youtube_io import execute_youtube_request
+
+
+class FakeRequest:
+    """Minimal stand-in for googleapiclient.http.HttpRequest."""
+
+    def __init__(self, result=None, delay: float = 0.0):
+        self.http = object()
+        self.result = result or {}
+        self.delay = delay
+        self.thread_name = None
+
+    def execute(self, http=None):
+        self.thread_name = threading.current_thread().name
+        time.sleep(self.delay)
+        return self.result
+
+
+class TestYoutubeIO(unittest.IsolatedAsyncioTestCase):
+    async def test_execute_runs_off_event_loop(self):
+        """execute_youtube_request should run .execute() in a worker thread."""
+        request = FakeRequest(result={"items": []})
+        response = await execute_youtube_request(request)
+
+        self.assertEqual(response, {"items": []})
+        self.assertNotEqual(request.thread_name, threading.current_thread().name)
+
+    async def test_loop_stays_responsive_during_slow_call(self):
+        """Other coroutines should keep running while a slow call is in flight."""
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        await execute_youtube_request(FakeRequest(delay=0.2))
+        task.cancel()
+
+        self.assertGreater(ticks, 5)
+
+    async def test_timeout_is_enforced(self):
+        """A call slower than the timeout should raise asyncio.TimeoutError."""
+        with self.assertRaises(asyncio.TimeoutError):
+            await execute_youtube_request(FakeRequest(delay=0.5), timeout=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
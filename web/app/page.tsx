@@ -11,13 +11,28 @@ interface ChatMessage {
   author: string;
   content: string;
   language: string;
+  seq: number;
 }
 
+interface BatchFrame {
+  type: "batch";
+  events: ChatMessage[];
+  last_seq: number;
+  epoch: number;
+  complete: boolean;
+}
+
+const MAX_MESSAGES = 50;
+
 export default function HomePage() {
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [isConnected, setIsConnected] = useState(false);
   const [input, setInput] = useState("");
   const wsRef = useRef<WebSocket | null>(null);
+  // Last sequence number seen, so a reconnect only asks for what was missed
+  const lastSeqRef = useRef(0);
+  // Server run the sequence numbers belong to; a restart starts them over
+  const epochRef = useRef<number | null>(null);
 
   useEffect(() => {
     let socket: WebSocket;
@@ -29,13 +44,29 @@ export default function HomePage() {
       socket.onopen = () => {
         console.log("✅ Connected to WebSocket server");
         setIsConnected(true);
+        socket.send(
+          JSON.stringify({ type: "resume", since: lastSeqRef.current, epoch: epochRef.current })
+        );
       };
 
       socket.onmessage = (event) => {
         try {
-          const data: ChatMessage = JSON.parse(event.data);
-          console.log("📥 New message:", data);
-          setMessages((prev) => [...prev.slice(-49), data]); // Keep last 50
+          const data: ChatMessage | BatchFrame = JSON.parse(event.data);
+          let incoming: ChatMessage[];
+          if ("type" in data && data.type === "batch") {
+            if (data.epoch !== epochRef.current) {
+              epochRef.current = data.epoch;
+              lastSeqRef.current = 0;
+            }
+            incoming = data.events;
+          } else {
+            incoming = [data as ChatMessage];
+          }
+          const fresh = incoming.filter((msg) => msg.seq > lastSeqRef.current);
+          if (fresh.length === 0) return;
+          lastSeqRef.current = fresh[fresh.length - 1].seq;
+          console.log(`📥 ${fresh.length} new message(s)`);
+          setMessages((prev) => [...prev, ...fresh].slice(-MAX_MESSAGES));
         } catch (err) {
           console.error("❌ Error parsing WebSocket message:", err);
         }
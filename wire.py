@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+wire.py — compact dashboard feed encoding, negotiated per client:
+- events are shortened to one-letter keys (SHORT_KEYS), empty values left out
+- all events of one batch window travel in a single frame
+- frames are MessagePack (binary) if the `msgpack` package is installed and
+  the client asks for it, otherwise compact JSON text
+The default (full-key JSON, one frame per event) is unchanged.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # optional: compact JSON is used instead
+    msgpack = None
+
+SHORT_KEYS = {
+    "id": "i",
+    "author": "a",
+    "author_id": "u",
+    "content": "c",
+    "language": "l",
+    "event": "e",
+    "kind": "k",
+    "streamer": "s",
+    "seq": "q",
+}
+
+ENCODINGS = ("json", "msgpack")
+
+Frame = Union[str, bytes]
+
+
+def available_encoding(requested: Optional[str]) -> str:
+    """The encoding the server will actually use for a client's request."""
+    if requested == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+
+def compact_event(event: Dict[str, Any], seq: int) -> Dict[str, Any]:
+    compact = {SHORT_KEYS.get(key, key): value for key, value in event.items() if value not in (None, "")}
+    compact["q"] = seq
+    return compact
+
+
+def encode_frame(encoding: str, frame: Dict[str, Any]) -> Frame:
+    if encoding == "msgpack":
+        return msgpack.packb(frame, use_bin_type=True)
+    return json.dumps(frame, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_batch(encoding: str, events: List[Dict[str, Any]], **extra: Any) -> Frame:
+    """One frame for several compact events: {"t": "b", "ev": [...], ...extra}."""
+    return encode_frame(encoding, {"t": "b", "ev": events, **extra})
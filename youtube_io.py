@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+youtube_io.py — async access to the YouTube Data API:
+- runs googleapiclient `.execute()` calls off the asyncio event loop
+- gives every worker thread its own authorized HTTP connection
+- enforces an explicit timeout on every call
+- extracts the API error reason (quotaExceeded, rateLimitExceeded, ...)
+
+googleapiclient is synchronous (httplib2 underneath) and httplib2.Http objects
+are not thread-safe, so the service's own `http` cannot be shared between
+executor threads. Each thread builds one AuthorizedHttp with a socket timeout
+and reuses it for all later calls.
+"""
+
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import google_auth_httplib2
+import httplib2
+
+# Upper bound for a single YouTube API round-trip (seconds)
+YOUTUBE_CALL_TIMEOUT_SECONDS = 10.0
+
+# Threads dedicated to YouTube calls (list + insert + videos can overlap)
+YOUTUBE_IO_WORKERS = 4
+
+_executor: Optional[ThreadPoolExecutor] = None
+_thread_state = threading.local()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=YOUTUBE_IO_WORKERS,
+            thread_name_prefix="youtube-io",
+        )
+    return _executor
+
+
+def _thread_http(request: Any) -> Any:
+    """
+    Return an HTTP object owned by the current worker thread.
+
+    It is authorized with the same credentials as the service that built
+    `request`, and rebuilt only if those credentials change.
+    """
+    credentials = getattr(request.http, "credentials", None)
+    http = getattr(_thread_state, "http", None)
+    if http is not None and getattr(_thread_state, "credentials", None) is credentials:
+        return http
+
+    base = httplib2.Http(timeout=YOUTUBE_CALL_TIMEOUT_SECONDS)
+    if credentials is not None:
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=base)
+    else:
+        http = base
+
+    _thread_state.http = http
+    _thread_state.credentials = credentials
+    return http
+
+
+def _execute_blocking(request: Any) -> Dict[str, Any]:
+    return request.execute(http=_thread_http(request))
+
+
+async def execute_youtube_request(
+    request: Any,
+    timeout: float = YOUTUBE_CALL_TIMEOUT_SECONDS,
+) -> Dict[str, Any]:
+    """
+    Execute a googleapiclient request without blocking the event loop.
+
+    Raises asyncio.TimeoutError if the call takes longer than `timeout`.
+    The socket timeout on the thread's connection makes sure the worker
+    thread itself is released shortly after as well.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_executor(), _execute_blocking, request)
+    return await asyncio.wait_for(future, timeout=timeout)
+
+
+def youtube_error_reason(error: Exception) -> Optional[str]:
+    """
+    The `reason` of a googleapiclient HttpError, e.g. "quotaExceeded" or
+    "liveChatEnded"; None for other errors or unparsable bodies.
+    """
+    content = getattr(error, "content", None)
+    if not isinstance(content, bytes):
+        return None
+    try:
+        errors = json.loads(content.decode("utf-8"))["error"].get("errors") or []
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+    for item in errors:
+        if isinstance(item, dict) and item.get("reason"):
+            return item["reason"]
+    return None